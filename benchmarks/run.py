@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Parser benchmarks on synthetic CODA files
+
+Usage: python benchmarks/run.py [--statements N] [--movements N] ...
+
+For each case the best time of the runs is reported with the derived
+throughput (records/s and MB/s) and the peak memory allocated by Python
+(measured with tracemalloc in a separate run). Use --save and --compare to
+track regressions between two revisions.
+"""
+import argparse
+import gc
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from coda import codec  # noqa: E402
+from coda.cache import MemoryCache  # noqa: E402
+from coda.metrics import ParserMetrics  # noqa: E402
+from coda.parser import AmountMode, Parser  # noqa: E402
+from coda.sniff import sniff  # noqa: E402
+from coda.tests.generator import CodaGenerator  # noqa: E402
+
+
+def _consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def _read_fields(statements):
+    for statement in statements:
+        for movement in statement.movements:
+            (movement.transaction_amount, movement.entry_date,
+             movement.communication, movement.counterparty_number)
+
+
+def _as_dict(record):
+    return dict((name, getattr(record, name))
+                for name in type(record).__slots__)
+
+
+def _to_json(statements):
+    result = []
+    for statement in statements:
+        values = _as_dict(statement)
+        for name in ('movements', 'informations', 'free_comunications'):
+            values[name] = [_as_dict(r) for r in values[name]]
+        result.append(values)
+    return json.dumps(result)
+
+
+def _serialization_cases():
+    """ Cases serializing the statements, the statements and their
+    serialized forms are computed once """
+    memo = {}
+
+    def prepare(data, key=None, dump=None):
+        if 'statements' not in memo:
+            memo['statements'] = Parser().parse(data)
+        if key is not None and key not in memo:
+            memo[key] = dump(memo['statements'])
+        return memo.get(key, memo['statements'])
+
+    def pickled(statements):
+        return pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+
+    return [
+        ('codec dumps', lambda data, path: codec.dumps(prepare(data))),
+        ('codec loads', lambda data, path: codec.loads(
+            prepare(data, 'codec', codec.dumps))),
+        ('pickle dumps', lambda data, path: pickled(prepare(data))),
+        ('pickle loads', lambda data, path: pickle.loads(
+            prepare(data, 'pickle', pickled))),
+        ('json dumps', lambda data, path: _to_json(prepare(data))),
+        ('json loads', lambda data, path: json.loads(
+            prepare(data, 'json', _to_json))),
+    ]
+
+
+def build_cases(args):
+    cached = Parser(cache=MemoryCache())
+    cases = [
+        ('parse', lambda data, path: Parser().parse(data)),
+        ('parse_file', lambda data, path: Parser().parse_file(path)),
+        ('iter_statements',
+         lambda data, path: _consume(Parser().iter_statements(path))),
+        ('parse compact',
+         lambda data, path: Parser(compact=True).parse(data)),
+        ('parse integer amounts',
+         lambda data, path: Parser(
+             amount_mode=AmountMode.INTEGER).parse(data)),
+        ('parse lazy',
+         lambda data, path: Parser(lazy=True).parse(data)),
+        ('parse lazy, 4 fields read',
+         lambda data, path: _read_fields(Parser(lazy=True).parse(data))),
+        ('parse amounts only',
+         lambda data, path: Parser(fields=[
+             'transaction_amount', 'transaction_amount_sign', 'old_balance',
+             'new_balance']).parse(data)),
+        ('parse date objects',
+         lambda data, path: Parser(date_format=None).parse(data)),
+        ('parse cached',
+         lambda data, path: cached.parse(data)),
+        ('parse interned',
+         lambda data, path: Parser(intern_pool=True).parse(data)),
+        ('parse with metrics',
+         lambda data, path: Parser(metrics=ParserMetrics()).parse(data)),
+        ('parse where debit',
+         lambda data, path: Parser().parse(data, where={'sign': '1'})),
+        ('parse where account',
+         lambda data, path: Parser().parse(
+             data, where={'account': 'BE00000000000000'})),
+        ('sniff', lambda data, path: sniff(path, count=True)),
+    ] + _serialization_cases()
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        cases.append(('parse_columnar',
+                      lambda data, path: Parser().parse_columnar(data)))
+    if args.workers:
+        from coda.batch import parse_split
+        cases.append((
+            'parse_split %d workers' % args.workers,
+            lambda data, path: parse_split(data, workers=args.workers)))
+    return cases
+
+
+def measure(func, data, path, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(data, path)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    gc.collect()
+    tracemalloc.start()
+    func(data, path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--statements', type=int, default=20)
+    parser.add_argument('--movements', type=int, default=500)
+    parser.add_argument('--globalisation', type=float, default=0.1)
+    parser.add_argument('--continuation', type=float, default=0.5)
+    parser.add_argument('--information', type=float, default=0.2)
+    parser.add_argument('--account', default='iban')
+    parser.add_argument('--version', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='also benchmark parse_split with N workers')
+    parser.add_argument('-k', dest='keyword',
+                        help='only run the cases containing this keyword')
+    parser.add_argument('--save', help='save the results in a JSON file')
+    parser.add_argument('--compare',
+                        help='compare with results saved by --save')
+    args = parser.parse_args(argv)
+
+    data = CodaGenerator(
+        statements=args.statements, movements=args.movements,
+        globalisation=args.globalisation, continuation=args.continuation,
+        information=args.information, account=args.account,
+        version=args.version).generate()
+    records = data.count(b'\n')
+    size = len(data) / 1024.0 / 1024.0
+    print('%d records, %.1f MB' % (records, size))
+    reference = {}
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+    results = {}
+    fd, path = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        print('%-28s %10s %12s %8s %10s' % (
+            'case', 'time (s)', 'records/s', 'MB/s', 'peak (MB)'))
+        for name, func in build_cases(args):
+            if args.keyword and args.keyword not in name:
+                continue
+            duration, peak = measure(func, data, path, args.repeat)
+            results[name] = {'time': duration, 'peak': peak}
+            line = '%-28s %10.3f %12d %8.1f %10.1f' % (
+                name, duration, records / duration, size / duration,
+                peak / 1024.0 / 1024.0)
+            if name in reference:
+                line += '  x%.2f' % (reference[name]['time'] / duration)
+            print(line)
+    finally:
+        os.remove(path)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Parsing of CODA content received by asyncio streams (Python 3.6+)
+
+The content is cut into batches of whole statements, on the header
+records, and each batch is parsed in an executor so the event loop is not
+blocked while parsing.
+"""
+import asyncio
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from . import codec
+from .parser import Parser
+
+# parser of a worker process of AsyncParser.process_executor
+_worker_parser = None
+
+
+def _init_worker(options):
+    global _worker_parser
+    _worker_parser = Parser(**options)
+
+
+def _parse_in_worker(batch):
+    # sent back to the event loop process
+    return codec.dumps(_worker_parser.parse(batch))
+
+
+def _parse_batch(batch, options):
+    return codec.dumps(Parser(**options).parse(batch))
+
+
+class AsyncParser(object):
+    """Parser of asyncio streams
+
+    The statements are yielded as soon as the statement following them
+    starts (or the stream ends), by batches of about batch_size bytes.
+    The batches of a stream are parsed one after the other, by the parser
+    of the AsyncParser in a thread executor, so the parser, its metrics
+    and its pools are not updated by several threads at once when a single
+    stream is parsed at a time.
+    """
+
+    def __init__(self, executor=None, batch_size=1024 * 1024,
+                 read_size=64 * 1024, **options):
+        """
+        :param: executor: the concurrent.futures executor parsing the
+                          batches, None for the default executor of the
+                          event loop. With a ProcessPoolExecutor the
+                          statements are sent back serialized by the codec
+                          (see process_executor)
+        :param: batch_size: minimum size in bytes of the batches of
+                            statements given to the executor
+        :param: read_size: size of the reads of an asyncio.StreamReader
+        :param: options: keyword arguments of the Parser
+        """
+        self.parser = Parser(**options)
+        self.options = options
+        self.executor = executor
+        self.batch_size = batch_size
+        self.read_size = read_size
+        self._worker_executors = weakref.WeakSet()
+
+    def process_executor(self, max_workers=None):
+        """ Return a ProcessPoolExecutor (Python 3.7+) whose processes build
+        a parser with the options once, when they start. With another
+        process pool, a parser is built for each batch
+        """
+        executor = ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(self.options,))
+        self._worker_executors.add(executor)
+        return executor
+
+    async def _chunks(self, stream):
+        if isinstance(stream, bytes):
+            yield stream
+        elif hasattr(stream, 'read'):
+            # asyncio.StreamReader
+            chunk = await stream.read(self.read_size)
+            while chunk:
+                yield chunk
+                chunk = await stream.read(self.read_size)
+        else:
+            async for chunk in stream:
+                yield chunk
+
+    async def _parse(self, batch):
+        loop = asyncio.get_event_loop()
+        executor = self.executor
+        if not isinstance(executor, ProcessPoolExecutor):
+            return await loop.run_in_executor(
+                executor, self.parser.parse, batch)
+        if executor in self._worker_executors:
+            result = await loop.run_in_executor(
+                executor, _parse_in_worker, batch)
+        else:
+            result = await loop.run_in_executor(
+                executor, _parse_batch, batch, self.options)
+        return codec.loads(result)
+
+    async def iter_statements(self, stream):
+        """ Iterate over the statements of the given stream
+        :param: stream: an asyncio.StreamReader, an async iterator of bytes
+                        or bytes
+        :returns: an async iterator over the Statement objects
+        """
+        pending = []
+        size = 0
+        threshold = self.batch_size
+        parsed = False
+        async for chunk in self._chunks(stream):
+            pending.append(chunk)
+            size += len(chunk)
+            if size < threshold:
+                continue
+            data = b''.join(pending)
+            # the batch ends before the last header record
+            cut = data.rfind(b'\n0') + 1
+            if cut:
+                rest = data[cut:]
+                pending = [rest]
+                size = len(rest)
+                threshold = self.batch_size
+                parsed = True
+                for statement in await self._parse(data[:cut]):
+                    yield statement
+            else:
+                # a statement larger than the batch size, wait for more data
+                # before looking for its end again
+                pending = [data]
+                threshold = size + self.batch_size
+        data = b''.join(pending)
+        if data.strip() or not parsed:
+            for statement in await self._parse(data):
+                yield statement
+
+    async def parse(self, stream):
+        """ Parse the given stream
+        :param: stream: an asyncio.StreamReader, an async iterator of bytes
+                        or bytes
+        :returns: the list of Statement objects found in the stream
+        """
+        return [statement async for statement in self.iter_statements(stream)]
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Parsing of many CODA files in a pool of processes
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+from multiprocessing import cpu_count
+
+from . import codec
+from .parser import Parser
+
+
+class BatchResult(namedtuple('BatchResult', 'path statements error')):
+    """ Result of the parsing of a file
+
+    Attributes:
+        path -- the parsed file
+        statements -- the list of Statement found in the file, None on error
+        error -- the exception raised while reading or parsing the file
+                 (CodaParserException, ValueError, IOError, IndexError for
+                 a truncated record...) or while sending the statements
+                 back from a process (codec.CodecError), None on success
+    """
+    __slots__ = ()
+
+
+def parse_path(path, options=None):
+    """ Parse the given file, the errors are returned in the BatchResult
+    instead of being raised so a faulty file does not stop the parsing of
+    the other files of a batch
+    :param: options: keyword arguments of the Parser
+    """
+    parser = Parser(**(options or {}))
+    try:
+        return BatchResult(path, parser.parse_file(path), None)
+    except Exception as e:
+        return BatchResult(path, None, e)
+
+
+def _parse_path(path, options):
+    # the statements are sent back serialized by the codec, faster to
+    # transfer than pickled objects
+    result = parse_path(path, options)
+    if result.statements is not None:
+        try:
+            result = result._replace(
+                statements=codec.dumps(result.statements))
+        except Exception as e:
+            result = BatchResult(path, None, e)
+    return result
+
+
+def _load_result(result):
+    if result.statements is not None:
+        result = result._replace(statements=codec.loads(result.statements))
+    return result
+
+
+def parse_many(paths, workers=None, ordered=True, chunksize=1, **options):
+    """ Parse the given files in a pool of processes
+    :param: paths: the paths of the files to parse
+    :param: workers: number of processes, None for the number of processors,
+                     0 to parse the files in the current process
+    :param: ordered: if True the results are yielded in the order of the
+                     paths, otherwise as soon as a file is parsed
+    :param: chunksize: number of files sent at once to a process when the
+                       results are ordered
+    :param: options: keyword arguments of the Parser
+    :returns: an iterator over the BatchResult of the files
+    """
+    if workers == 0:
+        for path in paths:
+            yield parse_path(path, options)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if ordered:
+            results = executor.map(
+                _parse_path, paths, repeat(options), chunksize=chunksize)
+        else:
+            results = (future.result() for future in as_completed(
+                [executor.submit(_parse_path, path, options)
+                 for path in paths]))
+        for result in results:
+            yield _load_result(result)
+
+
+def split_statements(value, count=None):
+    """ Split the given CODA content on the statement boundaries (header
+    records) without decoding it
+    :param: value: the content, bytes or mmap
+    :param: count: number of chunks to build, each chunk holding a sequence
+                   of whole statements of about the same size. None to get
+                   one chunk per statement
+    :returns: the list of the chunks (bytes)
+    """
+    boundaries = [0]
+    find = value.find
+    pos = find(b'\n0')
+    while pos != -1:
+        boundaries.append(pos + 1)
+        pos = find(b'\n0', pos + 1)
+    size = len(value)
+    if count:
+        chunk_size = size // count + 1
+        grouped = [0]
+        for boundary in boundaries[1:]:
+            if boundary - grouped[-1] >= chunk_size:
+                grouped.append(boundary)
+        boundaries = grouped
+    boundaries.append(size)
+    return [value[start:end]
+            for start, end in zip(boundaries, boundaries[1:])]
+
+
+def _parse_chunk(chunk, options):
+    return codec.dumps(Parser(**options).parse(chunk))
+
+
+def parse_split(value, workers=None, chunks_per_worker=4, **options):
+    """ Parse the given CODA content by parsing its statements in a pool of
+    processes
+    The result is the same as the one of Parser.parse.
+    :param: value: the content, bytes or mmap
+    :param: workers: number of processes, None for the number of processors,
+                     0 to parse the content in the current process
+    :param: chunks_per_worker: number of chunks of statements sent to each
+                               process
+    :param: options: keyword arguments of the Parser
+    :returns: the list of Statement found in value
+    """
+    if workers == 0:
+        return Parser(**options).parse(value)
+    count = (workers or cpu_count()) * chunks_per_worker
+    chunks = split_statements(value, count)
+    statements = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_parse_chunk, chunks, repeat(options)):
+            statements.extend(codec.loads(result))
+    return statements
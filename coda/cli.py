@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Command line interface
+"""
+import argparse
+import sys
+
+from .batch import parse_many
+from .sniff import sniff
+
+
+def parse_command(args, out):
+    errors = 0
+    results = parse_many(
+        args.files, workers=args.workers, ordered=not args.unordered)
+    for result in results:
+        if result.error is not None:
+            errors += 1
+            error = result.error
+            if hasattr(error, 'code'):
+                error = u'%s %s' % (error.code.strip(), error.msg)
+            out.write(u'%s: error: %s\n' % (result.path, error))
+        else:
+            out.write(u'%s: %d statement(s), %d movement(s)\n' % (
+                result.path, len(result.statements),
+                sum(len(st.movements) for st in result.statements)))
+    return 1 if errors else 0
+
+
+def sniff_command(args, out):
+    errors = 0
+    for path in args.files:
+        try:
+            result = sniff(path, count=args.count)
+        except (IOError, OSError, ValueError) as e:
+            errors += 1
+            out.write(u'%s: error: %s\n' % (path, e))
+            continue
+        if not result.is_coda:
+            errors += 1
+            out.write(u'%s: not a CODA file\n' % path)
+            continue
+        line = u'%s: CODA version %s, bank %s, created %s' % (
+            path, result.version, result.bank_id,
+            result.creation_date or 'on an invalid date')
+        if result.records is not None:
+            line += u', %d statement(s), %d record(s)' % (
+                result.statements, result.records)
+        out.write(line + u'\n')
+    return 1 if errors else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='pycoda', description='Coded statement of account (CODA) tools')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    parse = subparsers.add_parser(
+        'parse', help='parse CODA files in parallel and summarize them')
+    parse.add_argument('files', nargs='+', metavar='FILE')
+    parse.add_argument(
+        '-w', '--workers', type=int, default=None,
+        help='number of processes (default: number of processors, 0 to '
+             'parse in the current process)')
+    parse.add_argument(
+        '--unordered', action='store_true',
+        help='report the files as soon as they are parsed')
+    parse.set_defaults(func=parse_command)
+    sniff_parser = subparsers.add_parser(
+        'sniff', help='check CODA files without parsing them')
+    sniff_parser.add_argument('files', nargs='+', metavar='FILE')
+    sniff_parser.add_argument(
+        '-c', '--count', action='store_true',
+        help='also count the statements and the records, which reads the '
+             'whole files')
+    sniff_parser.set_defaults(func=sniff_command)
+    return parser
+
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args, out or sys.stdout)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
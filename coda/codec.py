@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Compact binary serialization of the statements
+
+The statements are stored column by column: the numeric fields in fixed
+width little-endian columns and the strings as indexes in a table where each
+distinct string is stored once. The positions of the None values of the
+other columns are given by a mask. The columns of any other type are rejected,
+so a content is decoded without unpickling anything, whatever its source.
+
+A content produced by dumps is made of:
+- the magic bytes and the version of the format, to change when the
+  fields of the model change;
+- the number of statements and the columns of their fields;
+- the number of movements, informations and free communications of each
+  statement and the columns of their fields;
+- the table of the strings.
+
+dump_iter writes the statements by batches, each batch being a content
+produced by dumps preceded by its size, and load_iter reads them back one by
+one.
+"""
+import datetime
+import struct
+from array import array
+from decimal import Decimal
+from operator import attrgetter
+
+from .statement import MovementRecord, InformationRecord, FreeCommunication, \
+    Statement, MovementColumns
+
+MAGIC = b'CODA'
+FORMAT_VERSION = 4
+
+_text = type(u'')
+# on Python 2, the native strings of the model are bytes
+_STRING_TYPES = {_text, str, type(None)}
+_ints = (int, type(2 ** 64))
+_INT64 = 2 ** 63
+_HEADER = struct.Struct('<4sBI')
+_SIZE = struct.Struct('<I')
+
+# column tags
+_NONE = b'N'
+_STRING = b'S'
+_INT = b'q'
+_OPTIONAL = b'o'
+_FLOAT = b'd'
+_BOOL = b'?'
+_DATE = b'D'
+_DECIMAL = b'E'
+
+_CHILDREN = ('movements', 'informations', 'free_comunications')
+STATEMENT_FIELDS = tuple(
+    name for name in Statement.__slots__ if name not in _CHILDREN)
+MOVEMENT_FIELDS = MovementRecord.__slots__
+INFORMATION_FIELDS = InformationRecord.__slots__
+FREE_COMMUNICATION_FIELDS = FreeCommunication.__slots__
+
+
+class CodecError(ValueError):
+    """ Raised when a content can not be decoded or a value can not be
+    encoded """
+
+
+class _Encoder(object):
+
+    def __init__(self):
+        self.chunks = []
+        # index of the strings in the table, 0 stands for None
+        self.strings = {None: 0}
+
+    def write_counts(self, counts):
+        self.chunks.append(struct.pack('<%dI' % len(counts), *counts))
+
+    def write_column(self, values):
+        chunks = self.chunks
+        n = len(values)
+        types = set(map(type, values))
+        if types <= _STRING_TYPES:
+            if types == {type(None)}:
+                chunks.append(_NONE)
+                return
+            chunks.append(_STRING)
+            chunks.append(struct.pack('<%dI' % n, *self._indexes(values)))
+        elif type(None) in types:
+            # the positions of the None values are given by a mask, followed
+            # by the column of the other values
+            present = [v is not None for v in values]
+            chunks.append(_OPTIONAL)
+            chunks.append(struct.pack('<%d?' % n, *present))
+            self.write_column([v for v in values if v is not None])
+        elif types == {float}:
+            chunks.append(_FLOAT)
+            chunks.append(struct.pack('<%dd' % n, *values))
+        elif types <= set(_ints) and _fits_int64(values):
+            chunks.append(_INT)
+            chunks.append(struct.pack('<%dq' % n, *values))
+        elif types == {bool}:
+            chunks.append(_BOOL)
+            chunks.append(struct.pack('<%d?' % n, *values))
+        elif types == {datetime.date}:
+            chunks.append(_DATE)
+            chunks.append(struct.pack(
+                '<%dI' % n, *map(datetime.date.toordinal, values)))
+        elif types == {Decimal}:
+            chunks.append(_DECIMAL)
+            chunks.append(struct.pack(
+                '<%dI' % n, *self._indexes(list(map(_text, values)))))
+        else:
+            raise CodecError('Can not encode the values of type %s' % (
+                ', '.join(sorted(t.__name__ for t in types))))
+
+    def write_records(self, records, fields):
+        columns = list(zip(*map(attrgetter(*fields), records))) or \
+            [()] * len(fields)
+        for values in columns:
+            self.write_column(values)
+
+    def _indexes(self, values):
+        strings = self.strings
+        get = strings.get
+        indexes = []
+        append = indexes.append
+        for value in values:
+            index = get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            append(index)
+        return indexes
+
+    def getvalue(self):
+        strings = sorted(self.strings, key=self.strings.get)[1:]
+        data = u''.join(strings).encode('utf-8')
+        return b''.join([
+            _HEADER.pack(MAGIC, FORMAT_VERSION, len(strings)),
+            struct.pack('<%dI' % len(strings), *map(len, strings)),
+            _SIZE.pack(len(data)), data,
+        ] + self.chunks)
+
+
+def _fits_int64(values):
+    return all(-_INT64 <= v < _INT64 for v in values)
+
+
+class _Decoder(object):
+
+    def __init__(self, data):
+        self.data = data
+        if len(data) < _HEADER.size:
+            raise CodecError('Truncated content')
+        magic, version, count = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise CodecError('Not a serialized statements content')
+        if version != FORMAT_VERSION:
+            raise CodecError('Unsupported format version %d' % version)
+        self.pos = _HEADER.size
+        lengths = self.read_struct('<%dI' % count)
+        size = self.read_struct('<I')[0]
+        text = bytes(data[self.pos:self.pos + size]).decode('utf-8')
+        self.pos += size
+        strings = [None]
+        append = strings.append
+        pos = 0
+        for length in lengths:
+            append(text[pos:pos + length])
+            pos += length
+        self.strings = strings
+
+    def read_struct(self, fmt):
+        try:
+            values = struct.unpack_from(fmt, self.data, self.pos)
+        except struct.error:
+            raise CodecError('Truncated content')
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def read_column(self, n):
+        tag = bytes(self.data[self.pos:self.pos + 1])
+        self.pos += 1
+        if tag == _NONE:
+            return [None] * n
+        elif tag == _STRING:
+            strings = self.strings
+            return [strings[i] for i in self.read_struct('<%dI' % n)]
+        elif tag == _FLOAT:
+            return self.read_struct('<%dd' % n)
+        elif tag == _INT:
+            return self.read_struct('<%dq' % n)
+        elif tag == _OPTIONAL:
+            present = self.read_struct('<%d?' % n)
+            values = iter(self.read_column(sum(present)))
+            return [next(values) if p else None for p in present]
+        elif tag == _BOOL:
+            return self.read_struct('<%d?' % n)
+        elif tag == _DATE:
+            return list(map(datetime.date.fromordinal,
+                            self.read_struct('<%dI' % n)))
+        elif tag == _DECIMAL:
+            strings = self.strings
+            return [Decimal(strings[i])
+                    for i in self.read_struct('<%dI' % n)]
+        raise CodecError('Unknown column type %r' % tag)
+
+    def read_records(self, record_class, fields, n):
+        records = list(map(record_class.__new__, [record_class] * n))
+        for name in fields:
+            setter = getattr(record_class, name).__set__
+            for _ in map(setter, records, self.read_column(n)):
+                pass
+        return records
+
+
+def _typecode(column):
+    return _text(column.typecode) if isinstance(column, array) else None
+
+
+def dumps(statements):
+    """ Serialize the given statements
+    :param: statements: a list of Statement, with plain, lazy or compact
+                        movements
+    :returns: the serialized statements
+     :rtype: bytes
+    """
+    statements = list(statements)
+    encoder = _Encoder()
+    encoder.write_counts([len(statements)])
+    encoder.write_records(statements, STATEMENT_FIELDS)
+    compact = [isinstance(st.movements, MovementColumns)
+               for st in statements]
+    encoder.write_column(compact)
+    for name in _CHILDREN:
+        encoder.write_counts([len(getattr(st, name)) for st in statements])
+    columns = [[] for _ in MOVEMENT_FIELDS]
+    getter = attrgetter(*MOVEMENT_FIELDS)
+    typecodes = []
+    for st in statements:
+        movements = st.movements
+        if isinstance(movements, MovementColumns):
+            values = [movements.columns[name] for name in MOVEMENT_FIELDS]
+            typecodes.extend(map(_typecode, values))
+        else:
+            values = zip(*map(getter, movements))
+        for column, value in zip(columns, values):
+            column.extend(value)
+    for column in columns:
+        encoder.write_column(column)
+    encoder.write_column(typecodes)
+    encoder.write_records(
+        [info for st in statements for info in st.informations],
+        INFORMATION_FIELDS)
+    encoder.write_records(
+        [com for st in statements for com in st.free_comunications],
+        FREE_COMMUNICATION_FIELDS)
+    return encoder.getvalue()
+
+
+def loads(data):
+    """ Deserialize the statements serialized by dumps
+    The lazy records are restored as plain records and the links between
+    the records are built again (see Statement.link).
+    :param: data: bytes or memoryview
+    :returns: the list of Statement
+    """
+    decoder = _Decoder(data)
+    count = decoder.read_struct('<I')[0]
+    statements = decoder.read_records(Statement, STATEMENT_FIELDS, count)
+    compact = decoder.read_column(count)
+    counts = [decoder.read_struct('<%dI' % count) for _ in _CHILDREN]
+    total = sum(counts[0])
+    columns = [decoder.read_column(total) for _ in MOVEMENT_FIELDS]
+    # the typecode of each column of the compact movements, or None
+    typecodes = iter(decoder.read_column(
+        sum(compact) * len(MOVEMENT_FIELDS)))
+    movements = list(map(MovementRecord.__new__, [MovementRecord] * total))
+    for name, column in zip(MOVEMENT_FIELDS, columns):
+        setter = getattr(MovementRecord, name).__set__
+        for _ in map(setter, movements, column):
+            pass
+    informations = decoder.read_records(
+        InformationRecord, INFORMATION_FIELDS, sum(counts[1]))
+    free_communications = decoder.read_records(
+        FreeCommunication, FREE_COMMUNICATION_FIELDS, sum(counts[2]))
+    start = [0, 0, 0]
+    for i, st in enumerate(statements):
+        ends = [s + c[i] for s, c in zip(start, counts)]
+        if compact[i]:
+            st.movements = _columns(columns, [
+                next(typecodes) for _ in MOVEMENT_FIELDS], start[0], ends[0])
+        else:
+            st.movements = movements[start[0]:ends[0]]
+        st.informations = informations[start[1]:ends[1]]
+        st.free_comunications = free_communications[start[2]:ends[2]]
+        st.link()
+        start = ends
+    return statements
+
+
+def _columns(columns, typecodes, start, end):
+    movements = MovementColumns.__new__(MovementColumns)
+    movements.columns = dict(
+        (name, array(str(typecode), column[start:end]) if typecode
+         else list(column[start:end]))
+        for name, column, typecode in zip(
+            MOVEMENT_FIELDS, columns, typecodes))
+    movements._size = end - start
+    return movements
+
+
+def dump_iter(statements, fp, batch_size=100):
+    """ Write the given statements to a binary file by batches
+    :param: statements: an iterable of Statement
+    :param: fp: a binary file-like object
+    :param: batch_size: number of statements serialized together
+    """
+    batch = []
+    for statement in statements:
+        batch.append(statement)
+        if len(batch) >= batch_size:
+            _write_batch(fp, batch)
+            batch = []
+    if batch:
+        _write_batch(fp, batch)
+
+
+def _write_batch(fp, batch):
+    data = dumps(batch)
+    fp.write(_SIZE.pack(len(data)))
+    fp.write(data)
+
+
+def load_iter(fp):
+    """ Iterate over the statements written by dump_iter
+    :param: fp: a binary file-like object
+    :returns: an iterator over the Statement
+    """
+    while True:
+        size = fp.read(_SIZE.size)
+        if not size:
+            return
+        if len(size) < _SIZE.size:
+            raise CodecError('Truncated content')
+        size = _SIZE.unpack(size)[0]
+        data = fp.read(size)
+        if len(data) < size:
+            raise CodecError('Truncated content')
+        for statement in loads(data):
+            yield statement
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Columnar export of the movements as numpy arrays
+
+The amounts are int64 thousandths of the currency unit (the precision of the
+CODA amounts), the dates datetime64[D] and the codes fixed-width byte
+strings. numpy (and pandas for to_dataframe) are optional dependencies.
+"""
+from .statement import MovementRecord
+
+# fixed-width byte string columns
+BYTES_FIELDS = {
+    'ref': 8,
+    'ref_move': 4,
+    'ref_move_detail': 4,
+    'transaction_amount_sign': 1,
+    'transaction_family': 2,
+    'transaction_code': 2,
+    'transaction_category': 3,
+    'communication_type': 3,
+    'type': 1,
+    'counterparty_bic': 11,
+    'counterparty_currency': 3,
+}
+AMOUNT_FIELDS = ('transaction_amount',)
+DATE_FIELDS = ('transaction_date', 'entry_date')
+INT_FIELDS = ('transaction_type', 'globalisation_code')
+BOOL_FIELDS = ('communication_is_structured',)
+# int64 columns, -1 for None
+OPTIONAL_INT_FIELDS = ('structured_reference',)
+
+
+def _numpy():
+    """ Import numpy, an optional dependency, on first use """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('numpy is required for the columnar export, '
+                          'install pycoda[numpy]')
+    return numpy
+
+
+def _to_thousandths(values):
+    numpy = _numpy()
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return numpy.array(values, dtype='int64')
+    if all(isinstance(v, float) for v in values):
+        return numpy.rint(
+            numpy.array(values, dtype='float64') * 1000).astype('int64')
+    return numpy.array([int(v * 1000) for v in values], dtype='int64')
+
+
+def _to_dates(values):
+    numpy = _numpy()
+    try:
+        return numpy.array(values, dtype='datetime64[D]')
+    except ValueError:
+        raise ValueError('Only ISO formatted dates or datetime.date can be '
+                         'converted, use a parser with date_format=None')
+
+
+def _to_bytes(values, dtype):
+    numpy = _numpy()
+    values = [v or '' for v in values]
+    try:
+        # the codes are ASCII, encoded by numpy
+        return numpy.array(values, dtype=dtype)
+    except UnicodeEncodeError:
+        return numpy.array([v.encode('windows-1252') for v in values],
+                           dtype=dtype)
+
+
+def _column(movements, name):
+    if hasattr(movements, 'columns'):
+        # MovementColumns
+        return movements.columns[name]
+    return [getattr(mv, name) for mv in movements]
+
+
+def movements_to_columns(movements, fields=None):
+    """ Convert the given movements into numpy arrays
+    :param: movements: a MovementColumns or a list of MovementRecord
+    :param: fields: names of the fields to convert, None for all the fields
+                    of MovementRecord. The fields not decoded by a parser
+                    with a projection (Parser(fields=...)) must be left out
+    :returns: a dict of numpy arrays by field name of MovementRecord
+    """
+    numpy = _numpy()
+    columns = {}
+    for name in MovementRecord.__slots__:
+        if fields is not None and name not in fields:
+            continue
+        values = _column(movements, name)
+        if name in AMOUNT_FIELDS:
+            columns[name] = _to_thousandths(values)
+        elif name in DATE_FIELDS:
+            columns[name] = _to_dates(values)
+        elif name in INT_FIELDS:
+            columns[name] = numpy.array(values, dtype='int8')
+        elif name in OPTIONAL_INT_FIELDS:
+            columns[name] = numpy.array(
+                [-1 if v is None else v for v in values], dtype='int64')
+        elif name in BOOL_FIELDS:
+            columns[name] = numpy.array(values, dtype='bool')
+        elif name in BYTES_FIELDS:
+            columns[name] = _to_bytes(values, 'S%d' % BYTES_FIELDS[name])
+        else:
+            columns[name] = numpy.array(values, dtype='object')
+    return columns
+
+
+def statements_to_columns(statements, fields=None):
+    """ Convert the movements of the given statements into numpy arrays
+    :param: statements: an iterable of Statement
+    :param: fields: names of the fields to convert, as movements_to_columns
+    :returns: a dict of numpy arrays by field name of MovementRecord, with
+              a 'statement' array giving the index of the statement of each
+              movement
+    """
+    numpy = _numpy()
+    parts = []
+    indexes = []
+    for index, statement in enumerate(statements):
+        if not len(statement.movements):
+            continue
+        parts.append(statement.to_columns(fields))
+        indexes.append(numpy.full(len(statement.movements), index, 'int32'))
+    if not parts:
+        columns = movements_to_columns([], fields)
+        columns['statement'] = numpy.array([], dtype='int32')
+        return columns
+    columns = dict((name, numpy.concatenate([p[name] for p in parts]))
+                   for name in parts[0])
+    columns['statement'] = numpy.concatenate(indexes)
+    return columns
+
+
+def to_dataframe(columns):
+    """ Build a pandas DataFrame from the given columns """
+    import pandas
+    return pandas.DataFrame(columns)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Structured communications (OGM/VCS)
+
+A structured communication is made of 12 digits, the last 2 being the
+check digits: the remainder of the division of the first 10 digits by 97,
+97 when the remainder is 0. It is written as +++ddd/dddd/ddddd+++.
+The movement records give it as an int in structured_reference.
+"""
+# communication types of the structured communications
+STRUCTURED_TYPES = ('101', '102')
+
+_DIGITS = '0123456789'
+
+
+def parse_structured_reference(value):
+    """ Return the int of a structured communication given as
+    +++ddd/dddd/ddddd+++, ***ddd/dddd/ddddd*** or as its 12 digits, None if
+    the value is not a structured communication
+    """
+    if not value:
+        return None
+    digits = ''.join(c for c in value[:24] if c in _DIGITS)
+    if len(digits) != 12:
+        return None
+    return int(digits)
+
+
+def format_structured_reference(reference):
+    """ Return the given structured communication as +++ddd/dddd/ddddd+++ """
+    digits = '%012d' % reference
+    return '+++%s/%s/%s+++' % (digits[:3], digits[3:7], digits[7:])
+
+
+def is_valid_structured_reference(reference):
+    """ Check the mod-97 check digits of the given structured communication
+    :param: reference: the int of the communication or its string
+    """
+    if not isinstance(reference, int):
+        reference = parse_structured_reference(reference)
+        if reference is None:
+            return False
+    if not 0 <= reference < 10 ** 12:
+        return False
+    return (reference // 100 % 97 or 97) == reference % 100
+
+
+def validate_structured_references(references):
+    """ Check the mod-97 check digits of many structured communications at
+    once, numpy is required
+    :param: references: a sequence of int, None or -1 for no communication
+    :returns: a numpy bool array, False for the missing communications
+    """
+    try:
+        # optional dependency, imported on first use
+        import numpy
+    except ImportError:
+        raise ImportError('numpy is required for the vectorised '
+                          'validation, install pycoda[numpy]')
+    if not isinstance(references, numpy.ndarray):
+        references = numpy.array(
+            [-1 if r is None else r for r in references], dtype='int64')
+    check = references // 100 % 97
+    check = numpy.where(check == 0, 97, check)
+    return (references >= 0) & (references < 10 ** 12) & \
+        (check == references % 100)
+
+
+def validate_statement(statement):
+    """ Check the structured communications of the movements of the given
+    statement at once, numpy is required
+    :returns: a numpy bool array by movement, False for the movements
+              without structured communication
+    """
+    movements = statement.movements
+    if hasattr(movements, 'columns'):
+        # MovementColumns
+        references = movements.columns['structured_reference']
+    else:
+        references = [mv.structured_reference for mv in movements]
+    return validate_structured_references(references)
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Bulk export of statements to SQLite and Parquet
+
+The statements are read one by one, e.g. from Parser.iter_statements, and
+their rows are written by batches, so the memory used does not depend on
+the number of statements exported.
+
+Each kind of record gets its own table: statement, movement, information
+and free_communication, with a column by field. The records refer to their
+statement by statement_id and are numbered by position in their statement.
+The dates and the decimal amounts are written as text.
+pyarrow is an optional dependency, required for the Parquet export.
+"""
+import datetime
+import os
+import sqlite3
+from decimal import Decimal
+from itertools import chain
+from operator import attrgetter
+
+from .layout import LAYOUTS, AMOUNT, DATE, FLAG, INT, STRUCTURED_REFERENCE
+from .statement import MovementRecord, InformationRecord, FreeCommunication, \
+    Statement
+
+_CHILDREN = ('movements', 'informations', 'free_comunications')
+
+# table name, fields and statement attribute of the records of each table
+TABLES = (
+    ('statement',
+     tuple(n for n in Statement.__slots__ if n not in _CHILDREN), None),
+    ('movement', MovementRecord.__slots__, 'movements'),
+    ('information', InformationRecord.__slots__, 'informations'),
+    ('free_communication', FreeCommunication.__slots__,
+     'free_comunications'),
+)
+# first characters of the layouts of the records of each table
+_RECORD_TYPES = ('018', '2', '3', '4')
+
+_CONVERTED = set([datetime.date, Decimal])
+
+
+def _sql_value(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _rows(records, fields):
+    """ Iterate over the values of the fields of the given records """
+    columns = getattr(records, 'columns', None)
+    if columns is not None:
+        # MovementColumns
+        return zip(*[columns[name] for name in fields])
+    return map(attrgetter(*fields), records)
+
+
+def _iter_rows(statements, first_id):
+    """ Iterate over (table index, row) for the given statements, the rows
+    of the records are prefixed by the id of their statement and their
+    position """
+    for statement_id, statement in enumerate(statements, first_id):
+        yield 0, (statement_id,) + attrgetter(*TABLES[0][1])(statement)
+        for index, (name, fields, attribute) in enumerate(TABLES[1:], 1):
+            records = getattr(statement, attribute)
+            for position, row in enumerate(_rows(records, fields)):
+                yield index, (statement_id, position) + tuple(row)
+
+
+def create_sqlite_schema(connection):
+    """ Create the tables of the exported statements if they do not exist
+    """
+    for name, fields, attribute in TABLES:
+        if attribute is None:
+            columns = ['id INTEGER PRIMARY KEY']
+        else:
+            columns = ['statement_id INTEGER NOT NULL REFERENCES '
+                       'statement(id)', 'position INTEGER NOT NULL']
+        columns.extend('"%s"' % field for field in fields)
+        connection.execute('CREATE TABLE IF NOT EXISTS %s (%s)' % (
+            name, ', '.join(columns)))
+        if attribute is not None:
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS %s_statement_id ON %s '
+                '(statement_id)' % (name, name))
+
+
+def export_sqlite(statements, database, batch_size=1000):
+    """ Write the given statements into a SQLite database
+    All the statements are written in a single transaction.
+    :param: statements: an iterable of Statement
+    :param: database: a sqlite3 connection or the path of the database
+    :param: batch_size: number of rows inserted at once in a table
+    :returns: the number of statements written
+    """
+    connection = database
+    if not isinstance(database, sqlite3.Connection):
+        connection = sqlite3.connect(database)
+    try:
+        with connection:
+            create_sqlite_schema(connection)
+            first_id = connection.execute(
+                'SELECT COALESCE(MAX(id), 0) + 1 FROM statement').fetchone()[0]
+            queries = []
+            for name, fields, attribute in TABLES:
+                count = len(fields) + (1 if attribute is None else 2)
+                queries.append('INSERT INTO %s VALUES (%s)' % (
+                    name, ', '.join('?' * count)))
+            batches = [[] for _ in TABLES]
+            count = 0
+            for index, row in _iter_rows(statements, first_id):
+                if index == 0:
+                    count += 1
+                batch = batches[index]
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    _insert(connection, queries[index], batch)
+            for query, batch in zip(queries, batches):
+                if batch:
+                    _insert(connection, query, batch)
+        return count
+    finally:
+        if connection is not database:
+            connection.close()
+
+
+def _insert(connection, query, batch):
+    if set(map(type, chain.from_iterable(batch))) & _CONVERTED:
+        batch[:] = [tuple(map(_sql_value, row)) for row in batch]
+    connection.executemany(query, batch)
+    del batch[:]
+
+
+def _pyarrow():
+    """ Import pyarrow, an optional dependency, on first use """
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError('pyarrow is required for the Parquet export, '
+                          'install pycoda[parquet]')
+    return pyarrow
+
+
+def _kinds(record_types):
+    """ Return the kinds of the fields found in the layouts of the given
+    record types """
+    return dict((field.name, field.kind)
+                for key, layout in LAYOUTS.items() if key[0] in record_types
+                for field in layout)
+
+
+def _arrow_type(kind, values):
+    """ Arrow type of a column of fields of the given kind """
+    pyarrow = _pyarrow()
+    if kind in (INT, STRUCTURED_REFERENCE):
+        return pyarrow.int64()
+    if kind == FLAG:
+        return pyarrow.bool_()
+    if kind not in (AMOUNT, DATE):
+        return pyarrow.string()
+    # depends on the options of the parser, given by the first value
+    for value in values:
+        if isinstance(value, bool):
+            return pyarrow.bool_()
+        if isinstance(value, int):
+            return pyarrow.int64()
+        if isinstance(value, float):
+            return pyarrow.float64()
+        if isinstance(value, Decimal):
+            return pyarrow.decimal128(18, 3)
+        if isinstance(value, datetime.date):
+            return pyarrow.date32()
+        if value is not None:
+            return pyarrow.string()
+    return pyarrow.float64() if kind == AMOUNT else pyarrow.string()
+
+
+class _ParquetTable(object):
+
+    def __init__(self, path, names, kinds):
+        self.path = path
+        self.names = names
+        self.kinds = kinds
+        self.rows = []
+        self.writer = None
+
+    def flush(self):
+        if not self.rows and self.writer is not None:
+            return
+        columns = list(zip(*self.rows)) or [()] * len(self.names)
+        pyarrow = _pyarrow()
+        if self.writer is None:
+            # the id, statement_id and position columns have no kind
+            self.schema = pyarrow.schema([
+                (name, _arrow_type(self.kinds.get(name, INT), values))
+                for name, values in zip(self.names, columns)])
+            self.writer = pyarrow.parquet.ParquetWriter(
+                self.path, self.schema)
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type)
+             for values, field in zip(columns, self.schema)],
+            schema=self.schema))
+        del self.rows[:]
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def export_parquet(statements, directory, row_group_size=10000):
+    """ Write the given statements into Parquet files, one by table
+    (statement.parquet, movement.parquet...). pyarrow is required.
+    :param: statements: an iterable of Statement
+    :param: directory: the directory of the files, created if needed
+    :param: row_group_size: number of rows of the row groups
+    :returns: the number of statements written
+    """
+    _pyarrow()
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tables = []
+    for (name, fields, attribute), record_types in zip(
+            TABLES, _RECORD_TYPES):
+        prefix = ('id',) if attribute is None else ('statement_id',
+                                                    'position')
+        kinds = _kinds(record_types)
+        # the fields set by the parser itself are text
+        kinds.update((field, None) for field in fields if field not in kinds)
+        tables.append(_ParquetTable(
+            os.path.join(directory, name + '.parquet'),
+            list(chain(prefix, fields)), kinds))
+    count = 0
+    try:
+        for index, row in _iter_rows(statements, 1):
+            if index == 0:
+                count += 1
+            table = tables[index]
+            table.rows.append(row)
+            if len(table.rows) >= row_group_size:
+                table.flush()
+    finally:
+        for table in tables:
+            table.close()
+    return count
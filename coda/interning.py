@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Pool of the texts shared between the records
+
+The same values are found again and again in the records: currencies,
+transaction families and codes, counterparties... An InternPool given to
+the parser (Parser(intern_pool=...)) normalizes each of them once and gives
+back the same str object for all the records, so the parsed statements keep
+a single copy of each value.
+"""
+
+
+class _Texts(dict):
+    """ The texts of an InternPool by raw value, a raw value not found is
+    normalized and added by the pool """
+    __slots__ = ('pool',)
+
+    def __missing__(self, value):
+        return self.pool._add(value)
+
+
+class InternPool(object):
+    """Bounded pool of whitespace normalized texts
+
+    The texts are found by their raw value, as read in the records, so a
+    value already seen is neither normalized nor copied again: it is a
+    single dict lookup, which is why the lookups found in the pool are not
+    counted. The pool keeps at most max_size texts and max_size raw values,
+    once it is full the new values are normalized without being kept.
+    """
+
+    def __init__(self, max_size=65536):
+        self.max_size = max_size
+        self._texts = _Texts()
+        self._texts.pool = self
+        self._values = {}
+        self.misses = 0
+        self.overflows = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def text(self):
+        """ The function returning the whitespace normalized value of a raw
+        value, the same object for all the equal texts
+        """
+        return self._texts.__getitem__
+
+    def _add(self, value):
+        self.misses += 1
+        text = " ".join(value.split())
+        values = self._values
+        result = values.get(text)
+        if result is None:
+            if len(values) >= self.max_size:
+                self.overflows += 1
+                return text
+            values[text] = result = text
+        if len(self._texts) < self.max_size:
+            self._texts[value] = result
+        return result
+
+    def stats(self):
+        """ Return the number of texts of the pool (size), the number of
+        values normalized since they were not found in the pool (misses) and
+        of texts not kept since the pool is full (overflows)
+        :returns: a dict
+        """
+        return {
+            'size': len(self._values),
+            'max_size': self.max_size,
+            'misses': self.misses,
+            'overflows': self.overflows,
+        }
+
+    def clear(self):
+        """ Remove the texts of the pool and reset its counters, e.g.
+        between batches of files """
+        self._texts.clear()
+        self._values.clear()
+        self.misses = self.overflows = 0
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Field layouts of the CODA records
+
+Each layout is a tuple of Field telling where a value is found in a record
+(0 based offsets, end excluded, as for a slice) and how it is converted.
+The offsets follow the febelfin specifications. A record type has several
+layouts when the offsets depend on the CODA version or on the structure of
+the bank account.
+"""
+from collections import namedtuple
+
+# whitespace normalized text
+TEXT = 'text'
+# whitespace normalized text repeated across the records, shared by the
+# interning pool of the parser if any (see coda.interning)
+SHARED = 'shared'
+# value taken as is
+RAW = 'raw'
+# DDMMYY date
+DATE = 'date'
+# amount with 3 decimals, preceded by its sign (0 credit, 1 debit)
+AMOUNT = 'amount'
+INT = 'int'
+# '1' means True
+FLAG = 'flag'
+# text joined to the current value of the field (see join_communications)
+JOIN = 'join'
+# text appended to the current value of the field
+APPEND = 'append'
+# free or structured communication, preceded by the structured flag
+COMMUNICATION = 'communication'
+# type of a structured communication, preceded by the structured flag
+COMMUNICATION_TYPE = 'communication_type'
+# int of a structured communication (OGM/VCS) after its type, preceded by
+# the structured flag
+STRUCTURED_REFERENCE = 'structured_reference'
+
+
+class Field(namedtuple('Field', 'name start end kind')):
+    """ A field of a CODA record
+    """
+    __slots__ = ()
+
+
+_OLD_BALANCE = (
+    Field('description', 90, 125, TEXT),
+    Field('old_balance', 43, 58, AMOUNT),
+    Field('old_balance_amount_sign', 42, 43, RAW),
+    Field('old_balance_date', 58, 64, DATE),
+    Field('account_holder_name', 64, 90, SHARED),
+    Field('paper_seq_number', 2, 5, TEXT),
+    Field('coda_seq_number', 125, 128, TEXT),
+)
+
+_MOVEMENT_COUNTERPARTY = (
+    Field('counterparty_name', 47, 82, SHARED),
+    Field('communication', 82, 125, JOIN),
+)
+
+LAYOUTS = {
+    # header record
+    '0': (
+        Field('creation_date', 5, 11, DATE),
+        Field('separate_application', 83, 88, TEXT),
+    ),
+    # old balance record, CODA V1 and V2 with a belgian BBAN account
+    '1': (
+        Field('acc_number', 5, 17, SHARED),
+        Field('currency', 18, 21, SHARED),
+    ) + _OLD_BALANCE,
+    # old balance record, CODA V2 with a belgian IBAN account
+    '1-iban': (
+        Field('acc_number', 5, 21, SHARED),
+        Field('currency', 39, 42, SHARED),
+    ) + _OLD_BALANCE,
+    # old balance record, CODA V2 with a foreign IBAN account
+    '1-foreign-iban': (
+        Field('acc_number', 5, 39, SHARED),
+        Field('currency', 39, 42, SHARED),
+    ) + _OLD_BALANCE,
+    # movement record 2.1
+    '21': (
+        Field('ref', 2, 10, TEXT),
+        Field('ref_move', 2, 6, TEXT),
+        Field('ref_move_detail', 6, 10, TEXT),
+        Field('transaction_ref', 10, 31, TEXT),
+        Field('transaction_amount_sign', 31, 32, RAW),
+        Field('transaction_amount', 32, 47, AMOUNT),
+        Field('transaction_type', 53, 54, INT),
+        Field('transaction_date', 47, 53, DATE),
+        Field('transaction_family', 54, 56, SHARED),
+        Field('transaction_code', 56, 58, SHARED),
+        Field('transaction_category', 58, 61, SHARED),
+        Field('communication_is_structured', 61, 62, FLAG),
+        Field('communication_type', 62, 65, COMMUNICATION_TYPE),
+        Field('communication', 62, 115, COMMUNICATION),
+        Field('structured_reference', 62, 77, STRUCTURED_REFERENCE),
+        Field('entry_date', 115, 121, DATE),
+        Field('globalisation_code', 124, 125, INT),
+    ),
+    # movement record 2.2
+    '22': (
+        Field('communication', 10, 63, JOIN),
+        Field('payment_reference', 63, 98, TEXT),
+        Field('counterparty_bic', 98, 109, SHARED),
+    ),
+    # movement record 2.3, CODA V1
+    '23-v1': (
+        Field('counterparty_number', 10, 22, SHARED),
+        Field('counterparty_name', 47, 73, SHARED),
+        Field('counterparty_address', 73, 125, TEXT),
+    ),
+    # movement record 2.3, CODA V2 with a BBAN counterparty account
+    '23': (
+        Field('counterparty_number', 10, 22, SHARED),
+        Field('counterparty_currency', 23, 26, SHARED),
+    ) + _MOVEMENT_COUNTERPARTY,
+    # movement record 2.3, CODA V2 with an IBAN counterparty account
+    '23-long-account': (
+        Field('counterparty_number', 10, 44, SHARED),
+        Field('counterparty_currency', 44, 47, SHARED),
+    ) + _MOVEMENT_COUNTERPARTY,
+    # information record 3.1
+    '31': (
+        Field('ref', 2, 10, TEXT),
+        Field('ref_move', 2, 6, TEXT),
+        Field('ref_move_detail', 6, 10, TEXT),
+        Field('transaction_ref', 10, 31, TEXT),
+        Field('transaction_type', 31, 32, RAW),
+        Field('transaction_family', 32, 34, SHARED),
+        Field('transaction_code', 34, 36, SHARED),
+        Field('transaction_category', 36, 39, SHARED),
+        Field('communication', 40, 113, TEXT),
+    ),
+    # information records 3.2 and 3.3
+    '32': (
+        Field('communication', 10, 100, APPEND),
+    ),
+    '33': (
+        Field('communication', 10, 100, APPEND),
+    ),
+    # free communication record
+    '4': (
+        Field('ref', 2, 10, TEXT),
+        Field('communication', 32, 112, TEXT),
+    ),
+    # new balance record
+    '8': (
+        Field('new_balance_amount_sign', 41, 42, RAW),
+        Field('new_balance_paper_seq_number', 1, 4, TEXT),
+        Field('new_balance', 42, 57, AMOUNT),
+        Field('new_balance_date', 57, 63, DATE),
+    ),
+}
+
+_EXPRESSIONS = {
+    TEXT: '_text(%(value)s)',
+    SHARED: '_shared(%(value)s)',
+    RAW: '%(value)s',
+    DATE: '_date(%(value)s)',
+    AMOUNT: '_amount(%(value)s, %(sign)s)',
+    INT: 'int(%(value)s)',
+    FLAG: '%(value)s == "1"',
+    JOIN: '_join(%(current)s, _text(%(value)s))',
+    APPEND: '%(current)s + _text(%(value)s)',
+    COMMUNICATION: '_communication(%(flag)s, %(value)s)',
+    COMMUNICATION_TYPE: '_communication_type(%(flag)s, %(value)s)',
+    STRUCTURED_REFERENCE: '_structured_reference(%(flag)s, %(value)s)',
+}
+
+# kinds of the values combined with the current value of the field
+COMBINED_KINDS = (JOIN, APPEND)
+
+_code_cache = {}
+
+
+def field_expression(field, kind=None, current=None):
+    """ Return the python expression extracting the given field from a
+    record named 'line'
+    :param: kind: overrides the kind of the field
+    :param: current: expression of the current value of the field, for the
+                     combined kinds. By default the attribute of obj
+    """
+    if field.end - field.start == 1:
+        value = 'line[%d]' % field.start
+    else:
+        value = 'line[%d:%d]' % (field.start, field.end)
+    preceding = 'line[%d]' % (field.start - 1)
+    return _EXPRESSIONS[kind or field.kind] % {
+        'name': field.name,
+        'current': current or 'obj.%s' % field.name,
+        'value': value,
+        'sign': preceding,
+        'flag': preceding,
+    }
+
+
+def _compile(source, name, namespace):
+    code = _code_cache.get(source)
+    if code is None:
+        code = _code_cache[source] = compile(source, '<coda layout>', 'exec')
+    namespace = dict(namespace)
+    exec(code, namespace)
+    return namespace[name]
+
+
+def compile_extractor(layout, namespace, keep_line=None):
+    """ Build a function extract(line, obj) setting on obj the values of all
+    the fields of the given layout found in line.
+    :param: layout: a tuple of Field
+    :param: namespace: the converters used by the generated code (_text,
+                       _shared, _date, _amount, _join, _communication,
+                       _communication_type, _structured_reference)
+    :param: keep_line: if given, line is stored in the _lines dict of obj
+                       under this key
+    """
+    source = 'def extract(line, obj):\n'
+    if keep_line is not None:
+        source += '    obj._lines[%r] = line\n' % keep_line
+    source += ''.join('    obj.%s = %s\n' % (f.name, field_expression(f))
+                      for f in layout)
+    if keep_line is None and not layout:
+        source += '    pass\n'
+    return _compile(source, 'extract', namespace)
+
+
+def compile_column_extractor(layout, namespace, names=None):
+    """ Build a function extract(line, columns) storing the values of the
+    fields of the given layout found in line into a dict of columns (lists
+    or arrays by field name, see statement.MovementColumns)
+    :param: layout: a tuple of Field
+    :param: namespace: the converters used by the generated code
+    :param: names: if given, the names of all the columns: a row is
+                   appended, None for the columns without field in the
+                   layout. Otherwise the values of the last row are set
+    """
+    source = 'def extract(line, columns):\n'
+    if names is not None:
+        expressions = dict((f.name, field_expression(f)) for f in layout)
+        source += ''.join(
+            '    columns[%r].append(%s)\n' % (
+                name, expressions.get(name, 'None'))
+            for name in names)
+    else:
+        source += ''.join(
+            '    columns[%r][-1] = %s\n' % (f.name, field_expression(
+                f, current='columns[%r][-1]' % f.name))
+            for f in layout)
+    if names is None and not layout:
+        source += '    pass\n'
+    return _compile(source, 'extract', namespace)
+
+
+def compile_getter(field, namespace):
+    """ Build a function get(line) returning the value of the given field
+    found in line. For the combined kinds (JOIN, APPEND) the value is the
+    text to combine with the current value of the field.
+    """
+    kind = TEXT if field.kind in COMBINED_KINDS else field.kind
+    source = 'def get(line):\n    return %s\n' % field_expression(field, kind)
+    return _compile(source, 'get', namespace)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Instrumentation of the parser
+
+A ParserMetrics given to Parser(metrics=...) counts the records parsed and
+their cumulative parsing time by record type, the bytes decoded, the
+statements emitted and the errors by code. Without metrics the parser runs
+its handlers as is.
+"""
+import time
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# record types, as found in the first characters of the records
+RECORD_TYPES = ('0', '1', '21', '22', '23', '31', '32', '33', '4', '8', '9')
+
+
+class ParserMetrics(object):
+    """Counters and timings of the parsing
+
+    Attributes:
+        records -- number of records parsed by record type
+        times -- cumulative parsing time in seconds by record type
+        bytes_decoded -- number of bytes decoded
+        statements -- number of statements emitted
+        errors -- number of CodaParserException raised by code
+    """
+
+    def __init__(self, on_statement=None, on_error=None):
+        """
+        :param: on_statement: function called with each statement emitted
+        :param: on_error: function called with each CodaParserException
+                          raised
+        """
+        self.on_statement = on_statement
+        self.on_error = on_error
+        self.reset()
+
+    def reset(self):
+        self.records = dict((key, 0) for key in RECORD_TYPES)
+        self.times = dict((key, 0.0) for key in RECORD_TYPES)
+        self.bytes_decoded = 0
+        self.statements = 0
+        self.errors = {}
+
+    def add_record(self, record_type, duration):
+        self.records[record_type] = self.records.get(record_type, 0) + 1
+        self.times[record_type] = self.times.get(record_type, 0.0) + duration
+
+    def add_statement(self, statement):
+        self.statements += 1
+        if self.on_statement is not None:
+            self.on_statement(statement)
+
+    def add_error(self, error):
+        code = error.code.strip()
+        self.errors[code] = self.errors.get(code, 0) + 1
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def timed(self, handler):
+        """ Return the given record handler counting and timing the records
+        """
+        add_record = self.add_record
+
+        def timed_handler(line, statement):
+            start = _clock()
+            try:
+                handler(line, statement)
+            finally:
+                add_record(
+                    line[:2] if line[0] in '23' else line[0],
+                    _clock() - start)
+        return timed_handler
+
+    def snapshot(self):
+        """ Return the metrics as a flat dict of names to numbers, e.g.
+        {'records.21': 12, 'seconds.21': 0.002, 'errors.R2004': 1...} """
+        result = {
+            'bytes_decoded': self.bytes_decoded,
+            'statements': self.statements,
+        }
+        for key, value in self.records.items():
+            result['records.%s' % key] = value
+        for key, value in self.times.items():
+            result['seconds.%s' % key] = value
+        for key, value in self.errors.items():
+            result['errors.%s' % key] = value
+        return result
+
+    def to_prometheus(self, prefix='pycoda'):
+        """ Return the metrics in the Prometheus text exposition format """
+        lines = []
+
+        def add(name, kind, description, samples):
+            name = '%s_%s' % (prefix, name)
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, value in samples:
+                lines.append('%s%s %r' % (name, labels, value))
+
+        add('records_total', 'counter', 'Records parsed by record type',
+            [('{type="%s"}' % k, v) for k, v in sorted(self.records.items())])
+        add('record_seconds_total', 'counter',
+            'Time spent parsing the records by record type',
+            [('{type="%s"}' % k, v) for k, v in sorted(self.times.items())])
+        add('bytes_decoded_total', 'counter', 'Bytes decoded',
+            [('', self.bytes_decoded)])
+        add('statements_total', 'counter', 'Statements emitted',
+            [('', self.statements)])
+        add('errors_total', 'counter', 'Parsing errors by code',
+            [('{code="%s"}' % k, v) for k, v in sorted(self.errors.items())])
+        return '\n'.join(lines) + '\n'
+
+    def to_statsd(self, prefix='pycoda'):
+        """ Return the metrics as StatsD lines, the totals as gauges and the
+        cumulative times in milliseconds """
+        lines = ['%s.%s:%d|g' % (prefix, key, value)
+                 for key, value in sorted(self.snapshot().items())
+                 if not key.startswith('seconds.')]
+        lines.extend('%s.time.%s:%.3f|g' % (prefix, key, value * 1000)
+                     for key, value in sorted(self.times.items()))
+        return lines
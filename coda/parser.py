@@ -26,12 +26,36 @@
 # Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 #
 #
+import codecs
+import datetime
+import hashlib
+import mmap
 import os
 import re
+import struct
 import time
+from decimal import Decimal
 
-from .statement import MovementRecord, MovementRecordType, InformationRecord, \
-    FreeCommunication, Statement
+from . import codec
+from .columnar import statements_to_columns
+from .communication import STRUCTURED_TYPES
+from .layout import LAYOUTS, JOIN, APPEND, compile_extractor, \
+    compile_column_extractor, compile_getter
+from .interning import InternPool
+from .metrics import _clock
+from .where import Where
+from .statement import AmountSign, MovementRecord, MovementRecordType, \
+    InformationRecord, FreeCommunication, Statement, MovementColumns, \
+    LazyMovementRecord, LazyInformationRecord, link_movement, \
+    link_information, INT64_TYPECODE
+
+
+def strptime(value):
+    """ Convert a DDMMYY date as found in the CODA records to a
+    time.struct_time, the years 69 to 99 being 1969 to 1999
+    :raises: ValueError if the date is invalid
+    """
+    return time.strptime(rmspaces(value), '%d%m%y')
 
 
 class CodaParserException(Exception):
@@ -44,17 +68,263 @@ class CodaParserException(Exception):
     """
 
     def __init__(self, code, msg):
+        # the arguments are kept in args to unpickle the exception, e.g.
+        # when it is sent back by a process of coda.batch
+        super(CodaParserException, self).__init__(code, msg)
         self.code = code
         self.msg = msg
 
 
+class AmountMode(object):
+    # amount as a float (legacy)
+    FLOAT = "float"
+    # amount as an int in thousandths of the currency unit
+    INTEGER = "integer"
+    # amount as a decimal.Decimal with 3 decimals
+    DECIMAL = "decimal"
+
+
+class ParserState(object):
+    """State of a parsing, to resume it when more records are available
+
+    Attributes:
+        statement -- the last statement found
+        pending -- True if the last statement is not yet completed
+        offset -- number of bytes fed to an IncrementalParser
+        buffer -- bytes of the last incomplete record
+        started -- True once the first record has been checked
+    """
+
+    __slots__ = ('statement', 'pending', 'offset', 'buffer', 'started')
+
+    def __init__(self):
+        self.statement = None
+        self.pending = False
+        self.offset = 0
+        self.buffer = b''
+        self.started = False
+
+    def dumps(self):
+        """ Serialize the state, its statement with coda.codec
+        :returns: bytes
+        """
+        statements = [] if self.statement is None else [self.statement]
+        return b''.join([
+            _STATE_HEADER.pack(
+                _STATE_MAGIC, _STATE_VERSION, self.offset, self.pending,
+                self.started, len(self.buffer)),
+            self.buffer, codec.dumps(statements)])
+
+    @classmethod
+    def loads(cls, data):
+        """ Deserialize a state serialized by dumps
+        :raises: codec.CodecError if the data is not a valid state
+        """
+        try:
+            magic, version, offset, pending, started, size = \
+                _STATE_HEADER.unpack_from(data)
+        except struct.error:
+            raise codec.CodecError('Truncated content')
+        if magic != _STATE_MAGIC:
+            raise codec.CodecError('Not a parser state content')
+        if version != _STATE_VERSION:
+            raise codec.CodecError('Unsupported format version %d' % version)
+        state = cls()
+        state.offset = offset
+        state.pending = pending
+        state.started = started
+        start = _STATE_HEADER.size
+        state.buffer = bytes(data[start:start + size])
+        if len(state.buffer) != size:
+            raise codec.CodecError('Truncated content')
+        statements = codec.loads(data[start + size:])
+        if statements:
+            state.statement = statements[0]
+        return state
+
+
+_STATE_MAGIC = b'CODS'
+_STATE_VERSION = 1
+# magic, version, offset, pending, started, size of the buffer
+_STATE_HEADER = struct.Struct('<4sBQ??I')
+
+
 class Parser(object):
 
     """CODA file parser mapping line to Python objects
     """
 
-    def __init__(self, date_format='%Y-%m-%d'):
+    def __init__(self, date_format='%Y-%m-%d', date_cache_size=512,
+                 compact=False, amount_mode=AmountMode.FLOAT,
+                 signed_amounts=False, check_balance=False, lazy=False,
+                 fields=None, cache=None, metrics=None, intern_pool=None):
+        """
+        :param: date_format: format used to render the dates, if None the
+                             dates are returned as datetime.date objects
+        :param: date_cache_size: maximum number of converted dates kept by
+                                 the parser
+        :param: compact: if True the movements of the statements are stored
+                         in a MovementColumns instead of a list
+        :param: amount_mode: type of the amounts (see AmountMode)
+        :param: signed_amounts: if True the debit amounts are negative
+        :param: check_balance: if True a CodaParserException is raised when
+                               the new balance of a statement is not the
+                               old balance plus its movements
+        :param: lazy: if True the movement and information records keep
+                      their lines and only decode a field when it is read
+        :param: fields: names of the fields to decode, None for all the
+                        fields. A name applies to all the records having
+                        such a field, the other fields are left to None and
+                        the records without any requested field are skipped
+        :param: cache: cache of the parsed statements (see coda.cache),
+                       parse and parse_file load the statements from it
+                       when the same content was already parsed with the
+                       same options
+        :param: metrics: a coda.metrics.ParserMetrics counting and timing
+                         the parsing
+        :param: intern_pool: a coda.interning.InternPool sharing the values
+                             of the fields repeated across the records
+                             (currency, transaction family and code,
+                             counterparty...), True for a pool of the
+                             parser. A pool can be shared by several parsers
+        """
+        if amount_mode not in AMOUNT_CONVERTERS:
+            raise ValueError('Unknown amount mode %s' % amount_mode)
+        if lazy and compact:
+            raise ValueError('The lazy and compact modes are exclusive')
+        self._date_cache = {}
         self.date_format = date_format
+        self.date_cache_size = date_cache_size
+        self.compact = compact
+        self.amount_mode = amount_mode
+        self.signed_amounts = signed_amounts
+        self.check_balance = check_balance
+        self.lazy = lazy
+        if fields is not None:
+            fields = frozenset(fields)
+            unknown = fields - ALL_FIELDS
+            if unknown:
+                raise ValueError(
+                    'Unknown fields %s' % ', '.join(sorted(unknown)))
+        self.fields = fields
+        self.cache = cache
+        self.metrics = metrics
+        if intern_pool is True:
+            intern_pool = InternPool()
+        self.intern_pool = intern_pool
+        self._compile_extractors()
+
+    def _compile_extractors(self):
+        """ Build the functions extracting the fields of each kind of record
+        from the layouts
+        """
+        shared = rmspaces
+        if self.intern_pool is not None:
+            shared = self.intern_pool.text
+        namespace = {
+            '_text': rmspaces,
+            '_shared': shared,
+            '_date': self._parse_date,
+            '_amount': self._amount_converter(),
+            '_join': join_communications,
+            '_communication': _communication,
+            '_communication_type': _communication_type,
+            '_structured_reference': _structured_reference,
+        }
+        self._extractors = {}
+        # extractors of the movement records storing the values into the
+        # columns of a MovementColumns (compact mode)
+        self._column_extractors = {}
+        # for each field of the lazy records, the layouts where it is found
+        # as (layout key, kind, getter), in the order of the records
+        self._sources = {}
+        fields = self._projected_fields()
+        for key in sorted(LAYOUTS):
+            layout = LAYOUTS[key]
+            if fields is not None:
+                layout = [f for f in layout
+                          if f.name in fields or f.name in STRUCTURAL_FIELDS]
+            if self.lazy and key[0] in '23':
+                for field in layout:
+                    self._sources.setdefault(field.name, []).append(
+                        (key, field.kind, compile_getter(field, namespace)))
+                extract = compile_extractor(
+                    [f for f in layout if f.name in STRUCTURAL_FIELDS],
+                    namespace, keep_line=key)
+                if key not in ('21', '31'):
+                    # the record continued may be a decoded one, restored
+                    # from a checkpoint
+                    extract = _continuation_extractor(
+                        extract, compile_extractor(layout, namespace))
+                self._extractors[key] = extract
+            else:
+                self._extractors[key] = compile_extractor(layout, namespace)
+                if key[0] == '2':
+                    self._column_extractors[key] = compile_column_extractor(
+                        layout, namespace,
+                        MovementRecord.__slots__ if key == '21' else None)
+        # the fields not decoded are None and stored in lists
+        self._movement_typecodes = dict(
+            (name, typecode) for name, typecode
+            in MOVEMENT_TYPECODES[self.amount_mode].items()
+            if fields is None or name in fields or
+            name in STRUCTURAL_FIELDS)
+
+        self._handlers = {
+            '1': self._parseHeaderDetails,
+            '2': self._parseMovementRecord,
+            '3': self._parseInformationRecord,
+            '4': self.parseFreeCommunication,
+            '8': self._parseNewBalanceRecord,
+        }
+        if fields is not None:
+            if not fields & MOVEMENT_FIELDS:
+                del self._handlers['2']
+            if not fields & INFORMATION_FIELDS:
+                del self._handlers['3']
+            if not fields & FREE_COMMUNICATION_FIELDS:
+                del self._handlers['4']
+        if self.metrics is not None:
+            self._handlers = dict(
+                (key, self.metrics.timed(handler))
+                for key, handler in self._handlers.items())
+
+    def _projected_fields(self):
+        """ Return the requested fields, with the ones needed by the balance
+        check, None for all the fields """
+        if self.fields is None:
+            return None
+        fields = set(self.fields)
+        if self.check_balance:
+            fields.update(BALANCE_FIELDS)
+        return frozenset(fields)
+
+    def _resolve(self, record, name):
+        """ Compute the value of a field of a lazy record from its lines,
+        as the extractors would have done
+        """
+        value = None
+        lines = record._lines
+        for key, kind, get in self._sources.get(name, ()):
+            line = lines.get(key)
+            if line is None:
+                continue
+            if kind == JOIN:
+                value = join_communications(value, get(line))
+            elif kind == APPEND:
+                value += get(line)
+            else:
+                value = get(line)
+        return value
+
+    @property
+    def date_format(self):
+        return self._date_format
+
+    @date_format.setter
+    def date_format(self, value):
+        self._date_format = value
+        self._date_cache.clear()
 
     def is_valid_coda(self, value):
         """ Check if the given value is a valid coda content
@@ -62,66 +332,285 @@ class Parser(object):
         :type param: str
         :returms: True id valid False otherwise
         """
-        # Matches the first 24 characters of a CODA file, as defined by
-        # the febelfin specifications
-        return re.match(r'0{5}\d{9}05[ D] {7}', value) is not None
+        return _CODA_HEADER.match(value) is not None
 
-    def parse_file(self, fp):
+    def parse_file(self, fp, where=None):
         """ Parse the given file
          :param: fp: the path to the file to parse or a valid file-like object
+                     or a buffer (mmap, memoryview, bytearray, bytes)
+         :param: where: a Where, or a dict of its arguments, filtering the
+                        statements and the movements
          :returms: return a list of Statement objects found in the input file
          :rtype: list
         """
-        if hasattr(fp, 'read'):
-            return self.parse(fp.read())
+        if self.cache is not None:
+            # the content is hashed as a whole to look it up in the cache
+            if _is_buffer(fp):
+                return self.parse(fp, where=where)
+            elif hasattr(fp, 'read'):
+                return self.parse(fp.read(), where=where)
+            elif os.path.exists(fp):
+                with open(fp, 'rb') as f:
+                    return self.parse(f.read(), where=where)
+        return list(self.iter_statements(fp, where=where))
+
+    def iter_statements(self, fp, where=None):
+        """ Iterate over the statements of the given file
+        The file is read record by record and each statement is yielded as
+        soon as its trailer record is read, so the memory used is bounded by
+        the largest statement and not by the size of the file.
+         :param: fp: the path to the file to parse, a valid binary
+                     file-like object or a buffer (mmap, memoryview,
+                     bytearray, bytes) whose records are decoded one by one
+         :param: where: a Where, or a dict of its arguments, filtering the
+                        statements and the movements
+         :returns: an iterator over the Statement objects found in the file
+        """
+        if _is_buffer(fp) or hasattr(fp, 'read'):
+            for statement in self._iter_parsed(
+                    self.iter_records(fp, where=where)):
+                yield statement
         elif os.path.exists(fp):
             with open(fp, 'rb') as f:
-                return self.parse(f.read())
+                for statement in self._iter_parsed(
+                        self.iter_records(f, where=where)):
+                    yield statement
         else:
             raise ValueError('The given argument is not a valid file-like '
                              'object nor a valid path to an existing file.')
 
-    def parse(self, value):
+    def iter_records(self, fp, where=None):
+        """ Iterate over the records of the given binary file-like object or
+        buffer (bytes, mmap, memoryview)
+        Each record is decoded on its own, the input is never copied nor
+        decoded as a whole.
+         :param: fp: a binary file-like object or a buffer
+         :param: where: a Where, or a dict of its arguments: the records
+                        filtered out are skipped before being decoded
+         :returns: an iterator over the decoded records (lines)
+        """
+        if isinstance(fp, BUFFER_TYPES):
+            lines = _iter_buffer_lines(fp)
+        else:
+            lines = (line[:-1] if line[-1:] == b'\n' else line
+                     for line in fp)
+        where = self._where(where)
+        if where is not None:
+            lines = where.filter(self._check_first_line(lines))
+        # the first line is checked before being filtered out
+        first = where is None
+        metrics = self.metrics
+        for line in lines:
+            if metrics is not None:
+                metrics.bytes_decoded += len(line)
+            line = codecs.decode(line, 'windows-1252', 'strict')
+            if first:
+                if not self.is_valid_coda(line):
+                    raise ValueError(
+                        'The given value is not a valid coda content')
+                first = False
+            yield line
+        if first:
+            raise ValueError('The given value is not a valid coda content')
+
+    def _check_first_line(self, lines):
+        """ Check that the first of the given raw lines is a valid header,
+        before the lines are filtered """
+        lines = iter(lines)
+        for line in lines:
+            if not self.is_valid_coda(
+                    codecs.decode(line, 'windows-1252', 'strict')):
+                raise ValueError('The given value is not a valid coda content')
+            yield line
+            break
+        else:
+            raise ValueError('The given value is not a valid coda content')
+        for line in lines:
+            yield line
+
+    def _where(self, where):
+        if where is None:
+            return None
+        if self.check_balance:
+            raise ValueError('The balance of the statements can not be '
+                             'checked when their movements are filtered')
+        if isinstance(where, dict):
+            where = Where(**where)
+        return where
+
+    def parse(self, value, where=None):
         """Parse the given value.
         :param: value: data to parse
-        :type param: bytes
+        :type param: bytes, mmap or memoryview
+        :param: where: a Where, or a dict of its arguments, filtering the
+                       statements and the movements. The records filtered out
+                       are never decoded nor parsed
         :returms: return a list of Statement objects found in value
          :rtype: list
         """
+        where = self._where(where)
+        if self.cache is not None:
+            return self._parse_cached(value, where)
+        return self._parse(value, where)
+
+    def _parse(self, value, where=None):
+        if where is not None:
+            return list(self._iter_parsed(self.iter_records(value, where)))
+        if isinstance(value, (mmap.mmap, memoryview)):
+            # mmap or memoryview, decoded record by record
+            return list(self._iter_parsed(self.iter_records(value)))
+        return list(self._iter_parsed(self._decode(value)))
+
+    def _parse_cached(self, value, where=None):
+        key = self.cache_key(value, where)
+        data = self.cache.get(key)
+        if data is not None:
+            return codec.loads(data)
+        statements = self._parse(value, where)
+        try:
+            data = codec.dumps(statements)
+        except codec.CodecError:
+            # parsed but not cached
+            return statements
+        self.cache.set(key, data)
+        return statements
+
+    def cache_key(self, value, where=None):
+        """ Return the key of the statements parsed from the given value
+        in a cache: a hash of the value and of the options of the parser
+        changing the statements
+        :param: value: data to parse
+        :type param: bytes, mmap or memoryview
+        :param: where: the Where filtering the statements, if any
+        :returns: the hexadecimal digest
+         :rtype: str
+        """
+        options = (
+            CACHE_FORMAT, codec.FORMAT_VERSION, self.date_format,
+            self.compact, self.amount_mode, self.signed_amounts,
+            self.check_balance,
+            sorted(self.fields) if self.fields is not None else None,
+            repr(where) if where is not None else None)
+        digest = hashlib.sha256(repr(options).encode('utf-8'))
+        digest.update(value)
+        return digest.hexdigest()
+
+    def parse_columnar(self, value):
+        """Parse the given value into numpy arrays
+        The movements are stored column by column while parsing and the
+        columns of all the statements are concatenated. numpy is required.
+        :param: value: data to parse
+        :type param: bytes
+        :returns: a dict of numpy arrays by field name of MovementRecord,
+                  only the fields of the projection if the parser has one.
+                  The 'statement' array gives the index of the statement of
+                  each movement
+        """
+        if self.lazy:
+            raise ValueError('The columnar parsing is not available in lazy '
+                             'mode')
+        parser = self
+        if self.date_format is not None:
+            # the datetime64 columns are built from datetime.date objects
+            options = self._options()
+            options['date_format'] = None
+            parser = self.__class__(**options)
+        return statements_to_columns(
+            parser._iter_parsed(parser._decode(value), compact=True),
+            self.fields)
+
+    def _options(self):
+        """ Return the keyword arguments of a parser with the same options
+        """
+        return dict(
+            date_format=self.date_format,
+            date_cache_size=self.date_cache_size, compact=self.compact,
+            amount_mode=self.amount_mode,
+            signed_amounts=self.signed_amounts,
+            check_balance=self.check_balance, lazy=self.lazy,
+            fields=self.fields, cache=self.cache, metrics=self.metrics,
+            intern_pool=self.intern_pool)
+
+    def _decode(self, value):
+        """ Decode the given value and split it into records """
+        if self.metrics is not None:
+            self.metrics.bytes_decoded += len(value)
         value_unicode = value.decode('windows-1252', 'strict')
         if not self.is_valid_coda(value_unicode):
             raise ValueError('The given value is not a valid coda content')
-        recordlist = value_unicode.split('\n')
-        statements = []
-        statement = None
-        for line in recordlist:
-            if not line:
-                pass
-            elif line[0] == '0':
-                self.__fixes_globalisation_without_details(
-                    statement)
-                # Begin of a new Bank statement
-                statement = Statement()
-                self._parseHeader(line, statement)
-                statements.append(statement)
-
-            elif line[0] == '1':
-                # Statement details
-                self._parseHeaderDetails(line, statement)
-            elif line[0] == '2':
-                self._parseMovementRecord(line, statement)
-            elif line[0] == '3':
-                self._parseInformationRecord(line, statement)
-            elif line[0] == '4':
-                self.parseFreeCommunication(line, statement)
-            elif line[0] == '8':
-                # new balance record
-                self._parseNewBalanceRecord(line, statement)
-            elif line[0] == '9':
-                # trailer record
-                pass
-        self.__fixes_globalisation_without_details(statement)
-        return statements
+        return value_unicode.split('\n')
+
+    def _iter_parsed(self, records, compact=None, state=None, finish=True):
+        """ Map the given records to Statement objects
+        A statement is yielded once its trailer record (9) is read, or when
+        the next header record (0) or the end of the input is reached for
+        statements without trailer.
+        :param: compact: overrides the compact attribute of the parser
+        :param: state: ParserState to resume from and to update
+        :param: finish: if True the records are the end of the input
+        """
+        if compact is None:
+            compact = self.compact
+        if state is None:
+            state = ParserState()
+        handlers = self._handlers
+        metrics = self.metrics
+        statement = state.statement
+        pending = state.pending
+        try:
+            for line in records:
+                if not line:
+                    pass
+                elif line[0] == '0':
+                    self.__fixes_globalisation_without_details(
+                        statement)
+                    if pending:
+                        if metrics is not None:
+                            metrics.add_statement(statement)
+                        yield statement
+                    if metrics is not None:
+                        start = _clock()
+                    # Begin of a new Bank statement
+                    statement = self._new_statement(compact)
+                    pending = False
+                    self._parseHeader(line, statement)
+                    pending = True
+                    if metrics is not None:
+                        metrics.add_record('0', _clock() - start)
+                elif line[0] == '9':
+                    if metrics is not None:
+                        start = _clock()
+                    # trailer record, the statement is complete
+                    self.__fixes_globalisation_without_details(statement)
+                    if metrics is not None:
+                        metrics.add_record('9', _clock() - start)
+                    if pending:
+                        pending = False
+                        if metrics is not None:
+                            metrics.add_statement(statement)
+                        yield statement
+                else:
+                    # statement details (1), movement (2), information (3),
+                    # free communication (4) and new balance (8) records.
+                    # The records not needed by the fields projection have
+                    # no handler
+                    handler = handlers.get(line[0])
+                    if handler is not None:
+                        handler(line, statement)
+            if finish:
+                self.__fixes_globalisation_without_details(statement)
+                if pending:
+                    pending = False
+                    if metrics is not None:
+                        metrics.add_statement(statement)
+                    yield statement
+        except CodaParserException as e:
+            if metrics is not None:
+                metrics.add_error(e)
+            raise
+        finally:
+            state.statement = statement
+            state.pending = pending
 
     def __fixes_globalisation_without_details(self, statement):
         """ Change the movement type from globalisation to normal for the last
@@ -132,77 +621,83 @@ class Parser(object):
             if mv.type == MovementRecordType.GLOBALISATION:
                 mv.type = MovementRecordType.NORMAL
 
+    def _parse_date(self, value):
+        """ Convert a DDMMYY date as found in the CODA records
+        The converted dates are memoized since a statement only refers to a
+        few distinct dates.
+        """
+        try:
+            return self._date_cache[value]
+        except KeyError:
+            pass
+        date = strptime(value)
+        if self._date_format is None:
+            result = datetime.date(*date[:3])
+        else:
+            result = time.strftime(self._date_format, date)
+        if len(self._date_cache) >= self.date_cache_size:
+            self._date_cache.clear()
+        self._date_cache[value] = result
+        return result
+
+    def _new_statement(self, compact):
+        statement = Statement()
+        if compact:
+            statement.movements = MovementColumns(self._movement_typecodes)
+            # the rows of the columns are not linked
+            statement.movement_by_ref = None
+        return statement
+
+    def _amount_converter(self):
+        """ Return the function converting the amounts as specified by
+        the amount_mode and signed_amounts attributes
+        """
+        convert = AMOUNT_CONVERTERS[self.amount_mode]
+        if not self.signed_amounts:
+            return convert
+
+        def convert_signed(value, sign):
+            if sign == AmountSign.DEBIT:
+                return -convert(value, sign)
+            return convert(value, sign)
+        return convert_signed
+
     def _parseHeader(self, line, statement):
         statement.version = version = line[127]
         if version not in ['1', '2']:
             raise CodaParserException(
                 ' R001', 'CODA V%s statements are not supported, please '
                 'contact your bank' % statement.version)
-        statement.creation_date = time.strftime(
-            self.date_format, time.strptime(rmspaces(line[5:11]), '%d%m%y'))
-        statement.separate_application = rmspaces(line[83:88])
+        self._extractors['0'](line, statement)
 
     def _parseHeaderDetails(self, line, statement):
         if statement.version == '1':
-            statement.acc_number = rmspaces(line[5:17])
-            statement.currency = rmspaces(line[18:21])
+            self._extractors['1'](line, statement)
         elif statement.version == '2':
             if line[1] == '0':  # Belgian bank account BBAN structure
-                statement.acc_number = rmspaces(line[5:17])
-                statement.currency = rmspaces(line[18:21])
+                self._extractors['1'](line, statement)
             elif line[1] == '1':  # foreign bank account BBAN structure
                 raise CodaParserException(
                     ' R1001', 'Foreign bank accounts with BBAN structure are '
                     'not supported ')
             elif line[1] == '2':  # Belgian bank account IBAN structure
-                statement.acc_number = rmspaces(line[5:21])
-                statement.currency = rmspaces(line[39:42])
+                self._extractors['1-iban'](line, statement)
             elif line[1] == '3':  # foreign bank account IBAN structure
-                _val = line[5:42]
-                statement.acc_number = rmspaces(_val[:-3])
-                statement.currency = rmspaces(_val[-3:])
+                self._extractors['1-foreign-iban'](line, statement)
             else:  # Something else, not supported
                 raise CodaParserException(
                     ' R1003', 'Unsupported bank account structure ')
 
-        statement.description = rmspaces(line[90:125])
-        statement.old_balance = float(rmspaces(line[43:58])) / 1000
-        statement.old_balance_amount_sign = line[42]
-        statement.old_balance_date = time.strftime(
-            self.date_format, time.strptime(rmspaces(line[58:64]), '%d%m%y'))
-        statement.account_holder_name = rmspaces(line[64:90])
-        statement.paper_seq_number = rmspaces(line[2:5])
-        statement.coda_seq_number = rmspaces(line[125:128])
-
     def _parseMovementRecord(self, line, statement):
-        if line[1] == '1':
+        if statement.movements.__class__ is MovementColumns:
+            self._parseMovementColumns(line, statement.movements, statement)
+        elif line[1] == '1':
             # New statement line
-            record = MovementRecord()
-            record.ref = rmspaces(line[2:10])
-            record.ref_move = rmspaces(line[2:6])
-            record.ref_move_detail = rmspaces(line[6:10])
-            record.transaction_ref = rmspaces(line[10:31])
-            record.transaction_amount_sign = line[31]  # 0 = Credit, 1 = Debit
-            record.transaction_amount = float(rmspaces(line[32:47])) / 1000
-            record.transaction_type = int(line[53])
-            record.transaction_date = time.strftime(
-                self.date_format, time.strptime(
-                    rmspaces(line[47:53]), '%d%m%y'))
-            record.transaction_family = rmspaces(line[54:56])
-            record.transaction_code = rmspaces(line[56:58])
-            record.transaction_category = rmspaces(line[58:61])
-            record.communication_is_structured = line[61] == '1'
-            if record.communication_is_structured:
-                # Structured communication
-                record.communication_type = line[62:65]
-                record.communication = '+++' + \
-                    line[65:68] + '/' + line[68:72] + '/' + line[72:77] + '+++'
+            if self.lazy:
+                record = LazyMovementRecord(self._resolve)
             else:
-                # Non-structured communication
-                record.communication = rmspaces(line[62:115])
-            record.entry_date = time.strftime(
-                self.date_format, time.strptime(
-                    rmspaces(line[115:121]), '%d%m%y'))
+                record = MovementRecord()
+            self._extractors['21'](line, record)
             record.type = MovementRecordType.NORMAL
 
             if record.transaction_type in [1, 2, 3]:
@@ -223,7 +718,8 @@ class Parser(object):
                 record.transaction_type < 4 and \
                     prev_mvmt.type == MovementRecordType.GLOBALISATION:
                 prev_mvmt.type = MovementRecordType.NORMAL
-            record.globalisation_code = int(line[124])
+            if statement.movement_by_ref is not None:
+                link_movement(statement, record, prev_mvmt)
             statement.movements.append(record)
         elif line[1] == '2':
             record = statement.movements[-1]
@@ -231,10 +727,7 @@ class Parser(object):
                 raise CodaParserException(
                     'R2004', 'CODA parsing error on movement data record 2.2, '
                     'seq nr %s!' % line[2:10])
-            record.communication = join_communications(
-                record.communication, rmspaces(line[10:63]))
-            record.payment_reference = rmspaces(line[63:98])
-            record.counterparty_bic = rmspaces(line[98:109])
+            self._extractors['22'](line, record)
         elif line[1] == '3':
             record = statement.movements[-1]
             if record.ref[0:4] != line[2:6]:
@@ -242,20 +735,54 @@ class Parser(object):
                     'R2005', 'CODA parsing error on movement data record 2.3, '
                     'eq nr %s!' % line[2:10])
             if statement.version == '1':
-                record.counterparty_number = rmspaces(line[10:22])
-                record.counterparty_name = rmspaces(line[47:73])
-                record.counterparty_address = rmspaces(line[73:125])
+                self._extractors['23-v1'](line, record)
                 record.counterparty_currency = ''
+            elif line[22] == ' ':
+                self._extractors['23'](line, record)
             else:
-                if line[22] == ' ':
-                    record.counterparty_number = rmspaces(line[10:22])
-                    record.counterparty_currency = rmspaces(line[23:26])
-                else:
-                    record.counterparty_number = rmspaces(line[10:44])
-                    record.counterparty_currency = rmspaces(line[44:47])
-                record.counterparty_name = rmspaces(line[47:82])
-                record.communication = join_communications(
-                    record.communication, rmspaces(line[82:125]))
+                self._extractors['23-long-account'](line, record)
+        else:
+            # movement data record 2.x (x != 1,2,3)
+            raise CodaParserException(
+                'R2006', '\nMovement data records of type 2.%s are not '
+                'supported ' % line[1])
+
+    def _parseMovementColumns(self, line, movements, statement):
+        """ Store the values of a movement record straight into the columns
+        of a MovementColumns, as _parseMovementRecord does for the records
+        """
+        columns = movements.columns
+        extractors = self._column_extractors
+        if line[1] == '1':
+            movements.append_line(extractors['21'], line)
+            transaction_type = columns['transaction_type'][-1]
+            types = columns['type']
+            # see _parseMovementRecord for the globalisations
+            if transaction_type < 4 and len(types) > 1 and \
+                    types[-2] == MovementRecordType.GLOBALISATION:
+                types[-2] = MovementRecordType.NORMAL
+            if transaction_type in (1, 2, 3):
+                types[-1] = MovementRecordType.GLOBALISATION
+            else:
+                types[-1] = MovementRecordType.NORMAL
+        elif line[1] == '2':
+            if columns['ref'][-1][0:4] != line[2:6]:
+                raise CodaParserException(
+                    'R2004', 'CODA parsing error on movement data record 2.2, '
+                    'seq nr %s!' % line[2:10])
+            extractors['22'](line, columns)
+        elif line[1] == '3':
+            if columns['ref'][-1][0:4] != line[2:6]:
+                raise CodaParserException(
+                    'R2005', 'CODA parsing error on movement data record 2.3, '
+                    'eq nr %s!' % line[2:10])
+            if statement.version == '1':
+                extractors['23-v1'](line, columns)
+                columns['counterparty_currency'][-1] = ''
+            elif line[22] == ' ':
+                extractors['23'](line, columns)
+            else:
+                extractors['23-long-account'](line, columns)
         else:
             # movement data record 2.x (x != 1,2,3)
             raise CodaParserException(
@@ -264,16 +791,15 @@ class Parser(object):
 
     def _parseInformationRecord(self, line, statement):
         if line[1] == '1':
-            infoLine = InformationRecord()
-            infoLine.ref = rmspaces(line[2:10])
-            infoLine.ref_move = rmspaces(line[2:6])
-            infoLine.ref_move_detail = rmspaces(line[6:10])
-            infoLine.transaction_ref = rmspaces(line[10:31])
-            infoLine.transaction_type = line[31]
-            infoLine.transaction_family = rmspaces(line[32:34])
-            infoLine.transaction_code = rmspaces(line[34:36])
-            infoLine.transaction_category = rmspaces(line[36:39])
-            infoLine.communication = rmspaces(line[40:113])
+            if self.lazy:
+                infoLine = LazyInformationRecord(self._resolve)
+            else:
+                infoLine = InformationRecord()
+            self._extractors['31'](line, infoLine)
+            if statement.movement_by_ref is not None:
+                link_information(
+                    statement.movements[-1] if statement.movements else None,
+                    infoLine)
             statement.informations.append(infoLine)
         elif line[1] == '2':
             infoLine = statement.informations[-1]
@@ -281,29 +807,253 @@ class Parser(object):
                 raise CodaParserException(
                     'R3004', 'CODA parsing error on information data '
                     'record 3.2, seq nr %s!' % line[2:10])
-            infoLine.communication += rmspaces(line[10:100])
+            self._extractors['32'](line, infoLine)
         elif line[1] == '3':
             infoLine = statement.informations[-1]
             if infoLine.ref != rmspaces(line[2:10]):
                 raise CodaParserException(
                     'R3005', 'CODA parsing error on information data '
                     'record 3.3, seq nr %s!' % line[2:10])
-            infoLine.communication += rmspaces(line[10:100])
+            self._extractors['33'](line, infoLine)
 
     def _parseNewBalanceRecord(self, line, statement):
-        statement.new_balance_amount_sign = line[41]
-        statement.new_balance_paper_seq_number = rmspaces(line[1:4])
-        statement.new_balance = float(rmspaces(line[42:57])) / 1000
-        statement.new_balance_date = time.strftime(
-            self.date_format, time.strptime(rmspaces(line[57:63]), '%d%m%y'))
+        self._extractors['8'](line, statement)
+        if self.check_balance and not statement.is_balanced():
+            raise CodaParserException(
+                'R8001', 'CODA parsing error on new balance record, the new '
+                'balance does not match the movements of statement %s' %
+                statement.new_balance_paper_seq_number)
 
     def parseFreeCommunication(self, line, statement):
         comm_line = FreeCommunication()
-        comm_line.ref = rmspaces(line[2:10])
-        comm_line.communication = rmspaces(line[32:112])
+        self._extractors['4'](line, comm_line)
         statement.free_comunications.append(comm_line)
 
 
+BUFFER_TYPES = (bytes, mmap.mmap, memoryview, bytearray)
+
+# version of the statements stored in a cache, to change when the model or
+# its serialization changes
+CACHE_FORMAT = 2
+
+_NEWLINE = re.compile(b'\n')
+
+
+def _is_buffer(value):
+    """ Check if the given value is a buffer of records rather than a path,
+    bytes being also the str of the paths on Python 2 """
+    if bytes is str and isinstance(value, bytes):
+        return b'\n' in value
+    return isinstance(value, BUFFER_TYPES)
+
+
+# Matches the first 24 characters of a CODA file, as defined by the febelfin
+# specifications
+_CODA_HEADER = re.compile(r'0{5}\d{9}05[ D] {7}')
+
+
+def _regex_accepts_memoryview():
+    try:
+        _NEWLINE.search(memoryview(b''))
+    except TypeError:
+        # Python 2
+        return False
+    return True
+
+
+_REGEX_ACCEPTS_MEMORYVIEW = _regex_accepts_memoryview()
+
+
+def _iter_buffer_lines(buf):
+    """ Iterate over the lines of the given buffer, as slices of the buffer
+    The lines of a mmap are read from its start by its readline method,
+    faster than reading the file line by line.
+    """
+    if isinstance(buf, mmap.mmap):
+        buf.seek(0)
+        for line in iter(buf.readline, b''):
+            yield line[:-1] if line[-1:] == b'\n' else line
+        return
+    if not _REGEX_ACCEPTS_MEMORYVIEW and isinstance(buf, memoryview):
+        buf = buf.tobytes()
+    start = 0
+    for match in _NEWLINE.finditer(buf):
+        end = match.start()
+        yield buf[start:end]
+        start = end + 1
+    if start < len(buf):
+        yield buf[start:]
+
+
+# fields always decoded while parsing, even by the lazy records or with a
+# fields projection, since the parser needs them to check the records and
+# detect the globalisations
+STRUCTURAL_FIELDS = frozenset(['ref', 'transaction_type'])
+
+STATEMENT_FIELDS = frozenset(Statement.__slots__)
+MOVEMENT_FIELDS = frozenset(MovementRecord.__slots__)
+INFORMATION_FIELDS = frozenset(InformationRecord.__slots__)
+FREE_COMMUNICATION_FIELDS = frozenset(FreeCommunication.__slots__)
+ALL_FIELDS = STATEMENT_FIELDS | MOVEMENT_FIELDS | INFORMATION_FIELDS | \
+    FREE_COMMUNICATION_FIELDS
+BALANCE_FIELDS = frozenset([
+    'old_balance', 'old_balance_amount_sign', 'new_balance',
+    'new_balance_amount_sign', 'transaction_amount',
+    'transaction_amount_sign'])
+
+
+def _continuation_extractor(lazy_extract, extract):
+    """ Return an extractor for the continuation records (2.2, 2.3, 3.2,
+    3.3) of the lazy mode, falling back to extract if the continued record
+    is not a lazy one
+    """
+    def continuation_extract(line, obj):
+        if hasattr(obj, '_lines'):
+            lazy_extract(line, obj)
+        else:
+            extract(line, obj)
+    return continuation_extract
+
+
+def _communication(flag, value):
+    if flag == '1':
+        # Structured communication
+        return '+++' + value[3:6] + '/' + value[6:10] + '/' + value[10:15] + \
+            '+++'
+    # Non-structured communication
+    return rmspaces(value)
+
+
+def _communication_type(flag, value):
+    if flag == '1':
+        return value[:3]
+    return None
+
+
+def _structured_reference(flag, value):
+    # value is the type of the communication followed by its 12 digits
+    digits = value[3:]
+    if flag == '1' and value[:3] in STRUCTURED_TYPES and \
+            len(digits) == 12 and not digits.strip('0123456789'):
+        return int(digits)
+    return None
+
+
+def _float_amount(value, sign):
+    return float(rmspaces(value)) / 1000
+
+
+def _integer_amount(value, sign):
+    return int(value)
+
+
+def _decimal_amount(value, sign):
+    return Decimal(int(value)).scaleb(-3)
+
+
+AMOUNT_CONVERTERS = {
+    AmountMode.FLOAT: _float_amount,
+    AmountMode.INTEGER: _integer_amount,
+    AmountMode.DECIMAL: _decimal_amount,
+}
+
+# typecodes of the MovementColumns by amount mode
+MOVEMENT_TYPECODES = {
+    AmountMode.FLOAT: {
+        'transaction_amount': 'd',
+        'transaction_type': 'b',
+        'globalisation_code': 'b',
+    },
+    AmountMode.INTEGER: {
+        'transaction_type': 'b',
+        'globalisation_code': 'b',
+    },
+    AmountMode.DECIMAL: {
+        'transaction_type': 'b',
+        'globalisation_code': 'b',
+    },
+}
+if INT64_TYPECODE is not None:
+    # otherwise the int amounts are stored in a list
+    MOVEMENT_TYPECODES[AmountMode.INTEGER]['transaction_amount'] = \
+        INT64_TYPECODE
+
+
+class IncrementalParser(object):
+
+    """Parser of CODA content received piece by piece, e.g. a file to which
+    statements are appended during the day
+
+    The state of the parsing (see ParserState) can be saved with checkpoint
+    and given back to a new IncrementalParser to resume the parsing later.
+    """
+
+    def __init__(self, parser=None, state=None):
+        """
+        :param: parser: the Parser used to parse the records
+        :param: state: a ParserState or a checkpoint to resume from
+        """
+        self.parser = parser or Parser()
+        if isinstance(state, bytes):
+            state = ParserState.loads(state)
+        self.state = state or ParserState()
+
+    def feed(self, data):
+        """ Parse the given data, following the data already fed
+        :param: data: bytes
+        :returns: the list of the statements completed by the data
+        """
+        state = self.state
+        records = (state.buffer + data).split(b'\n')
+        buffer = records.pop()
+        statements = list(self.parser._iter_parsed(
+            self._decode(records), state=state, finish=False))
+        # only once the data is parsed, to feed it again after an error
+        state.buffer = buffer
+        state.offset += len(data)
+        return statements
+
+    def feed_file(self, path):
+        """ Parse the data appended to the given file since the last call
+        :returns: the list of the statements completed by the new data
+        """
+        with open(path, 'rb') as f:
+            f.seek(self.state.offset)
+            return self.feed(f.read())
+
+    def close(self):
+        """ Parse the last incomplete record and complete the last statement
+        :returns: the list of the statements completed
+        """
+        state = self.state
+        records = [state.buffer] if state.buffer else []
+        state.buffer = b''
+        statements = list(self.parser._iter_parsed(
+            self._decode(records), state=state))
+        if not state.started:
+            raise ValueError('The given value is not a valid coda content')
+        return statements
+
+    def checkpoint(self):
+        """ Return the state of the parsing as bytes (see ParserState.dumps)
+        """
+        return self.state.dumps()
+
+    def _decode(self, records):
+        state = self.state
+        metrics = self.parser.metrics
+        for record in records:
+            if metrics is not None:
+                metrics.bytes_decoded += len(record)
+            record = record.decode('windows-1252', 'strict')
+            if not state.started:
+                if not self.parser.is_valid_coda(record):
+                    raise ValueError(
+                        'The given value is not a valid coda content')
+                state.started = True
+            yield record
+
+
 def join_communications(c1, c2):
     if not c1:
         return c2
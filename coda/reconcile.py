@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Index of the movements of parsed statements, to reconcile them with open
+items (invoices...) without scanning the movements for each item
+"""
+from collections import namedtuple
+
+from .communication import parse_structured_reference
+# kept importable from this module
+from .communication import STRUCTURED_TYPES  # noqa: F401
+from .statement import to_thousandths
+
+
+class Match(namedtuple('Match', 'statement movement')):
+    """ A movement found in the index, with its statement """
+    __slots__ = ()
+
+
+def structured_digits(value):
+    """ Return the 12 digits of a structured communication given as
+    +++ddd/dddd/ddddd+++, ***ddd/dddd/ddddd*** or as digits, None if the
+    value is not a structured communication
+    """
+    reference = parse_structured_reference(value)
+    if reference is None:
+        return None
+    return '%012d' % reference
+
+
+def _account(value):
+    if not value:
+        return None
+    return value.replace(' ', '').upper() or None
+
+
+class ReconciliationIndex(object):
+    """Hash maps of the movements of statements by structured
+    communication, payment reference, counterparty account and amount
+
+    The amounts are keyed in thousandths of the currency unit, negative for
+    the debits, and the dates are keyed by the entry date of the movements,
+    in the format given by the parser.
+    """
+
+    def __init__(self, statements=()):
+        self.by_communication = {}
+        self.by_payment_reference = {}
+        self.by_counterparty = {}
+        self.by_amount = {}
+        self.by_amount_date = {}
+        self.add(statements)
+
+    def __len__(self):
+        return sum(len(v) for v in self.by_amount.values())
+
+    def add(self, statements):
+        """ Index the movements of the given statements """
+        for statement in statements:
+            for movement in statement.movements:
+                self._add(Match(statement, movement))
+
+    def _add(self, match):
+        movement = match.movement
+        reference = movement.structured_reference
+        if reference is not None:
+            self.by_communication.setdefault(reference, []).append(match)
+        reference = movement.payment_reference
+        if reference:
+            self.by_payment_reference.setdefault(
+                reference, []).append(match)
+        account = _account(movement.counterparty_number)
+        if account:
+            self.by_counterparty.setdefault(account, []).append(match)
+        amount = to_thousandths(
+            movement.transaction_amount, movement.transaction_amount_sign)
+        self.by_amount.setdefault(amount, []).append(match)
+        self.by_amount_date.setdefault(
+            (amount, movement.entry_date), []).append(match)
+
+    def find_communication(self, communication):
+        """ Return the matches of the given structured communication, given
+        as an int, formatted or as its 12 digits """
+        if not isinstance(communication, int):
+            communication = parse_structured_reference(communication)
+        return list(self.by_communication.get(communication, ()))
+
+    def find_payment_reference(self, reference):
+        return list(self.by_payment_reference.get(reference, ()))
+
+    def find_counterparty(self, account):
+        """ Return the matches of the given counterparty account number,
+        the spaces are ignored """
+        return list(self.by_counterparty.get(_account(account), ()))
+
+    def find_amount(self, amount, date=None):
+        """ Return the matches of the given amount
+        :param: amount: a float, a Decimal or an int in thousandths,
+                        negative for a debit
+        :param: date: if given, only the movements entered this date
+        """
+        amount = to_thousandths(amount)
+        if date is None:
+            return list(self.by_amount.get(amount, ()))
+        return list(self.by_amount_date.get((amount, date), ()))
+
+    def lookup(self, communication=None, payment_reference=None,
+               counterparty_number=None, amount=None, date=None):
+        """ Return the matches of an open item
+        The keys are tried in this order: structured communication, payment
+        reference, counterparty account and amount, the first one giving
+        matches is used. The matches of a counterparty account are narrowed
+        by the amount and the date when they are given.
+        :returns: the list of Match
+        """
+        if communication:
+            matches = self.find_communication(communication)
+            if matches:
+                return matches
+        if payment_reference:
+            matches = self.find_payment_reference(payment_reference)
+            if matches:
+                return matches
+        if counterparty_number:
+            matches = self.find_counterparty(counterparty_number)
+            if matches and amount is not None:
+                amount = to_thousandths(amount)
+                matches = [
+                    m for m in matches
+                    if to_thousandths(m.movement.transaction_amount,
+                                      m.movement.transaction_amount_sign)
+                    == amount and
+                    (date is None or m.movement.entry_date == date)]
+            if matches:
+                return matches
+        if amount is not None:
+            return self.find_amount(amount, date)
+        return []
+
+    def match(self, items):
+        """ Match the given open items
+        :param: items: an iterable of dicts with the keyword arguments of
+                       lookup
+        :returns: the list of the matches of each item, in the order of the
+                  items
+        """
+        lookup = self.lookup
+        return [lookup(**item) for item in items]
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Quick inspection of CODA files without parsing them
+
+sniff reads the header record to tell if the content is CODA and to get
+its version, bank and creation date. On demand, it also counts the
+statements and the records by scanning the bytes for the line separators,
+without decoding.
+"""
+import datetime
+import mmap
+import os
+import re
+from collections import namedtuple
+
+from .parser import strptime
+
+# Matches the first 24 characters of a CODA file, as defined by the febelfin
+# specifications
+_CODA_HEADER = re.compile(br'0{5}\d{9}05[ D] {7}')
+_RECORD_START = re.compile(b'^[^\r\n]', re.M)
+
+HEADER_SIZE = 128
+_CHUNK_SIZE = 1024 * 1024
+
+
+class SniffResult(namedtuple('SniffResult', 'is_coda version bank_id '
+                                            'creation_date statements '
+                                            'records')):
+    """ Result of sniff
+
+    Attributes:
+        is_coda -- True if the content starts with a CODA header record
+        version -- the CODA version ('1', '2'...), None if not CODA
+        bank_id -- the bank identification number, None if not CODA
+        creation_date -- the creation date (datetime.date), None if not
+                         CODA or invalid
+        statements -- the number of header records, None if not counted
+        records -- the number of records, None if not counted
+    """
+    __slots__ = ()
+
+
+def sniff(value, count=False):
+    """ Inspect the given CODA content
+    :param: value: the path to a file, a binary file-like object, bytes,
+                   mmap or memoryview. On Python 2, a str is a path only if
+                   such a file exists
+    :param: count: if True the statements and the records are also
+                   counted, which reads the whole content. By default only
+                   the header record is read
+    :returns: a SniffResult
+    """
+    if hasattr(value, 'read'):
+        return _sniff_file(value, count)
+    elif isinstance(value, (bytes, bytearray, mmap.mmap, memoryview)) and \
+            not _is_path(value):
+        return _sniff_buffer(value, count)
+    elif os.path.exists(value):
+        with open(value, 'rb') as f:
+            return _sniff_file(f, count)
+    raise ValueError('The given argument is not a valid file-like object, '
+                     'buffer nor path to an existing file.')
+
+
+def _is_path(value):
+    """ On Python 2, bytes are also str: they are a path if such a file
+    exists, the content otherwise """
+    return isinstance(value, str) and not (b'\n' in value or b'\0' in value) \
+        and os.path.isfile(value)
+
+
+def _header(head):
+    if not _CODA_HEADER.match(head):
+        return False, None, None, None
+    version = head[127:128].decode('ascii', 'replace') or None
+    try:
+        date = datetime.date(*strptime(head[5:11].decode('ascii'))[:3])
+    except ValueError:
+        date = None
+    return True, version, head[11:14].decode('ascii'), date
+
+
+def _bytes(value):
+    # on Python 2, bytes(memoryview) is its representation
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return bytes(value)
+
+
+def _sniff_buffer(value, count):
+    head = _bytes(value[:HEADER_SIZE])
+    is_coda, version, bank_id, date = _header(head)
+    statements = records = None
+    if count and is_coda:
+        if isinstance(value, (bytes, bytearray)):
+            statements, records = _count([value])
+        else:
+            statements, records = _count(
+                _bytes(value[i:i + _CHUNK_SIZE])
+                for i in range(0, len(value), _CHUNK_SIZE))
+    return SniffResult(is_coda, version, bank_id, date, statements, records)
+
+
+def _sniff_file(f, count):
+    head = f.read(HEADER_SIZE)
+    is_coda, version, bank_id, date = _header(head)
+    statements = records = None
+    if count and is_coda:
+        statements, records = _count(_chunks(f, head))
+    return SniffResult(is_coda, version, bank_id, date, statements, records)
+
+
+def _chunks(f, head):
+    yield head
+    chunk = f.read(_CHUNK_SIZE)
+    while chunk:
+        yield chunk
+        chunk = f.read(_CHUNK_SIZE)
+
+
+def _count(chunks):
+    """ Return the number of header records and of records of the content
+    given by chunks, the empty lines are not counted """
+    statements = records = 0
+    last = b'\n'
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if last == b'\n' and chunk[:1] == b'0':
+            statements += 1
+        statements += chunk.count(b'\n0')
+        # False when the chunk continues the record of the previous one
+        line_start = last == b'\n'
+        if line_start and chunk[:1] in (b'\r', b'\n') or \
+                b'\n\n' in chunk or b'\n\r' in chunk:
+            # with empty lines, slower
+            count = len(_RECORD_START.findall(chunk))
+            if not line_start and chunk[:1] not in (b'\r', b'\n'):
+                count -= 1
+        else:
+            # a record starts at the beginning of the chunk and after each
+            # separator but the last one of the chunk
+            count = chunk.count(b'\n') + (chunk[-1:] != b'\n')
+            if not line_start:
+                count -= 1
+        records += count
+        last = chunk[-1:]
+    return statements, records
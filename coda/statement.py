@@ -25,6 +25,23 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 #
+from array import array
+from decimal import Decimal
+
+
+def _int64_typecode():
+    """ Return the typecode of the 64 bits int arrays, None if there is
+    none ('q' is not available on Python 2) """
+    for typecode in ('q', 'l'):
+        try:
+            if array(typecode).itemsize >= 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+INT64_TYPECODE = _int64_typecode()
 
 
 class AmountSign(object):
@@ -37,10 +54,31 @@ class MovementRecordType(object):
     GLOBALISATION = "1"
 
 
-class MovementRecord(object):
+class MovementLinks(object):
+    """Links of a movement record to the other records of its statement
+
+    They are declared apart from the __slots__ of MovementRecord, which only
+    lists the fields read from the records.
+    """
+
+    __slots__ = ('parent', 'children', 'informations')
+
+
+class MovementRecord(MovementLinks):
     """A movement record
     """
 
+    __slots__ = (
+        'ref', 'ref_move', 'ref_move_detail', 'transaction_ref',
+        'transaction_amount', 'transaction_amount_sign', 'transaction_type',
+        'transaction_date', 'transaction_family', 'transaction_code',
+        'transaction_category', 'communication_is_structured',
+        'communication_type', 'communication', 'structured_reference',
+        'entry_date', 'type', 'globalisation_code', 'payment_reference',
+        'counterparty_bic', 'counterparty_number', 'counterparty_name',
+        'counterparty_address', 'counterparty_currency',
+    )
+
     def __init__(self):
         self.ref = None
 
@@ -65,6 +103,9 @@ class MovementRecord(object):
         self.communication_is_structured = None
         self.communication_type = None
         self.communication = None
+        # int of the 12 digits of a structured communication (OGM/VCS),
+        # None for the other communications
+        self.structured_reference = None
         self.entry_date = None
         self.type = None
         self.globalisation_code = None
@@ -75,18 +116,31 @@ class MovementRecord(object):
         self.counterparty_address = None
         self.counterparty_currency = None
 
+        # the globalisation movement of a detail movement
+        self.parent = None
+        # the detail movements of a globalisation movement
+        self.children = ()
+        # the information records (3.x) about the movement
+        self.informations = ()
+
 
 class InformationRecord(object):
     """ Information record
     """
 
+    __slots__ = (
+        'ref', 'ref_move', 'ref_move_detail', 'transaction_ref',
+        'transaction_type', 'transaction_family', 'transaction_code',
+        'transaction_category', 'communication',
+    )
+
     def __init__(self):
         self.ref = None
         # Continuous sequence number: must be identical to
         # the continuous sequence number of the movement
         # record to which the information record refers.
         self.ref_move = None
-        # Detail number 
+        # Detail number
         self.ref_move_detail = None
         self.transaction_ref = None
         self.transaction_type = None
@@ -96,18 +150,131 @@ class InformationRecord(object):
         self.communication = None
 
 
+def link_movement(statement, record, previous):
+    """ Link the given movement record to the globalisation movement it
+    details, if any, and register it in statement.movement_by_ref
+    :param: previous: the movement record preceding record, or None
+    """
+    if previous is not None and record.transaction_type > 3:
+        head = previous.parent or previous
+        if head.transaction_type < 4 and head.ref[:4] == record.ref[:4]:
+            record.parent = head
+            if head.children:
+                head.children.append(record)
+            else:
+                head.children = [record]
+    statement.movement_by_ref[record.ref] = record
+
+
+def link_information(movement, record):
+    """ Link the given information record to the given movement, which is
+    the last movement preceding it, if they have the same ref_move """
+    if movement is not None and movement.ref[:4] == record.ref[:4]:
+        if movement.informations:
+            movement.informations.append(record)
+        else:
+            movement.informations = [record]
+
+
+def _make_record(record_class, values):
+    record = record_class()
+    for name, value in zip(record_class.__slots__, values):
+        setattr(record, name, value)
+    return record
+
+
+class LazyRecord(object):
+    """Base class of the records decoding their fields on first access
+
+    The lines of the record are kept in _lines, by layout key, and a field
+    is computed by the resolve function given by the parser the first time
+    it is read.
+    """
+
+    __slots__ = ()
+    record_class = None
+    _fields = frozenset()
+
+    def __init__(self, resolve):
+        self._lines = {}
+        self._resolve = resolve
+
+    def __getattr__(self, name):
+        if name not in self._fields:
+            raise AttributeError(name)
+        value = self._resolve(self, name)
+        setattr(self, name, value)
+        return value
+
+    def _values(self):
+        return tuple(getattr(self, name)
+                     for name in self.record_class.__slots__)
+
+    def materialize(self):
+        """ Return the record with all its fields decoded """
+        return _make_record(self.record_class, self._values())
+
+    def __reduce__(self):
+        # pickled as a plain record
+        return _make_record, (self.record_class, self._values())
+
+
+class LazyMovementRecord(LazyRecord, MovementRecord):
+    """A movement record decoding its fields on first access
+    """
+
+    __slots__ = ('_lines', '_resolve')
+    record_class = MovementRecord
+    _fields = frozenset(MovementRecord.__slots__)
+
+    def __init__(self, resolve):
+        super(LazyMovementRecord, self).__init__(resolve)
+        self.parent = None
+        self.children = ()
+        self.informations = ()
+
+
+class LazyInformationRecord(LazyRecord, InformationRecord):
+    """An information record decoding its fields on first access
+    """
+
+    __slots__ = ('_lines', '_resolve')
+    record_class = InformationRecord
+    _fields = frozenset(InformationRecord.__slots__)
+
+
 class FreeCommunication(object):
     """ Free communication
     """
+
+    __slots__ = ('ref', 'communication')
+
     def __init__(self):
         self.ref = None
         self.communication = None
 
 
-class Statement(object):
+class StatementLinks(object):
+    """Lookups of the records of a statement, declared apart from the
+    __slots__ of Statement as MovementLinks
+    """
+
+    __slots__ = ('movement_by_ref',)
+
+
+class Statement(StatementLinks):
     """Statement of account
     """
 
+    __slots__ = (
+        'creation_date', 'separate_application', 'version', 'acc_number',
+        'currency', 'description', 'old_balance', 'old_balance_amount_sign',
+        'old_balance_date', 'account_holder_name', 'paper_seq_number',
+        'coda_seq_number', 'new_balance', 'new_balance_amount_sign',
+        'new_balance_date', 'new_balance_paper_seq_number', 'movements',
+        'informations', 'free_comunications',
+    )
+
     def __init__(self):
         self.creation_date = None
         self.separate_application = None
@@ -128,3 +295,181 @@ class Statement(object):
         self.movements = []
         self.informations = []
         self.free_comunications = []
+        # the movement records by ref (ref_move and ref_move_detail), None
+        # when the movements are a MovementColumns
+        self.movement_by_ref = {}
+
+    def balance_difference(self):
+        """ Return the difference between the new balance and the old
+        balance plus the movements, in thousandths of the currency unit
+        The globalisation details (transaction type > 3) are not counted
+        since their amounts are already included in the globalisation
+        movement.
+        """
+        total = to_thousandths(self.old_balance, self.old_balance_amount_sign)
+        for mv in self.movements:
+            if mv.transaction_type < 4:
+                total += to_thousandths(
+                    mv.transaction_amount, mv.transaction_amount_sign)
+        return to_thousandths(
+            self.new_balance, self.new_balance_amount_sign) - total
+
+    def is_balanced(self):
+        """ Check that the new balance is the old balance plus the movements
+        The check is done on integers, whatever the type of the amounts.
+        """
+        return self.balance_difference() == 0
+
+    def link(self):
+        """ Build again the links between the records of the statement
+        (MovementLinks and movement_by_ref), e.g. after its lists of
+        records were changed. The parser builds them while parsing.
+        The movements of a MovementColumns are not linked.
+        """
+        movements = self.movements
+        if isinstance(movements, MovementColumns):
+            self.movement_by_ref = None
+            return
+        self.movement_by_ref = {}
+        previous = None
+        for record in movements:
+            record.parent = None
+            record.children = ()
+            record.informations = ()
+            link_movement(self, record, previous)
+            previous = record
+        # the movements and the information records are both ordered by
+        # ref, an information record is about the last movement before it,
+        # whose detail number is lower
+        index = -1
+        for record in self.informations:
+            while index + 1 < len(movements) and \
+                    movements[index + 1].ref < record.ref:
+                index += 1
+            link_information(
+                movements[index] if index >= 0 else None, record)
+
+    def to_columns(self, fields=None):
+        """ Return the movements as a dict of numpy arrays by field name
+        (see coda.columnar.movements_to_columns)
+        :param: fields: names of the fields to convert, None for all
+        """
+        from .columnar import movements_to_columns
+        return movements_to_columns(self.movements, fields)
+
+
+def to_thousandths(amount, sign=None):
+    """ Convert the given amount into an int in thousandths of the currency
+    unit
+    :param: amount: a float, a Decimal or an int already in thousandths
+    :param: sign: if given, the result is negative for a debit
+    """
+    if isinstance(amount, float):
+        amount = int(round(amount * 1000))
+    elif isinstance(amount, Decimal):
+        amount = int(amount * 1000)
+    if sign is None:
+        return amount
+    if sign == AmountSign.DEBIT:
+        return -abs(amount)
+    return abs(amount)
+
+
+class MovementColumns(object):
+    """Columnar storage of the movement records of a statement
+
+    Each field of MovementRecord is stored in its own column, numeric fields
+    in typed arrays. The rows are materialised on access as MovementRow
+    views reading and writing the columns.
+    """
+
+    __slots__ = ('columns', '_size')
+
+    def __init__(self, typecodes=None):
+        """
+        :param: typecodes: array typecode by field name, the other fields are
+                           stored in lists
+        """
+        if typecodes is None:
+            typecodes = {
+                'transaction_amount': 'd',
+                'transaction_type': 'b',
+                'globalisation_code': 'b',
+            }
+        self.columns = dict(
+            (name, array(typecodes[name]) if name in typecodes else [])
+            for name in MovementRecord.__slots__)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield MovementRow(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [MovementRow(self, i)
+                    for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('movement index out of range')
+        return MovementRow(self, index)
+
+    def append(self, record):
+        """ Append the values of the given MovementRecord """
+        for name, column in self.columns.items():
+            value = getattr(record, name)
+            try:
+                column.append(value)
+            except TypeError:
+                # the value does not fit the typed column (None...)
+                self.columns[name] = column = list(column)
+                column.append(value)
+        self._size += 1
+
+    def append_line(self, extract, line):
+        """ Append a row whose values are read from line by extract (see
+        layout.compile_column_extractor) """
+        extract(line, self.columns)
+        self._size += 1
+
+    def set_value(self, index, name, value):
+        column = self.columns[name]
+        try:
+            column[index] = value
+        except TypeError:
+            self.columns[name] = column = list(column)
+            column[index] = value
+
+
+class MovementRow(object):
+    """View on a row of a MovementColumns
+    """
+
+    __slots__ = ('_movements', '_index')
+
+    def __init__(self, movements, index):
+        object.__setattr__(self, '_movements', movements)
+        object.__setattr__(self, '_index', index)
+
+    def __getattr__(self, name):
+        try:
+            column = self._movements.columns[name]
+        except KeyError:
+            raise AttributeError(name)
+        return column[self._index]
+
+    def __setattr__(self, name, value):
+        if name not in self._movements.columns:
+            raise AttributeError(name)
+        self._movements.set_value(self._index, name, value)
+
+    def materialize(self):
+        """ Return the row as a MovementRecord """
+        record = MovementRecord()
+        for name, column in self._movements.columns.items():
+            setattr(record, name, column[self._index])
+        return record
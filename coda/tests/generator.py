@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Deterministic generator of synthetic CODA files
+
+The generated files follow the febelfin layouts used by the parser and are
+balanced: the new balance of each statement is its old balance plus its
+movements. They are meant for tests and benchmarks.
+"""
+import datetime
+import random
+
+ACCOUNT_STRUCTURES = ('bban', 'iban', 'foreign-iban')
+
+_NAMES = (
+    'ACME SA', 'STORA ENSO LANGERBRUGGE NV', 'KBC BANK NV',
+    'BRUXELLES-PROPRETE', 'PROXIMUS SA', 'ENGIE ELECTRABEL',
+    'DELHAIZE LE LION', 'SNCB NMBS', 'UNIVERSITE LIBRE', 'ACSONE SA/NV',
+    'JOHN DOE', 'JANE DOE',
+)
+_BICS = ('GEBABEBB', 'KREDBEBB', 'BBRUBEBB', 'GKCCBEBB', 'NICABEBB')
+_FAMILIES = (('01', '01', '000'), ('01', '50', '000'), ('04', '50', '000'),
+             ('05', '01', '000'), ('13', '01', '000'), ('80', '02', '000'))
+
+
+def _field(value, size, fill=' '):
+    value = str(value)
+    if fill == '0':
+        return value[:size].rjust(size, '0')
+    return value[:size].ljust(size, fill)
+
+
+def _record(*parts):
+    record = ''.join(parts)
+    assert len(record) == 128, (len(record), record)
+    return record
+
+
+class _Random(random.Random):
+    """ random.Random drawing its ints and choices from random() only, so
+    the generated content is the same on Python 2 and 3 (the sequences of
+    randint and choice are not)
+    """
+
+    def randint(self, a, b):
+        return min(b, a + int(self.random() * (b - a + 1)))
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+
+def structured_reference(base):
+    """ Return the 12 digits of a structured communication (OGM/VCS) for the
+    given 10 digits base, with its mod-97 check digits
+    """
+    check = base % 97 or 97
+    return '%010d%02d' % (base, check)
+
+
+class CodaGenerator(object):
+    """Generator of synthetic CODA content
+
+    :param: statements: number of statements
+    :param: movements: number of movements (2.1 records) by statement,
+                       globalisation details included
+    :param: globalisation: share of the movements being globalisations,
+                           each one followed by `details` detail movements
+    :param: details: number of details by globalisation
+    :param: continuation: share of the movements followed by 2.2 and 2.3
+                          records
+    :param: information: share of the movements followed by 3.1 and 3.2
+                         records
+    :param: structured: share of the movements having a structured
+                        communication
+    :param: account: structure of the account, one of ACCOUNT_STRUCTURES
+    :param: version: CODA version, 1 or 2
+    :param: seed: seed of the random generator
+    :param: newline: line separator
+    """
+
+    def __init__(self, statements=1, movements=10, globalisation=0.1,
+                 details=2, continuation=0.5, information=0.2,
+                 structured=0.3, account='iban', version=2, seed=0,
+                 newline='\r\n'):
+        if account not in ACCOUNT_STRUCTURES:
+            raise ValueError('Unknown account structure %s' % account)
+        if version == 1 and account != 'bban':
+            raise ValueError('CODA V1 only supports BBAN accounts')
+        self.statements = statements
+        self.movements = movements
+        self.globalisation = globalisation
+        self.details = details
+        self.continuation = continuation
+        self.information = information
+        self.structured = structured
+        self.account = account
+        self.version = version
+        self.seed = seed
+        self.newline = newline
+
+    def generate(self):
+        """ Return the generated content as bytes """
+        return self.newline.join(self.iter_records()).encode(
+            'windows-1252') + self.newline.encode('windows-1252')
+
+    def iter_records(self):
+        """ Iterate over the generated records (str) """
+        rnd = _Random(self.seed)
+        date = datetime.date(2020, 1, 2)
+        balance = rnd.randint(0, 10 ** 9)
+        for seq in range(1, self.statements + 1):
+            for record in self._statement(rnd, seq, date, balance):
+                if isinstance(record, int):
+                    balance = record
+                else:
+                    yield record
+            date += datetime.timedelta(days=1)
+
+    def _account(self, rnd):
+        if self.account == 'bban':
+            return _field('%012d' % rnd.randint(0, 10 ** 12 - 1), 12)
+        elif self.account == 'iban':
+            return 'BE%014d' % rnd.randint(0, 10 ** 14 - 1)
+        return 'FR%025d' % rnd.randint(0, 10 ** 25 - 1)
+
+    def _account_field(self, number):
+        """ 37 characters account field of the records 1 and 8 """
+        if self.account == 'bban':
+            return _field(number, 12) + ' EUR' + _field('', 21)
+        elif self.account == 'iban':
+            return _field(number, 16) + _field('', 18) + 'EUR'
+        return _field(number, 34) + 'EUR'
+
+    def _statement(self, rnd, seq, date, balance):
+        ddmmyy = date.strftime('%d%m%y')
+        yesterday = (date - datetime.timedelta(days=1)).strftime('%d%m%y')
+        paper_seq = '%03d' % (seq % 1000)
+        account = self._account(rnd)
+        holder = rnd.choice(_NAMES)
+        records = []
+        yield _record(
+            '00000', ddmmyy, '300', '05', ' ', _field('', 7),
+            _field('REF%07d' % seq, 10), _field(holder, 26),
+            _field(rnd.choice(_BICS), 11), _field('0403199702', 11), ' ',
+            '00000', _field('', 16), _field('', 16), _field('', 7),
+            str(self.version))
+        structure = {'bban': '0', 'iban': '2', 'foreign-iban': '3'}
+        yield _record(
+            '1', structure[self.account] if self.version == 2 else ' ',
+            paper_seq, self._account_field(account),
+            '0' if balance >= 0 else '1', _field(abs(balance), 15, '0'),
+            yesterday, _field(holder, 26), _field('CURRENT ACCOUNT', 35),
+            _field(seq % 1000, 3, '0'))
+        count = 2
+        debit = credit = 0
+        ref_move = 0
+        remaining = self.movements
+        while remaining > 0:
+            ref_move += 1
+            if self.details and remaining > self.details and \
+                    rnd.random() < self.globalisation:
+                amounts = [rnd.randint(1, 10 ** 7)
+                           for i in range(self.details)]
+                sign = '1' if rnd.random() < 0.5 else '0'
+                records = self._movement(
+                    rnd, ref_move, 0, sign, sum(amounts), 1, ddmmyy)
+                for detail, amount in enumerate(amounts, 1):
+                    records += self._movement(
+                        rnd, ref_move, detail, sign, amount, 5, ddmmyy)
+                total = sum(amounts)
+                remaining -= self.details + 1
+            else:
+                total = rnd.randint(1, 10 ** 8)
+                sign = '1' if rnd.random() < 0.5 else '0'
+                records = self._movement(
+                    rnd, ref_move, 0, sign, total, 0, ddmmyy)
+                remaining -= 1
+            if sign == '1':
+                debit += total
+                balance -= total
+            else:
+                credit += total
+                balance += total
+            count += len(records)
+            for record in records:
+                yield record
+        if rnd.random() < self.information:
+            count += 1
+            yield _record(
+                '4 ', '00010000', _field('', 22),
+                _field('FREE COMMUNICATION %d' % seq, 80), _field('', 13),
+                '0 0')
+        yield _record(
+            '8', paper_seq, self._account_field(account),
+            '0' if balance >= 0 else '1', _field(abs(balance), 15, '0'),
+            ddmmyy, _field('', 64), '0')
+        yield _record(
+            '9', _field('', 15), _field(count, 6, '0'),
+            _field(debit, 15, '0'), _field(credit, 15, '0'),
+            _field('', 75), '2')
+        # the final balance is given back to iter_records
+        yield balance
+
+    def _movement(self, rnd, ref_move, detail, sign, amount, type_, ddmmyy):
+        ref = '%04d%04d' % (ref_move, detail)
+        family, code, category = rnd.choice(_FAMILIES)
+        continuation = rnd.random() < self.continuation
+        information = rnd.random() < self.information
+        if rnd.random() < self.structured:
+            communication = '1' + '101' + structured_reference(
+                rnd.randint(0, 10 ** 10 - 1)) + _field('', 38)
+        else:
+            communication = '0' + _field(
+                'INVOICE %d PAYMENT %s' % (rnd.randint(1, 99999), ref), 53)
+        records = [_record(
+            '21', ref, _field('BANKREF%014d' % rnd.randint(0, 10 ** 14), 21),
+            sign, _field(amount, 15, '0'), ddmmyy, str(type_), family, code,
+            category, communication, ddmmyy, '001',
+            '1' if type_ in (1, 2, 3) else '0',
+            '1' if continuation else '0', ' ',
+            '1' if information else '0')]
+        if continuation:
+            counterparty = rnd.randint(0, 10 ** 12 - 1)
+            records.append(_record(
+                '22', ref, _field('', 53),
+                _field('END2END %d' % rnd.randint(1, 10 ** 6), 35),
+                _field(rnd.choice(_BICS), 11), _field('', 16), '1 0'))
+            if self.version == 1:
+                records.append(_record(
+                    '23', ref, '%012d' % counterparty, _field('', 25),
+                    _field(rnd.choice(_NAMES), 26),
+                    _field('RUE DE LA LOI %d 1000 BRUXELLES' % (
+                        counterparty % 200), 52), '0 0'))
+            elif rnd.random() < 0.5:
+                records.append(_record(
+                    '23', ref, '%012d' % counterparty, ' EUR',
+                    _field('', 21), _field(rnd.choice(_NAMES), 35),
+                    _field('', 43), '0 0'))
+            else:
+                records.append(_record(
+                    '23', ref, _field('BE%014d' % counterparty, 34), 'EUR',
+                    _field(rnd.choice(_NAMES), 35), _field('', 43), '0 0'))
+        if information:
+            info_ref = '%04d%04d' % (ref_move, detail + 1)
+            records.append(_record(
+                '31', info_ref, _field('BANKREF%014d' % ref_move, 21),
+                str(type_), family, code, category, '0',
+                _field('INFORMATION ABOUT %s' % ref, 73), _field('', 12),
+                '1 0'))
+            records.append(_record(
+                '32', info_ref, _field('RUE DE LA LOI 16', 105),
+                _field('', 10), '0 0'))
+        return records
+
+
+def generate(**kwargs):
+    """ Shortcut to CodaGenerator(**kwargs).generate() """
+    return CodaGenerator(**kwargs).generate()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.metrics import ParserMetrics
+from coda.parser import Parser
+from coda.tests.generator import generate
+from coda.tests.test_parser import _dump
+from concurrent.futures import ProcessPoolExecutor
+from nose.plugins.skip import SkipTest
+from nose.tools import eq_, assert_raises
+import sys
+
+if sys.version_info >= (3, 6):
+    import asyncio
+    from coda.aio import AsyncParser
+
+
+class Chunks(object):
+    """ Async iterator over the given chunks """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = asyncio.get_event_loop().create_future()
+        try:
+            future.set_result(next(self.chunks))
+        except StopIteration:
+            future.set_exception(StopAsyncIteration())
+        return future
+
+
+def _split(content, size):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+class TestAsyncParser(object):
+
+    def _run(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def _content(self):
+        if sys.version_info < (3, 6):
+            raise SkipTest('Python 3.6+ is required')
+        return generate(statements=6, movements=20)
+
+    def test_chunks(self):
+        content = self._content()
+        expected = _dump(Parser().parse(content))
+        for batch_size in (1, 1000, 10 ** 6):
+            parser = AsyncParser(batch_size=batch_size)
+            statements = self._run(parser.parse(Chunks(_split(content, 97))))
+            eq_(_dump(statements), expected)
+        eq_(_dump(self._run(AsyncParser().parse(content))), expected)
+
+    def test_stream_reader(self):
+        content = self._content()
+
+        def parse():
+            stream = asyncio.StreamReader()
+            stream.feed_data(content)
+            stream.feed_eof()
+            parser = AsyncParser(batch_size=2000, read_size=500,
+                                 date_format='%d/%m/%Y')
+            return parser.parse(stream)
+
+        eq_(_dump(self._run(parse())),
+            _dump(Parser(date_format='%d/%m/%Y').parse(content)))
+
+    def test_process_executor(self):
+        content = self._content()
+        with ProcessPoolExecutor(2) as executor:
+            parser = AsyncParser(executor=executor, batch_size=3000,
+                                 compact=True)
+            statements = self._run(
+                parser.parse(Chunks(_split(content, 1000))))
+        eq_(_dump(statements), _dump(Parser(compact=True).parse(content)))
+
+    def test_worker_parser(self):
+        content = self._content()
+        if sys.version_info < (3, 7):
+            raise SkipTest('Python 3.7+ is required')
+        parser = AsyncParser(batch_size=3000, amount_mode='integer')
+        with parser.process_executor(2) as executor:
+            parser.executor = executor
+            statements = self._run(
+                parser.parse(Chunks(_split(content, 1000))))
+        eq_(_dump(statements),
+            _dump(Parser(amount_mode='integer').parse(content)))
+
+    def test_metrics(self):
+        content = self._content()
+        metrics = ParserMetrics()
+        parser = AsyncParser(batch_size=3000, metrics=metrics)
+        self._run(parser.parse(Chunks(_split(content, 1000))))
+        eq_(parser.parser.metrics, metrics)
+        eq_(metrics.statements, 6)
+        eq_(metrics.bytes_decoded, len(content))
+
+    def test_invalid(self):
+        self._content()
+        with assert_raises(ValueError):
+            self._run(AsyncParser().parse(Chunks([])))
+        with assert_raises(ValueError):
+            self._run(AsyncParser().parse(Chunks([b'Hello', b'world'])))
+        with assert_raises(ValueError):
+            AsyncParser(amount_mode='unknown')
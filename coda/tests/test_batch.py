@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda import batch, codec
+from coda.batch import parse_many, parse_path, parse_split, \
+    split_statements
+from coda.cli import main
+from coda.parser import Parser, CodaParserException
+from coda.tests.test_parser import _dump
+from nose.tools import eq_
+import io
+import os
+import tempfile
+
+BASEPATH = os.path.dirname(__file__)
+FILES = [os.path.join(BASEPATH, name) for name in (
+    "Coda_v2_3_single_statement.txt",
+    "Coda_faulty_version.txt",
+    "Coda_v2_3_multi_statements.txt",
+    "invalid_file_name",
+    "Coda_v2_3_globalisation.txt",
+)]
+
+
+class TestBatch(object):
+
+    def _check(self, results):
+        results = dict((r.path, r) for r in results)
+        eq_(sorted(results), sorted(FILES))
+        eq_(len(results[FILES[0]].statements), 1)
+        eq_(len(results[FILES[2]].statements), 2)
+        eq_(len(results[FILES[4]].statements[0].movements), 5)
+        assert isinstance(results[FILES[1]].error, CodaParserException)
+        eq_(results[FILES[1]].error.code, ' R001')
+        eq_(results[FILES[1]].statements, None)
+        assert isinstance(results[FILES[3]].error, ValueError)
+
+    def test_parse_many(self):
+        results = list(parse_many(FILES, workers=2))
+        eq_([r.path for r in results], FILES)
+        self._check(results)
+        self._check(parse_many(FILES, workers=2, ordered=False))
+        self._check(parse_many(FILES, workers=0))
+
+    def test_truncated_file(self):
+        with open(FILES[0], 'rb') as f:
+            content = f.read(60)
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        try:
+            for workers in (0, 1):
+                results = list(parse_many([path] + FILES, workers=workers))
+                assert isinstance(results[0].error, IndexError)
+                eq_(results[0].statements, None)
+                self._check(results[1:])
+        finally:
+            os.remove(path)
+
+    def test_optional_values(self):
+        with open(FILES[2], 'rb') as f:
+            lines = f.read().split(b'\n')
+        # the first statement has no new balance record
+        lines.remove(next(line for line in lines if line.startswith(b'8')))
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'\n'.join(lines))
+        try:
+            results = list(parse_many(
+                [FILES[0], path, FILES[2]], workers=2))
+            eq_([r.error for r in results], [None] * 3)
+            eq_(results[1].statements[0].new_balance, None)
+        finally:
+            os.remove(path)
+
+    def test_encoding_error(self):
+        def dumps(statements):
+            raise codec.CodecError('Can not encode the values')
+        original = batch.codec.dumps
+        batch.codec.dumps = dumps
+        try:
+            result = batch._parse_path(FILES[0], {})
+        finally:
+            batch.codec.dumps = original
+        eq_(result.statements, None)
+        assert isinstance(result.error, codec.CodecError)
+
+    def test_options(self):
+        result = parse_path(FILES[0], {'date_format': '%d/%m/%Y'})
+        eq_(result.statements[0].creation_date, '05/03/2009')
+        result = list(parse_many(
+            FILES[:1], workers=1, date_format='%d/%m/%Y'))[0]
+        eq_(result.statements[0].creation_date, '05/03/2009')
+
+    def test_split_statements(self):
+        with open(FILES[2], 'rb') as f:
+            content = f.read()
+        chunks = split_statements(content)
+        eq_(len(chunks), 2)
+        eq_(b''.join(chunks), content)
+        assert chunks[1].startswith(b'0')
+        eq_(split_statements(content, 1), [content])
+
+    def test_parse_split(self):
+        for path in (FILES[0], FILES[2], FILES[4]):
+            with open(path, 'rb') as f:
+                content = f.read()
+            # one statement per chunk
+            content = content * 5
+            eq_(_dump(parse_split(content, workers=2)),
+                _dump(Parser().parse(content)))
+            eq_(_dump(parse_split(content, workers=0)),
+                _dump(Parser().parse(content)))
+        with open(os.path.join(
+                BASEPATH, "Coda_v2_3_faulty_globalisation.txt"), 'rb') as f:
+            content = f.read() * 3
+        statements = parse_split(content, workers=2, compact=True)
+        eq_(_dump(statements), _dump(Parser().parse(content)))
+
+    def test_cli(self):
+        out = io.StringIO()
+        eq_(main(['parse', '-w', '0'] + FILES, out), 1)
+        lines = out.getvalue().splitlines()
+        eq_(lines[0], '%s: 1 statement(s), 32 movement(s)' % FILES[0])
+        eq_(lines[1], '%s: error: R001 CODA V5 statements are not '
+            'supported, please contact your bank' % FILES[1])
+        out = io.StringIO()
+        eq_(main(['parse', FILES[0]], out), 0)
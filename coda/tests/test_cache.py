@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.cache import DirectoryCache, MemoryCache
+from coda.parser import Parser
+from coda.tests.test_parser import _dump
+from nose.tools import eq_
+import os
+import shutil
+import tempfile
+
+BASEPATH = os.path.dirname(__file__)
+FILENAME = os.path.join(BASEPATH, "Coda_v2_3_multi_statements.txt")
+
+
+class CountingParser(Parser):
+
+    parsed = 0
+
+    def _parse(self, value, where=None):
+        self.parsed += 1
+        return super(CountingParser, self)._parse(value, where)
+
+
+class UnencodableParser(Parser):
+
+    def _parse(self, value, where=None):
+        statements = super(UnencodableParser, self)._parse(value, where)
+        statements[0].movements[0].ref = (1, 2)
+        return statements
+
+
+class TestCache(object):
+
+    def test_memory_cache(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        eq_(cache.get('a'), b'1')
+        cache.set('c', b'3')
+        # b is the least recently used entry
+        eq_(cache.get('b'), None)
+        eq_(cache.get('a'), b'1')
+        eq_(cache.get('c'), b'3')
+        eq_(len(cache), 2)
+
+    def test_directory_cache(self):
+        path = tempfile.mkdtemp()
+        try:
+            cache = DirectoryCache(path, max_size=10)
+            cache.set('a', b'12345')
+            cache.set('b', b'67890')
+            os.utime(os.path.join(path, 'a' + cache.suffix), (0, 0))
+            eq_(cache.get('b'), b'67890')
+            cache.set('c', b'abc')
+            eq_(cache.get('a'), None)
+            eq_(cache.get('b'), b'67890')
+            # the entries are found again by a new instance
+            eq_(DirectoryCache(path).get('c'), b'abc')
+            cache.clear()
+            eq_(os.listdir(path), [])
+        finally:
+            shutil.rmtree(path)
+
+    def test_parser_cache(self):
+        parser = CountingParser(cache=MemoryCache())
+        expected = _dump(Parser().parse_file(FILENAME))
+        eq_(_dump(parser.parse_file(FILENAME)), expected)
+        eq_(_dump(parser.parse_file(FILENAME)), expected)
+        with open(FILENAME, 'rb') as f:
+            eq_(_dump(parser.parse(f.read())), expected)
+        eq_(parser.parsed, 1)
+        # the options changing the statements are part of the key
+        other = CountingParser(date_format='%d/%m/%Y', cache=parser.cache)
+        statements = other.parse_file(FILENAME)
+        eq_(other.parsed, 1)
+        eq_(statements[0].creation_date, '05/03/2009')
+        eq_(len(parser.cache), 2)
+
+    def test_parser_directory_cache(self):
+        path = tempfile.mkdtemp()
+        try:
+            expected = _dump(Parser(compact=True).parse_file(FILENAME))
+            parser = CountingParser(compact=True, cache=DirectoryCache(path))
+            eq_(_dump(parser.parse_file(FILENAME)), expected)
+            parser = CountingParser(compact=True, cache=DirectoryCache(path))
+            eq_(_dump(parser.parse_file(FILENAME)), expected)
+            eq_(parser.parsed, 0)
+        finally:
+            shutil.rmtree(path)
+
+    def test_parser_cache_optional_values(self):
+        with open(FILENAME, 'rb') as f:
+            lines = f.read().split(b'\n')
+        # the first statement has no new balance record
+        lines.remove(next(line for line in lines if line.startswith(b'8')))
+        value = b'\n'.join(lines)
+        expected = _dump(Parser().parse(value))
+        parser = CountingParser(cache=MemoryCache())
+        eq_(_dump(parser.parse(value)), expected)
+        eq_(_dump(parser.parse(value)), expected)
+        eq_(parser.parsed, 1)
+
+    def test_parser_cache_unencodable(self):
+        parser = UnencodableParser(cache=MemoryCache())
+        with open(FILENAME, 'rb') as f:
+            statements = parser.parse(f.read())
+        eq_(statements[0].movements[0].ref, (1, 2))
+        eq_(len(parser.cache), 0)
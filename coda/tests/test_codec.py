@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda import codec
+from coda.parser import AmountMode, Parser
+from coda.statement import MovementColumns, Statement
+from coda.tests.generator import generate
+from coda.tests.test_parser import _dump
+from nose.tools import eq_, assert_raises
+import datetime
+import io
+import os
+import pickle
+from decimal import Decimal
+
+BASEPATH = os.path.dirname(__file__)
+FILENAMES = [os.path.join(BASEPATH, name) for name in (
+    "Coda_v2_3_single_statement.txt",
+    "Coda_v2_3_multi_statements.txt",
+    "Coda_v2_3_globalisation.txt",
+    "Coda_v2_3_faulty_globalisation.txt",
+)]
+
+
+class TestCodec(object):
+
+    def test_round_trip(self):
+        for options in ({}, {'compact': True}, {'lazy': True},
+                        {'amount_mode': AmountMode.DECIMAL,
+                         'date_format': None},
+                        {'amount_mode': AmountMode.INTEGER},
+                        {'fields': ['transaction_amount']}):
+            parser = Parser(**options)
+            for filename in FILENAMES:
+                statements = parser.parse_file(filename)
+                loaded = codec.loads(codec.dumps(statements))
+                eq_(_dump(loaded), _dump(statements))
+        eq_(codec.loads(codec.dumps([])), [])
+
+    def test_optional_values(self):
+        with open(FILENAMES[1], 'rb') as f:
+            lines = f.read().split(b'\n')
+        # the first statement has no new balance record
+        lines.remove(next(line for line in lines if line.startswith(b'8')))
+        value = b'\n'.join(lines)
+        for options in ({}, {'date_format': None},
+                        {'amount_mode': AmountMode.DECIMAL},
+                        {'compact': True}, {'lazy': True}):
+            statements = Parser(**options).parse(value)
+            eq_(statements[0].new_balance, None)
+            assert statements[1].new_balance is not None
+            loaded = codec.loads(codec.dumps(statements))
+            eq_(_dump(loaded), _dump(statements))
+        for name, value in (('transaction_amount', 1.5),
+                            ('entry_date', datetime.date(2020, 1, 2)),
+                            ('transaction_amount', Decimal('1.500')),
+                            ('ref_move', True)):
+            statements = Parser().parse_file(FILENAMES[0])
+            movements = statements[0].movements
+            setattr(movements[0], name, None)
+            setattr(movements[-1], name, None)
+            for mv in movements[1:-1]:
+                setattr(mv, name, value)
+            loaded = codec.loads(codec.dumps(statements))
+            eq_([getattr(mv, name) for mv in loaded[0].movements],
+                [None] + [value] * (len(movements) - 2) + [None])
+
+    def test_compact(self):
+        statements = Parser(compact=True).parse_file(FILENAMES[2])
+        loaded = codec.loads(codec.dumps(statements))
+        assert isinstance(loaded[0].movements, MovementColumns)
+        eq_(loaded[0].movements.columns['transaction_amount'].typecode, 'd')
+        eq_(len(loaded[0].movements), len(statements[0].movements))
+
+    def test_smaller_than_pickle(self):
+        statements = Parser().parse(generate(statements=2, movements=200))
+        data = codec.dumps(statements)
+        assert len(data) < len(pickle.dumps(statements, 2))
+
+    def test_dump_iter(self):
+        statements = Parser().parse(generate(statements=7, movements=5))
+        fp = io.BytesIO()
+        codec.dump_iter(iter(statements), fp, batch_size=3)
+        fp.seek(0)
+        eq_(_dump(codec.load_iter(fp)), _dump(statements))
+        fp = io.BytesIO(fp.getvalue()[:-1])
+        with assert_raises(codec.CodecError):
+            list(codec.load_iter(fp))
+
+    def test_errors(self):
+        data = codec.dumps(Parser().parse_file(FILENAMES[0]))
+        with assert_raises(codec.CodecError):
+            codec.loads(b'PICKLE' + data)
+        with assert_raises(codec.CodecError):
+            codec.loads(data[:-10])
+        # the columns of other types are neither encoded nor decoded
+        statements = Parser().parse_file(FILENAMES[0])
+        statements[0].movements[0].ref = (1, 2)
+        with assert_raises(codec.CodecError):
+            codec.dumps(statements)
+        statements = [Statement()]
+        data = codec.dumps(statements)
+        # the first column, of the account numbers
+        pos = data.index(b'N')
+        with assert_raises(codec.CodecError):
+            codec.loads(data[:pos] + b'P' + data[pos + 1:])
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.parser import Parser
+from nose.plugins.skip import SkipTest
+from nose.tools import eq_, assert_raises
+import os
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+BASEPATH = os.path.dirname(__file__)
+
+
+class TestColumnar(object):
+
+    def _read(self):
+        if numpy is None:
+            raise SkipTest('numpy is not installed')
+        with open(os.path.join(
+                BASEPATH, "Coda_v2_3_multi_statements.txt"), 'rb') as f:
+            return f.read()
+
+    def test_parse_columnar(self):
+        content = self._read()
+        parser = Parser()
+        statements = parser.parse(content)
+        columns = parser.parse_columnar(content)
+        movements = [mv for st in statements for mv in st.movements]
+        eq_(len(columns['ref']), len(movements))
+        eq_(columns['transaction_amount'].dtype, numpy.int64)
+        eq_(columns['transaction_amount'].tolist(),
+            [int(round(mv.transaction_amount * 1000)) for mv in movements])
+        eq_(columns['entry_date'][0], numpy.datetime64('2009-03-05'))
+        eq_(columns['transaction_family'].dtype, numpy.dtype('S2'))
+        eq_(columns['transaction_family'][0], b'04')
+        eq_(columns['statement'].tolist(),
+            [i for i, st in enumerate(statements) for mv in st.movements])
+        eq_(columns['communication'].tolist(),
+            [mv.communication for mv in movements])
+        debits = columns['transaction_amount_sign'] == b'1'
+        eq_(columns['transaction_amount'][debits].sum(),
+            sum(int(round(mv.transaction_amount * 1000))
+                for mv in movements if mv.transaction_amount_sign == '1'))
+
+    def test_date_format(self):
+        content = self._read()
+        expected = Parser().parse_columnar(content)
+        parser = Parser(date_format='%d/%m/%Y')
+        columns = parser.parse_columnar(content)
+        eq_(columns['entry_date'].tolist(), expected['entry_date'].tolist())
+        eq_(columns['entry_date'].dtype, numpy.dtype('datetime64[D]'))
+        # the parser keeps its format
+        eq_(parser.parse(content)[0].creation_date, '05/03/2009')
+
+    def test_projection(self):
+        content = self._read()
+        parser = Parser(fields=['transaction_amount', 'new_balance'])
+        columns = parser.parse_columnar(content)
+        eq_(sorted(columns), ['statement', 'transaction_amount'])
+        eq_(columns['transaction_amount'].tolist(),
+            Parser().parse_columnar(content)['transaction_amount'].tolist())
+        statement = parser.parse(content)[0]
+        eq_(sorted(statement.to_columns(parser.fields)),
+            ['transaction_amount'])
+
+    def test_to_columns(self):
+        content = self._read()
+        statement = Parser(date_format=None).parse(content)[0]
+        columns = statement.to_columns()
+        eq_(len(columns['transaction_date']), len(statement.movements))
+        eq_(columns['transaction_date'][0], numpy.datetime64('2009-03-05'))
+        # the codes are encoded as windows-1252
+        statement.movements[0].counterparty_bic = u'CAF\xc9'
+        eq_(statement.to_columns()['counterparty_bic'][0], b'CAF\xc9')
+        statement = Parser(date_format='%d/%m/%Y').parse(content)[0]
+        with assert_raises(ValueError):
+            statement.to_columns()
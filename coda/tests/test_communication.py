@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda import codec
+from coda.communication import format_structured_reference, \
+    is_valid_structured_reference, parse_structured_reference, \
+    validate_statement, validate_structured_references
+from coda.parser import Parser
+from coda.tests.generator import generate, structured_reference
+from nose.plugins.skip import SkipTest
+from nose.tools import eq_
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class TestCommunication(object):
+
+    def test_parse_format(self):
+        eq_(parse_structured_reference('+++123/4567/89002+++'),
+            123456789002)
+        eq_(parse_structured_reference('***123/4567/89002***'),
+            123456789002)
+        eq_(parse_structured_reference('000000000097'), 97)
+        eq_(parse_structured_reference('INVOICE 12'), None)
+        eq_(parse_structured_reference(None), None)
+        eq_(format_structured_reference(97), '+++000/0000/00097+++')
+        eq_(format_structured_reference(123456789002),
+            '+++123/4567/89002+++')
+
+    def test_validation(self):
+        eq_(is_valid_structured_reference(123456789002), True)
+        eq_(is_valid_structured_reference(123456789003), False)
+        eq_(is_valid_structured_reference(97), True)
+        eq_(is_valid_structured_reference(0), False)
+        eq_(is_valid_structured_reference('+++123/4567/89002+++'), True)
+        eq_(is_valid_structured_reference('INVOICE'), False)
+        eq_(is_valid_structured_reference(-1), False)
+
+    def test_parsing(self):
+        content = generate(statements=2, movements=30, structured=0.5)
+        for options in ({}, {'lazy': True}, {'compact': True},
+                        {'fields': ['structured_reference']}):
+            statements = Parser(**options).parse(content)
+            references = [mv.structured_reference
+                          for st in statements for mv in st.movements]
+            assert None in references
+            for mv in Parser().parse(content)[0].movements:
+                if mv.structured_reference is not None:
+                    eq_(format_structured_reference(
+                        mv.structured_reference), mv.communication)
+                    assert is_valid_structured_reference(
+                        mv.structured_reference)
+                else:
+                    eq_(mv.communication_is_structured, False)
+            loaded = codec.loads(codec.dumps(statements))
+            eq_([mv.structured_reference
+                 for st in loaded for mv in st.movements], references)
+
+    def test_vectorised(self):
+        if numpy is None:
+            raise SkipTest('numpy is not installed')
+        valid = int(structured_reference(1234567890))
+        eq_(list(validate_structured_references(
+            [valid, valid + 1, None, 97, 0, -1])),
+            [True, False, False, True, False, False])
+        content = generate(statements=1, movements=30, structured=0.5)
+        for compact in (False, True):
+            statement = Parser(compact=compact).parse(content)[0]
+            eq_(list(validate_statement(statement)),
+                [mv.structured_reference is not None
+                 for mv in statement.movements])
+            eq_(list(statement.to_columns()['structured_reference'] >= 0),
+                [mv.structured_reference is not None
+                 for mv in statement.movements])
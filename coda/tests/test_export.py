@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.export import export_parquet, export_sqlite, TABLES
+from coda.parser import AmountMode, Parser
+from coda.tests.generator import generate
+from nose.plugins.skip import SkipTest
+from nose.tools import eq_
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+
+try:
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+BASEPATH = os.path.dirname(__file__)
+FILENAME = os.path.join(BASEPATH, "Coda_v2_3_multi_statements.txt")
+
+
+class TestExport(object):
+
+    def test_sqlite(self):
+        statements = Parser().parse_file(FILENAME)
+        connection = sqlite3.connect(':memory:')
+        eq_(export_sqlite(iter(statements), connection, batch_size=7), 2)
+        eq_(connection.execute('SELECT id, acc_number, new_balance FROM '
+                               'statement').fetchall(),
+            [(i, st.acc_number, st.new_balance)
+             for i, st in enumerate(statements, 1)])
+        rows = connection.execute(
+            'SELECT * FROM movement WHERE statement_id = 2 ORDER BY position'
+        ).fetchall()
+        fields = TABLES[1][1]
+        eq_([row[2:] for row in rows],
+            [tuple(getattr(mv, name) for name in fields)
+             for mv in statements[1].movements])
+        eq_(connection.execute(
+            'SELECT COUNT(*) FROM information').fetchone()[0],
+            sum(len(st.informations) for st in statements))
+        # appended after the statements already exported
+        export_sqlite(statements[:1], connection)
+        eq_(connection.execute('SELECT MAX(id) FROM statement').fetchone(),
+            (3,))
+        eq_(connection.execute('SELECT COUNT(*) FROM movement WHERE '
+                               'statement_id = 3').fetchone(),
+            (len(statements[0].movements),))
+
+    def test_sqlite_file(self):
+        content = generate(statements=3, movements=20)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            parser = Parser(compact=True, date_format=None,
+                            amount_mode=AmountMode.DECIMAL)
+            eq_(export_sqlite(parser.parse(content), path), 3)
+            connection = sqlite3.connect(path)
+            movement = parser.parse(content)[0].movements[0]
+            eq_(connection.execute(
+                'SELECT transaction_amount, entry_date FROM movement '
+                'WHERE statement_id = 1 AND position = 0').fetchone(),
+                (str(movement.transaction_amount),
+                 movement.entry_date.isoformat()))
+            connection.close()
+        finally:
+            os.remove(path)
+
+    def test_parquet(self):
+        if pyarrow is None:
+            raise SkipTest('pyarrow is not installed')
+        content = generate(statements=4, movements=30)
+        directory = tempfile.mkdtemp()
+        try:
+            parser = Parser(date_format=None, amount_mode=AmountMode.INTEGER)
+            eq_(export_parquet(parser.parse(content), directory,
+                               row_group_size=25), 4)
+            statements = parser.parse(content)
+            path = os.path.join(directory, 'movement.parquet')
+            eq_(pyarrow.parquet.ParquetFile(path).num_row_groups, 5)
+            table = pyarrow.parquet.read_table(path).to_pydict()
+            movements = [mv for st in statements for mv in st.movements]
+            eq_(table['transaction_amount'],
+                [mv.transaction_amount for mv in movements])
+            eq_(table['structured_reference'],
+                [mv.structured_reference for mv in movements])
+            eq_(table['statement_id'][-1], 4)
+            eq_(table['entry_date'][0], datetime.date(2020, 1, 2))
+            table = pyarrow.parquet.read_table(
+                os.path.join(directory, 'statement.parquet')).to_pydict()
+            eq_(table['acc_number'], [st.acc_number for st in statements])
+            eq_(sorted(os.listdir(directory)), [
+                'free_communication.parquet', 'information.parquet',
+                'movement.parquet', 'statement.parquet'])
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.parser import Parser
+from coda.statement import MovementRecordType
+from coda.tests.generator import CodaGenerator, generate, \
+    structured_reference
+from nose.tools import eq_, assert_raises
+
+
+class TestGenerator(object):
+
+    def test_generate(self):
+        for account in ('bban', 'iban', 'foreign-iban'):
+            content = generate(statements=3, movements=40, account=account,
+                               globalisation=0.3, seed=1)
+            statements = Parser(check_balance=True).parse(content)
+            eq_(len(statements), 3)
+            for statement in statements:
+                eq_(len(statement.movements), 40)
+        statements = Parser(check_balance=True).parse(
+            generate(version=1, account='bban', movements=20))
+        eq_(statements[0].version, '1')
+        # the 2.3 records of CODA V1 have no counterparty currency
+        for continuation, currency in ((0, None), (1, '')):
+            movement = Parser().parse(generate(
+                version=1, account='bban', movements=1,
+                continuation=continuation))[0].movements[0]
+            eq_(movement.counterparty_currency, currency)
+
+    def test_deterministic(self):
+        eq_(generate(seed=3), generate(seed=3))
+        assert generate(seed=3) != generate(seed=4)
+
+    def test_densities(self):
+        statement = Parser().parse(generate(
+            movements=30, globalisation=0, continuation=0, information=0,
+            structured=0))[0]
+        for movement in statement.movements:
+            eq_(movement.type, MovementRecordType.NORMAL)
+            eq_(movement.payment_reference, None)
+            eq_(movement.communication_is_structured, False)
+        eq_(statement.informations, [])
+        statement = Parser().parse(generate(
+            movements=30, globalisation=1, details=2, continuation=1,
+            information=1, structured=1))[0]
+        eq_([mv.type for mv in statement.movements],
+            [MovementRecordType.GLOBALISATION, MovementRecordType.NORMAL,
+             MovementRecordType.NORMAL] * 10)
+        eq_(len(statement.informations), 30)
+        for movement in statement.movements:
+            assert movement.counterparty_name
+            assert movement.communication.startswith('+++')
+
+    def test_structured_reference(self):
+        eq_(structured_reference(1234567890), '123456789002')
+        eq_(structured_reference(97), '000000009797')
+
+    def test_invalid(self):
+        with assert_raises(ValueError):
+            CodaGenerator(account='unknown')
+        with assert_raises(ValueError):
+            CodaGenerator(version=1, account='iban')
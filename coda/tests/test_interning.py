@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.interning import InternPool
+from coda.parser import AmountMode, Parser
+from coda.tests.generator import generate
+from coda.tests.test_parser import _dump
+from nose.tools import eq_
+
+
+class TestInterning(object):
+
+    def test_pool(self):
+        pool = InternPool(max_size=4)
+        a = pool.text(u'ACME  SA   ')
+        eq_(a, u'ACME SA')
+        assert pool.text(u'ACME SA') is a
+        assert pool.text(u' ACME SA') is a
+        assert pool.text(u'ACME  SA   ') is a
+        # the pool holds one text, found by 3 raw values
+        eq_(len(pool), 1)
+        eq_(pool.stats(), {'size': 1, 'max_size': 4, 'misses': 3,
+                           'overflows': 0})
+        for value in (u'EUR', u'USD ', u'GBP'):
+            eq_(pool.text(value), value.strip())
+        # the pool is full
+        eq_(pool.text(u'CHF '), u'CHF')
+        eq_(len(pool), 4)
+        eq_(pool.stats()['overflows'], 1)
+        # the texts are still shared once the raw values are no longer kept
+        assert pool.text(u' USD') is pool.text(u'USD ')
+        eq_(len(pool._texts), 4)
+        pool.clear()
+        eq_(pool.stats(), {'size': 0, 'max_size': 4, 'misses': 0,
+                           'overflows': 0})
+
+    def test_parse(self):
+        value = generate(statements=5, movements=50, seed=13)
+        expected = _dump(Parser().parse(value))
+        for options in ({'intern_pool': True},
+                        {'intern_pool': True, 'lazy': True},
+                        {'intern_pool': InternPool(max_size=10)}):
+            parser = Parser(**options)
+            statements = parser.parse(value)
+            eq_(_dump(statements), expected)
+            pool = parser.intern_pool
+            assert 0 < len(pool) <= pool.max_size
+        parser = Parser(intern_pool=True)
+        statements = parser.parse(value)
+        movements = [mv for st in statements for mv in st.movements]
+        for name in ('transaction_family', 'counterparty_bic'):
+            values = dict((getattr(mv, name), getattr(mv, name))
+                          for mv in movements)
+            for mv in movements:
+                assert getattr(mv, name) is values[getattr(mv, name)]
+        assert statements[0].currency is statements[-1].currency
+
+    def test_shared_pool(self):
+        pool = InternPool()
+        first = Parser(intern_pool=pool).parse(generate(seed=14))
+        parser = Parser(intern_pool=pool, amount_mode=AmountMode.INTEGER)
+        second = parser.parse(generate(seed=15))
+        assert first[0].currency is second[0].currency
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda import codec
+from coda.parser import IncrementalParser, Parser
+from coda.tests.generator import generate
+from nose.tools import eq_
+import os
+import pickle
+
+BASEPATH = os.path.dirname(__file__)
+
+
+def _links(statements):
+    """ Return a comparable representation of the links of the given
+    statements """
+    result = []
+    for st in statements:
+        eq_(sorted(st.movement_by_ref), sorted(mv.ref for mv in st.movements))
+        for mv in st.movements:
+            assert st.movement_by_ref[mv.ref] is mv
+        result.append([
+            (mv.ref, mv.parent.ref if mv.parent else None,
+             [child.ref for child in mv.children],
+             [info.ref for info in mv.informations])
+            for mv in st.movements])
+    return result
+
+
+class TestLinks(object):
+
+    def test_globalisation(self):
+        file_name = os.path.join(BASEPATH, 'Coda_v2_3_globalisation.txt')
+        with open(file_name, 'rb') as f:
+            statement = Parser().parse(f.read())[0]
+        eq_(_links([statement]), [[
+            ('00010000', None, [], ['00010001']),
+            ('00020000', None, [], ['00020001']),
+            ('00030000', None, ['00030002'], ['00030001']),
+            ('00030002', '00030000', [], ['00030003']),
+            ('00040000', None, [], []),
+        ]])
+        detail = statement.movement_by_ref['00030002']
+        assert detail.parent.children[0] is detail
+        assert detail.informations[0] is statement.informations[-1]
+
+    def test_generated(self):
+        value = generate(statements=3, movements=60, globalisation=0.3,
+                         details=3, information=0.5, seed=11)
+        statements = Parser().parse(value)
+        links = _links(statements)
+        for st in statements:
+            for mv in st.movements:
+                if mv.transaction_type > 3:
+                    eq_(mv.parent.ref_move, mv.ref_move)
+                    assert mv in mv.parent.children
+                else:
+                    eq_(mv.parent, None)
+            eq_(sum(len(mv.informations) for mv in st.movements),
+                len(st.informations))
+        eq_(_links(Parser(lazy=True).parse(value)), links)
+        eq_(_links(codec.loads(codec.dumps(statements))), links)
+        eq_(_links(pickle.loads(pickle.dumps(statements, 2))), links)
+        for st in statements:
+            st.link()
+        eq_(_links(statements), links)
+
+    def test_incremental(self):
+        value = generate(statements=2, movements=40, globalisation=0.3,
+                         information=0.5, seed=12)
+        links = _links(Parser().parse(value))
+        incremental = IncrementalParser(Parser(lazy=True))
+        statements = incremental.feed(value[:len(value) // 2])
+        incremental = IncrementalParser(
+            Parser(lazy=True), incremental.checkpoint())
+        statements += incremental.feed(value[len(value) // 2:])
+        statements += incremental.close()
+        eq_(_links(statements), links)
+
+    def test_compact(self):
+        value = generate(statements=1, movements=10)
+        statement = Parser(compact=True).parse(value)[0]
+        eq_(statement.movement_by_ref, None)
+        statement = codec.loads(codec.dumps([statement]))[0]
+        eq_(statement.movement_by_ref, None)
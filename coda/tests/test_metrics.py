@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.metrics import ParserMetrics
+from coda.parser import Parser, CodaParserException, IncrementalParser
+from nose.tools import eq_, assert_raises
+import os
+
+BASEPATH = os.path.dirname(__file__)
+FILENAME = os.path.join(BASEPATH, "Coda_v2_3_multi_statements.txt")
+
+
+def _record_types(content):
+    counts = {}
+    for line in content.decode('windows-1252').splitlines():
+        key = line[:2] if line[0] in '23' else line[0]
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+class TestMetrics(object):
+
+    def test_counters(self):
+        emitted = []
+        metrics = ParserMetrics(on_statement=emitted.append)
+        parser = Parser(metrics=metrics)
+        with open(FILENAME, 'rb') as f:
+            content = f.read()
+        statements = parser.parse(content)
+        eq_(emitted, statements)
+        eq_(metrics.statements, 2)
+        eq_(metrics.bytes_decoded, len(content))
+        expected = _record_types(content)
+        eq_(dict((k, v) for k, v in metrics.records.items() if v),
+            expected)
+        for key in expected:
+            assert metrics.times[key] >= 0
+        parser.parse_file(FILENAME)
+        eq_(metrics.statements, 4)
+        eq_(metrics.records['21'], 2 * expected['21'])
+        # the record separators are not decoded when reading files
+        eq_(metrics.bytes_decoded, 2 * len(content) - content.count(b'\n'))
+        IncrementalParser(parser).feed(content)
+        assert metrics.bytes_decoded > 2 * len(content)
+        metrics.reset()
+        eq_(metrics.statements, 0)
+        eq_(metrics.records['21'], 0)
+
+    def test_errors(self):
+        errors = []
+        metrics = ParserMetrics(on_error=errors.append)
+        parser = Parser(metrics=metrics)
+        for name in ("Coda_faulty_version.txt", "Coda_faulty_version.txt"):
+            with assert_raises(CodaParserException):
+                parser.parse_file(os.path.join(BASEPATH, name))
+        eq_(metrics.errors, {'R001': 2})
+        eq_([e.code for e in errors], [' R001', ' R001'])
+
+    def test_exports(self):
+        metrics = ParserMetrics()
+        Parser(metrics=metrics).parse_file(FILENAME)
+        metrics.add_error(CodaParserException('R2004', ''))
+        snapshot = metrics.snapshot()
+        eq_(snapshot['statements'], 2)
+        eq_(snapshot['records.0'], 2)
+        eq_(snapshot['errors.R2004'], 1)
+        prometheus = metrics.to_prometheus().splitlines()
+        assert '# TYPE pycoda_records_total counter' in prometheus
+        assert 'pycoda_records_total{type="0"} 2' in prometheus
+        assert 'pycoda_statements_total 2' in prometheus
+        assert 'pycoda_errors_total{code="R2004"} 1' in prometheus
+        statsd = metrics.to_statsd('coda')
+        assert 'coda.records.0:2|g' in statsd
+        assert 'coda.errors.R2004:1|g' in statsd
+        assert [line for line in statsd if line.startswith('coda.time.21:')]
@@ -26,10 +26,24 @@
 # Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
 #
 #
-from coda.parser import Parser, CodaParserException
-from coda.statement import AmountSign, MovementRecordType
+from coda.parser import Parser, CodaParserException, AmountMode, \
+    IncrementalParser, ParserState
+from coda.cache import MemoryCache
+from coda.codec import CodecError
+from coda.layout import LAYOUTS, compile_extractor
+from coda.statement import AmountSign, MovementRecordType, \
+    MovementRecord, InformationRecord, FreeCommunication, Statement, \
+    MovementColumns, INT64_TYPECODE
+from coda.tests.generator import generate
 from nose.tools import eq_, assert_raises
+import datetime
+import io
+import mmap
 import os
+import pickle
+import tempfile
+import time
+from decimal import Decimal
 
 BASEPATH = os.path.dirname(__file__)
 
@@ -92,6 +106,8 @@ class TestParser(object):
         eq_(movement.communication_is_structured, True)
         eq_(movement.communication_type, "114")
         eq_(movement.communication, "+++931/3843/84900+++ 2905172259460041")
+        # only the types 101 and 102 are OGM/VCS
+        eq_(movement.structured_reference, None)
         eq_(movement.entry_date, '2009-03-05')
         eq_(movement.type, MovementRecordType.NORMAL)
         eq_(movement.globalisation_code, 0)
@@ -194,6 +210,18 @@ class TestParser(object):
         statements = parser.parse_file(file_name)
         eq_(len(statements), 1)
 
+        # test parsing from buffers
+        with open(file_name, 'rb') as f:
+            content = f.read()
+        expected = _dump(statements)
+        for value in (content, bytearray(content), memoryview(content)):
+            eq_(_dump(parser.parse_file(value)), expected)
+            eq_(_dump(Parser(cache=MemoryCache()).parse_file(value)),
+                expected)
+            eq_(_dump(parser.iter_statements(value)), expected)
+        with assert_raises(ValueError):
+            parser.parse_file(b'invalid\ncontent')
+
         # test parsing from a file-like object
         parser = Parser()
         with open(os.path.join(file_name), 'rb'):
@@ -214,3 +242,334 @@ class TestParser(object):
         st = statements[0]
         eq_(st.acc_number, 'FR1234567890240924002304825')
         eq_(st.currency, 'EUR')
+
+    def test_iter_statements(self):
+        """Check that the streaming API gives the same result as parse"""
+        parser = Parser()
+        for file_name in ("Coda_v2_3_single_statement.txt",
+                          "Coda_v2_3_multi_statements.txt",
+                          "Coda_v2_3_globalisation.txt",
+                          "Coda_v2_3_faulty_globalisation.txt",
+                          "Coda_foreign_account.txt"):
+            file_name = os.path.join(BASEPATH, file_name)
+            with open(file_name, 'rb') as f:
+                expected = parser.parse(f.read())
+            with open(file_name, 'rb') as f:
+                statements = list(parser.iter_statements(f))
+            eq_(_dump(statements), _dump(expected))
+            eq_(_dump(parser.iter_statements(file_name)), _dump(expected))
+        with assert_raises(ValueError):
+            list(parser.iter_statements(io.BytesIO(b'invalid_coda_content')))
+        with assert_raises(ValueError):
+            list(parser.iter_statements(io.BytesIO(b'')))
+
+    def test_mmap(self):
+        parser = Parser()
+        for file_name in ("Coda_v2_3_multi_statements.txt",
+                          "Coda_v2_3_globalisation.txt"):
+            file_name = os.path.join(BASEPATH, file_name)
+            expected = _dump(parser.parse_file(file_name))
+            with open(file_name, 'rb') as f:
+                content = f.read()
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            eq_(_dump(parser.parse(buf)), expected)
+            buf.close()
+            eq_(_dump(parser.parse(memoryview(content))), expected)
+        with assert_raises(ValueError):
+            parser.parse(memoryview(b'invalid_coda_content'))
+
+    def test_iter_records(self):
+        parser = Parser()
+        file_name = os.path.join(BASEPATH, "Coda_v2_3_single_statement.txt")
+        with open(file_name, 'rb') as f:
+            records = list(parser.iter_records(f))
+        with open(file_name, 'rb') as f:
+            expected = f.read().decode('windows-1252').split('\n')
+        # the trailing newline does not start a new record
+        eq_(records + [''], expected)
+
+    def test_date_format(self):
+        file_name = os.path.join(BASEPATH, "Coda_v2_3_single_statement.txt")
+        parser = Parser(date_format='%d/%m/%Y %a %j')
+        statement = parser.parse_file(file_name)[0]
+        eq_(statement.creation_date, time.strftime(
+            '%d/%m/%Y %a %j', time.strptime('050309', '%d%m%y')))
+        eq_(statement.movements[0].entry_date, time.strftime(
+            '%d/%m/%Y %a %j', time.strptime('050309', '%d%m%y')))
+        parser.date_format = None
+        statement = parser.parse_file(file_name)[0]
+        eq_(statement.creation_date, datetime.date(2009, 3, 5))
+        eq_(statement.old_balance_date, datetime.date(2009, 3, 4))
+        eq_(statement.movements[0].transaction_date, datetime.date(2009, 3, 5))
+
+    def test_date_cache_size(self):
+        parser = Parser(date_cache_size=2)
+        eq_(parser._parse_date('050309'), '2009-03-05')
+        eq_(parser._parse_date('040309'), '2009-03-04')
+        eq_(parser._parse_date('030309'), '2009-03-03')
+        assert len(parser._date_cache) <= 2
+        with assert_raises(ValueError):
+            parser._parse_date('      ')
+
+    def test_layouts(self):
+        for key, layout in LAYOUTS.items():
+            for field in layout:
+                assert 0 < field.start < field.end <= 128, (key, field)
+        extract = compile_extractor(LAYOUTS['4'], {'_text': lambda s: s})
+        comm = FreeCommunication()
+        extract('4 00010000' + ' ' * 22 + 'free text', comm)
+        eq_(comm.ref, '00010000')
+        eq_(comm.communication, 'free text')
+
+    def test_slots(self):
+        record = MovementRecord()
+        record.communication = 'test'
+        eq_(record.communication, 'test')
+        with assert_raises(AttributeError):
+            record.unknown_field = 1
+        assert not hasattr(Statement(), '__dict__')
+
+    def test_compact(self):
+        for file_name in ("Coda_v2_3_multi_statements.txt",
+                          "Coda_v2_3_globalisation.txt",
+                          "Coda_v2_3_faulty_globalisation.txt"):
+            file_name = os.path.join(BASEPATH, file_name)
+            expected = Parser().parse_file(file_name)
+            statements = Parser(compact=True).parse_file(file_name)
+            assert isinstance(statements[0].movements, MovementColumns)
+            eq_(_dump(statements), _dump(expected))
+            for fields in (['communication'], ['transaction_amount']):
+                eq_(_dump(Parser(compact=True, fields=fields).parse_file(
+                    file_name)), _dump(Parser(fields=fields).parse_file(
+                        file_name)))
+        movements = statements[0].movements
+        eq_(movements.columns['transaction_amount'].typecode, 'd')
+        row = movements[-1]
+        row.communication = 'changed'
+        eq_(movements[len(movements) - 1].communication, 'changed')
+        record = row.materialize()
+        assert isinstance(record, MovementRecord)
+        eq_(record.communication, 'changed')
+        eq_(len(movements[1:3]), 2)
+        with assert_raises(IndexError):
+            movements[len(movements)]
+        # values not fitting a typed column are still accepted
+        movements.append(MovementRecord())
+        eq_(movements[-1].transaction_amount, None)
+        eq_(movements[0].transaction_amount, expected[0].movements[0]
+            .transaction_amount)
+
+    def test_amount_modes(self):
+        file_name = os.path.join(BASEPATH, "Coda_v2_3_multi_statements.txt")
+        expected = Parser().parse_file(file_name)[0].movements
+        statement = Parser(
+            amount_mode=AmountMode.INTEGER).parse_file(file_name)[0]
+        eq_(statement.movements[0].transaction_amount, 20000)
+        eq_(statement.old_balance, 0)
+        eq_([mv.transaction_amount for mv in statement.movements],
+            [int(round(mv.transaction_amount * 1000)) for mv in expected])
+        statement = Parser(
+            amount_mode=AmountMode.DECIMAL).parse_file(file_name)[0]
+        eq_(statement.movements[0].transaction_amount, Decimal('20.000'))
+        eq_([float(mv.transaction_amount) for mv in statement.movements],
+            [mv.transaction_amount for mv in expected])
+        statement = Parser(
+            amount_mode=AmountMode.INTEGER,
+            signed_amounts=True).parse_file(file_name)[0]
+        eq_([mv.transaction_amount for mv in statement.movements],
+            [int(round(mv.transaction_amount * 1000)) *
+             (-1 if mv.transaction_amount_sign == AmountSign.DEBIT else 1)
+             for mv in expected])
+        statement = Parser(
+            amount_mode=AmountMode.INTEGER,
+            compact=True).parse_file(file_name)[0]
+        eq_(statement.movements.columns['transaction_amount'].typecode,
+            INT64_TYPECODE)
+        with assert_raises(ValueError):
+            Parser(amount_mode='unknown')
+
+    def test_check_balance(self):
+        file_name = os.path.join(BASEPATH, "Coda_v2_3_multi_statements.txt")
+        with open(file_name, 'rb') as f:
+            content = f.read()
+        for mode in (AmountMode.FLOAT, AmountMode.INTEGER,
+                     AmountMode.DECIMAL):
+            for signed in (True, False):
+                statements = Parser(
+                    amount_mode=mode, signed_amounts=signed,
+                    check_balance=True).parse(content)
+                for statement in statements:
+                    assert statement.is_balanced()
+        statement = Parser().parse(content)[0]
+        statement.movements[0].transaction_amount += 0.01
+        eq_(statement.balance_difference(), -10)
+        assert not statement.is_balanced()
+        # alter the amount of the first movement
+        faulty = content.replace(
+            b'2100010000SWJVZ0BN6 BKTBBNPOSKZ0000000000020000',
+            b'2100010000SWJVZ0BN6 BKTBBNPOSKZ0000000000020010')
+        with assert_raises(CodaParserException) as cm:
+            Parser(check_balance=True).parse(faulty)
+        eq_(cm.exception.code, 'R8001')
+        eq_(len(Parser().parse(faulty)), 2)
+
+    def test_lazy(self):
+        for file_name in ("Coda_v2_3_multi_statements.txt",
+                          "Coda_v2_3_globalisation.txt",
+                          "Coda_v2_3_faulty_globalisation.txt",
+                          "Coda_foreign_account.txt"):
+            file_name = os.path.join(BASEPATH, file_name)
+            expected = _dump(Parser().parse_file(file_name))
+            statements = Parser(lazy=True).parse_file(file_name)
+            eq_(_dump(statements), expected)
+        statement = Parser(lazy=True).parse_file(os.path.join(
+            BASEPATH, "Coda_v2_3_single_statement.txt"))[0]
+        movement = statement.movements[0]
+        assert isinstance(movement, MovementRecord)
+        # the fields are decoded on first access only
+        with assert_raises(AttributeError):
+            MovementRecord.communication.__get__(movement)
+        eq_(movement.communication, "+++931/3843/84900+++ 2905172259460041")
+        eq_(MovementRecord.communication.__get__(movement),
+            "+++931/3843/84900+++ 2905172259460041")
+        with assert_raises(AttributeError):
+            movement.unknown_field
+        self._checkMovement(pickle.loads(pickle.dumps(movement)))
+        record = statement.informations[0].materialize()
+        eq_(type(record), InformationRecord)
+        self._checkInformation(record)
+        with assert_raises(ValueError):
+            Parser(lazy=True, compact=True)
+
+    def test_fields_projection(self):
+        file_name = os.path.join(BASEPATH, "Coda_v2_3_globalisation.txt")
+        expected = Parser().parse_file(file_name)[0]
+        fields = ['transaction_amount', 'transaction_amount_sign',
+                  'entry_date', 'communication', 'new_balance']
+        for lazy in (False, True):
+            statement = Parser(
+                fields=fields, lazy=lazy).parse_file(file_name)[0]
+            eq_(statement.new_balance, expected.new_balance)
+            eq_(statement.acc_number, None)
+            eq_(len(statement.movements), len(expected.movements))
+            for movement, expected_movement in zip(
+                    statement.movements, expected.movements):
+                for name in fields[:-1] + ['ref', 'transaction_type', 'type']:
+                    eq_(getattr(movement, name),
+                        getattr(expected_movement, name))
+                eq_(movement.counterparty_name, None)
+                eq_(movement.transaction_date, None)
+            # the information records hold a communication
+            eq_(len(statement.informations), len(expected.informations))
+            eq_(statement.informations[0].communication,
+                expected.informations[0].communication)
+            eq_(statement.informations[0].transaction_family, None)
+        statement = Parser(
+            fields=['old_balance', 'new_balance'],
+            check_balance=True).parse_file(file_name)[0]
+        eq_(statement.movements[0].transaction_amount,
+            expected.movements[0].transaction_amount)
+        statement = Parser(fields=['acc_number']).parse_file(file_name)[0]
+        eq_(statement.acc_number, expected.acc_number)
+        eq_(statement.movements, [])
+        eq_(statement.informations, [])
+        with assert_raises(ValueError):
+            Parser(fields=['unknown_field'])
+
+    def test_incremental(self):
+        content = generate(statements=4, movements=20, globalisation=0.4)
+        # last statement without trailer record
+        content = content[:content.rindex(b'9 ')]
+        expected = _dump(Parser().parse(content))
+        for size in (1, 7, 128, 1000):
+            incremental = IncrementalParser()
+            statements = []
+            for i in range(0, len(content), size):
+                statements += incremental.feed(content[i:i + size])
+            eq_(len(statements), 3)
+            statements += incremental.close()
+            eq_(_dump(statements), expected)
+            eq_(incremental.state.offset, len(content))
+        # resume from a checkpoint
+        incremental = IncrementalParser(Parser(lazy=True))
+        statements = incremental.feed(content[:3000])
+        checkpoint = incremental.checkpoint()
+        incremental = IncrementalParser(Parser(lazy=True), checkpoint)
+        statements += incremental.feed(content[3000:])
+        statements += incremental.close()
+        eq_(_dump(statements), expected)
+        with assert_raises(ValueError):
+            IncrementalParser().feed(b'invalid\ncoda content')
+        with assert_raises(ValueError):
+            IncrementalParser().close()
+
+    def test_checkpoint(self):
+        content = generate(statements=2, movements=20, seed=4)
+        expected = _dump(Parser(compact=True).parse(content))
+        incremental = IncrementalParser(Parser(compact=True))
+        statements = incremental.feed(content[:2500])
+        checkpoint = incremental.checkpoint()
+        assert checkpoint.startswith(b'CODS')
+        state = ParserState.loads(checkpoint)
+        eq_(state.offset, 2500)
+        eq_(state.buffer, incremental.state.buffer)
+        eq_((state.pending, state.started), (True, True))
+        incremental = IncrementalParser(Parser(compact=True), checkpoint)
+        statements += incremental.feed(content[2500:])
+        statements += incremental.close()
+        eq_(_dump(statements), expected)
+        eq_(IncrementalParser(state=IncrementalParser().checkpoint())
+            .state.statement, None)
+        # never unpickled
+        for data in (pickle.dumps(ParserState(), 2), checkpoint[:20],
+                     b'CODS\x02' + checkpoint[5:]):
+            with assert_raises(CodecError):
+                IncrementalParser(state=data)
+
+    def test_incremental_error(self):
+        with open(os.path.join(BASEPATH, 'Coda_faulty_version.txt'),
+                  'rb') as f:
+            content = f.read()
+        incremental = IncrementalParser()
+        with assert_raises(CodaParserException):
+            incremental.feed(content)
+        # the data can be fed again
+        eq_(incremental.state.offset, 0)
+        eq_(incremental.state.buffer, b'')
+
+    def test_incremental_file(self):
+        content = generate(statements=3, movements=10)
+        fd, path = tempfile.mkstemp()
+        try:
+            incremental = IncrementalParser()
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content[:2000])
+                f.flush()
+                statements = incremental.feed_file(path)
+                f.write(content[2000:])
+            statements += incremental.feed_file(path)
+            eq_(incremental.feed_file(path), [])
+            statements += incremental.close()
+        finally:
+            os.remove(path)
+        eq_(_dump(statements), _dump(Parser().parse(content)))
+
+
+def _values(record, record_class):
+    return dict((name, getattr(record, name))
+                for name in record_class.__slots__)
+
+
+def _dump(statements):
+    """ Return a comparable representation of the given statements """
+    result = []
+    for st in statements:
+        values = _values(st, Statement)
+        values['movements'] = [
+            _values(r, MovementRecord) for r in st.movements]
+        values['informations'] = [
+            _values(r, InformationRecord) for r in st.informations]
+        values['free_comunications'] = [
+            _values(r, FreeCommunication) for r in st.free_comunications]
+        result.append(values)
+    return result
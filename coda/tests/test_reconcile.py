@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.parser import AmountMode, Parser
+from coda.reconcile import ReconciliationIndex, structured_digits
+from coda.tests.generator import generate
+from nose.tools import eq_
+
+
+class TestReconcile(object):
+
+    def _index(self, **options):
+        statements = Parser(**options).parse(
+            generate(statements=3, movements=50, structured=0.5, seed=3))
+        movements = [mv for st in statements for mv in st.movements]
+        return statements, movements, ReconciliationIndex(statements)
+
+    def test_structured_digits(self):
+        eq_(structured_digits('+++123/4567/89012+++'), '123456789012')
+        eq_(structured_digits('***123/4567/89012***'), '123456789012')
+        eq_(structured_digits('123456789012'), '123456789012')
+        eq_(structured_digits('+++000/0000/09797+++'), '000000009797')
+        eq_(structured_digits('INVOICE 12'), None)
+        eq_(structured_digits(None), None)
+
+    def test_lookups(self):
+        statements, movements, index = self._index()
+        eq_(len(index), len(movements))
+        structured = [mv for mv in movements
+                      if mv.communication_is_structured]
+        assert structured
+        for mv in structured:
+            matches = index.find_communication(mv.communication)
+            assert mv in [m.movement for m in matches]
+            eq_(index.find_communication(mv.structured_reference),
+                matches)
+            eq_(index.find_communication(mv.communication[3:20].replace(
+                '/', '')), matches)
+        for mv in movements:
+            if mv.payment_reference:
+                assert mv in [m.movement for m in
+                              index.find_payment_reference(
+                                  mv.payment_reference)]
+            if mv.counterparty_number:
+                assert mv in [m.movement for m in index.find_counterparty(
+                    mv.counterparty_number)]
+        mv = movements[-1]
+        sign = -1 if mv.transaction_amount_sign == '1' else 1
+        matches = index.find_amount(sign * mv.transaction_amount,
+                                    mv.entry_date)
+        eq_([m.movement for m in matches], [mv])
+        eq_(matches[0].statement, statements[-1])
+        eq_(index.find_amount(sign * mv.transaction_amount, '1999-01-01'),
+            [])
+
+    def test_match(self):
+        statements, movements, index = self._index(
+            amount_mode=AmountMode.INTEGER, signed_amounts=True)
+        with_counterparty = [mv for mv in movements
+                             if mv.counterparty_number][0]
+        structured = [mv for mv in movements
+                      if mv.communication_is_structured][0]
+        results = index.match([
+            {'communication': structured.communication,
+             'amount': 1},
+            {'counterparty_number': with_counterparty.counterparty_number,
+             'amount': with_counterparty.transaction_amount},
+            {'counterparty_number': with_counterparty.counterparty_number,
+             'amount': with_counterparty.transaction_amount + 1},
+            {'amount': movements[0].transaction_amount},
+            {'communication': '+++000/0000/00097+++'},
+            # an unknown counterparty falls back to the amount
+            {'counterparty_number': 'BE00000000000000',
+             'amount': movements[0].transaction_amount},
+        ])
+        eq_([m.movement for m in results[0]], [structured])
+        eq_([m.movement for m in results[1]], [with_counterparty])
+        eq_(results[2], [])
+        eq_([m.movement for m in results[3]], [movements[0]])
+        eq_(results[4], [])
+        eq_(results[5], results[3])
+
+    def test_compact(self):
+        statements = Parser(compact=True).parse(
+            generate(statements=1, movements=20, structured=1))
+        index = ReconciliationIndex(statements)
+        mv = statements[0].movements[3]
+        eq_([m.movement.ref for m in index.find_communication(
+            mv.communication)], [mv.ref])
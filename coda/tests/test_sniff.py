@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.cli import main
+from coda.parser import Parser
+from coda.sniff import sniff
+from coda.tests.generator import generate
+from nose.tools import eq_, assert_raises
+import datetime
+import io
+import mmap
+import os
+
+BASEPATH = os.path.dirname(__file__)
+
+
+class TestSniff(object):
+
+    def test_sniff(self):
+        path = os.path.join(BASEPATH, "Coda_v2_3_multi_statements.txt")
+        result = sniff(path, count=True)
+        eq_(result.is_coda, True)
+        eq_(result.version, '2')
+        eq_(result.bank_id, '725')
+        eq_(result.creation_date, datetime.date(2009, 3, 5))
+        eq_(result.statements, 2)
+        eq_(result.records, 137)
+        eq_(sniff(path)[:4], result[:4])
+        eq_(sniff(path).records, None)
+        with open(path, 'rb') as f:
+            content = f.read()
+            eq_(sniff(content, count=True), result)
+            eq_(sniff(memoryview(content), count=True), result)
+            f.seek(0)
+            eq_(sniff(f, count=True), result)
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                eq_(sniff(buf, count=True), result)
+            finally:
+                buf.close()
+        result = sniff(os.path.join(BASEPATH, "Coda_faulty_version.txt"))
+        eq_(result.version, '5')
+
+    def test_creation_date(self):
+        with open(os.path.join(
+                BASEPATH, "Coda_v2_3_single_statement.txt"), 'rb') as f:
+            content = f.read()
+        # the years are converted like the parser does
+        for year, expected in [
+                (b'68', datetime.date(2068, 3, 5)),
+                (b'69', datetime.date(1969, 3, 5)),
+                (b'99', datetime.date(1999, 3, 5))]:
+            result = sniff(content[:9] + year + content[11:])
+            eq_(result.creation_date, expected)
+            statements = Parser(date_format=None).parse(
+                content[:9] + year + content[11:])
+            eq_(statements[0].creation_date, expected)
+        eq_(sniff(content[:5] + b'310209' + content[11:]).creation_date,
+            None)
+
+    def test_counts(self):
+        content = generate(statements=5, movements=20, newline='\n')
+        eq_(sniff(content, count=True)[4:], (5, content.count(b'\n')))
+        # empty lines are not counted
+        content = content.replace(b'\n0', b'\n\r\n0') + b'\n\n'
+        eq_(sniff(io.BytesIO(content), count=True)[4:],
+            (5, content.count(b'\n') - 6))
+
+    def test_not_coda(self):
+        eq_(sniff(b'Hello world'), (False, None, None, None, None, None))
+        eq_(sniff(b''), (False, None, None, None, None, None))
+        with assert_raises(ValueError):
+            sniff(u'invalid_file_name')
+
+    def test_cli(self):
+        out = io.StringIO()
+        path = os.path.join(BASEPATH, "Coda_v2_3_single_statement.txt")
+        eq_(main(['sniff', '--count', path], out), 0)
+        eq_(out.getvalue(), '%s: CODA version 2, bank 725, created '
+            '2009-03-05, 1 statement(s), 93 record(s)\n' % path)
+        out = io.StringIO()
+        eq_(main(['sniff', path, __file__], out), 1)
+        eq_(out.getvalue().splitlines(), [
+            '%s: CODA version 2, bank 725, created 2009-03-05' % path,
+            '%s: not a CODA file' % __file__])
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.parser import Parser
+from coda.tests.generator import generate
+from coda.timeline import Timeline, fingerprint
+from nose.tools import eq_, assert_raises
+import os
+import sqlite3
+import tempfile
+
+
+def _statements(count, **options):
+    statements = Parser(**options).parse(generate(
+        statements=count, movements=5))
+    for statement in statements:
+        # the generator changes of account for each statement
+        statement.acc_number = 'BE00000000000001'
+    return statements
+
+
+class TestTimeline(object):
+
+    def test_chain(self):
+        statements = _statements(6)
+        timeline = Timeline(sqlite3.connect(':memory:'))
+        checks = timeline.add_all(statements[:2], source='a.txt')
+        eq_([c.duplicate for c in checks], [False, False])
+        eq_(checks[0].previous, None)
+        eq_(checks[1].previous.coda_seq, 1)
+        eq_(checks[1].missing, [])
+        eq_(checks[1].balance_break, 0)
+        # statement 3 is not received
+        check = timeline.add(statements[3], source='b.txt')
+        eq_(check.missing, [3])
+        assert check.balance_break != 0
+        eq_(timeline.missing('BE00000000000001'), [3])
+        eq_(len(timeline.balance_breaks('BE00000000000001')), 1)
+        # received later
+        timeline.add(statements[2])
+        eq_(timeline.missing('BE00000000000001'), [])
+        eq_(timeline.balance_breaks('BE00000000000001'), [])
+        # delivered twice
+        check = timeline.add(statements[1])
+        eq_(check.duplicate, True)
+        eq_(timeline.is_duplicate(statements[1]), True)
+        eq_(timeline.is_duplicate(statements[4]), False)
+        eq_([e.coda_seq for e in timeline.entries('BE00000000000001')],
+            [1, 2, 3, 4])
+        eq_(timeline.entries('BE00000000000001')[0].source, 'a.txt')
+        eq_(timeline.accounts(), ['BE00000000000001'])
+
+    def test_new_year(self):
+        statements = _statements(3)
+        statements[0].new_balance_date = '2020-12-31'
+        statements[0].coda_seq_number = '250'
+        statements[1].new_balance_date = '2021-01-08'
+        statements[1].coda_seq_number = '4'
+        statements[2].new_balance_date = '2021-01-15'
+        statements[2].coda_seq_number = '5'
+        timeline = Timeline(sqlite3.connect(':memory:'))
+        checks = timeline.add_all(statements)
+        # the sequence numbers restart at 1 each year
+        eq_(checks[1].missing, [1, 2, 3])
+        eq_(checks[2].missing, [])
+        eq_(timeline.missing('BE00000000000001'), [1, 2, 3])
+        statements[1].coda_seq_number = '1'
+        statements[2].coda_seq_number = '2'
+        timeline = Timeline(sqlite3.connect(':memory:'))
+        eq_([c.missing for c in timeline.add_all(statements)], [[], [], []])
+
+    def test_fingerprint(self):
+        statement = _statements(1)[0]
+        other = _statements(1, date_format=None, compact=True)[0]
+        eq_(fingerprint(statement), fingerprint(other))
+        other.movements.set_value(0, 'transaction_amount', 1.0)
+        assert fingerprint(statement) != fingerprint(other)
+        statement = _statements(1, date_format='%d/%m/%Y')[0]
+        with assert_raises(ValueError):
+            fingerprint(statement)
+
+    def test_persistent(self):
+        statements = _statements(3)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            timeline = Timeline(path)
+            timeline.add_all(statements[:2])
+            timeline.close()
+            timeline = Timeline(path)
+            check = timeline.add(statements[2])
+            eq_(check.previous.coda_seq, 2)
+            eq_(check.balance_break, 0)
+            eq_(timeline.add(statements[0]).duplicate, True)
+            timeline.close()
+        finally:
+            os.remove(path)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+#
+from coda.parser import Parser
+from coda.statement import AmountSign, to_thousandths
+from coda.tests.generator import generate
+from coda.tests.test_parser import _dump
+from coda.where import Where
+from decimal import Decimal
+from nose.tools import eq_, assert_raises
+import datetime
+import os
+
+BASEPATH = os.path.dirname(__file__)
+
+
+def _filter(statements, account=None, sign=None, amount_min=None,
+            amount_max=None, date_from=None, date_to=None, family=None):
+    """ Filter the parsed statements as Where filters the records """
+    result = []
+    for st in statements:
+        if account is not None and st.acc_number not in account:
+            continue
+        movements = []
+        keep = True
+        for mv in st.movements:
+            if mv.transaction_type < 4:
+                amount = to_thousandths(mv.transaction_amount)
+                keep = (
+                    (sign is None or mv.transaction_amount_sign == sign) and
+                    (amount_min is None or amount >= amount_min) and
+                    (amount_max is None or amount <= amount_max) and
+                    (date_from is None or mv.entry_date >= date_from) and
+                    (date_to is None or mv.entry_date <= date_to) and
+                    (family is None or mv.transaction_family in family))
+            if keep:
+                movements.append(mv)
+        refs = set(mv.ref_move for mv in movements)
+        st.movements = movements
+        st.informations = [info for info in st.informations
+                           if info.ref_move in refs]
+        result.append(st)
+    return result
+
+
+class TestWhere(object):
+
+    def _check(self, value, **where):
+        parser = Parser()
+        expected = _dump(_filter(parser.parse(value), **where))
+        eq_(_dump(parser.parse(value, where=where)), expected)
+        eq_(_dump(parser.parse(value, where=Where(**where))), expected)
+        eq_(_dump(parser.parse(memoryview(value), where=where)), expected)
+        eq_(_dump(parser.parse(bytearray(value), where=where)), expected)
+        eq_(list(parser.iter_records(memoryview(value), where=where)),
+            list(parser.iter_records(value, where=where)))
+        return expected
+
+    def test_movements(self):
+        value = generate(statements=5, movements=40, globalisation=0.2,
+                         seed=5)
+        total = sum(len(st.movements) for st in Parser().parse(value))
+        for where in (dict(sign=AmountSign.DEBIT),
+                      dict(sign=AmountSign.CREDIT, amount_min=10000000),
+                      dict(amount_min=5000000, amount_max=20000000),
+                      dict(date_from='2020-01-03', date_to='2020-01-04'),
+                      dict(family=['01', '13'])):
+            statements = self._check(value, **where)
+            eq_(len(statements), 5)
+            count = sum(len(st['movements']) for st in statements)
+            assert 0 < count < total, (where, count)
+
+    def test_amount_types(self):
+        value = generate(statements=2, movements=30, seed=6)
+        parser = Parser()
+        expected = _dump(parser.parse(value, where=dict(amount_min=50000)))
+        eq_(_dump(parser.parse(value, where=dict(amount_min=50.0))),
+            expected)
+        eq_(_dump(parser.parse(value, where=dict(
+            amount_min=Decimal('50')))), expected)
+        eq_(_dump(parser.parse(value, where=dict(
+            date_from=datetime.date(2020, 1, 3)))),
+            _dump(parser.parse(value, where=dict(date_from='2020-01-03'))))
+
+    def test_century(self):
+        with open(os.path.join(
+                BASEPATH, 'Coda_v2_3_single_statement.txt'), 'rb') as f:
+            lines = f.read().split(b'\n')
+        dates = [b'010169', b'311299', b'010100', b'311268']
+        movements = 0
+        for i, line in enumerate(lines):
+            if line.startswith(b'21'):
+                lines[i] = line[:115] + dates[movements % 4] + line[121:]
+                movements += 1
+        value = b'\n'.join(lines)
+
+        def count(**where):
+            return sum(len(st['movements'])
+                       for st in self._check(value, **where))
+
+        eq_(count(), movements)
+        eq_(count(date_from='1999-12-01'), count(date_from='1999-12-31'))
+        eq_(count(date_from='2000-01-01') + count(date_to='1999-12-31'),
+            movements)
+        for where in (dict(date_to='1969-01-01'),
+                      dict(date_from='2068-12-31'),
+                      dict(date_from='1999-12-31', date_to='2000-01-01')):
+            assert 0 < count(**where) < movements, where
+        for where in (dict(date_from='1968-12-31'),
+                      dict(date_to='2069-01-01'),
+                      dict(date_from='1900-01-01', date_to='2100-01-01')):
+            eq_(count(**where), movements)
+        for where in (dict(date_to='1968-12-31'),
+                      dict(date_from='2069-01-01')):
+            eq_(count(**where), 0)
+        # the 2009 sample
+        with open(os.path.join(
+                BASEPATH, 'Coda_v2_3_single_statement.txt'), 'rb') as f:
+            value = f.read()
+        eq_(count(date_from='1999-12-01'), 32)
+        eq_(count(date_to='2100-01-01'), 32)
+        eq_(count(date_to='2008-12-31'), 0)
+
+    def test_account(self):
+        value = generate(statements=6, movements=10, seed=7)
+        accounts = [st.acc_number for st in Parser().parse(value)]
+        statements = self._check(value, account=accounts[1:3])
+        eq_([st['acc_number'] for st in statements], accounts[1:3])
+        statements = self._check(value, account=accounts[0],
+                                 sign=AmountSign.DEBIT)
+        eq_(len(statements), 1)
+        eq_(self._check(value, account='BE00000000000000'), [])
+        for account in ('bban', 'foreign-iban'):
+            value = generate(statements=3, movements=10, account=account,
+                             seed=8)
+            acc_number = Parser().parse(value)[2].acc_number
+            eq_(len(self._check(value, account=acc_number)), 1)
+
+    def test_globalisation(self):
+        for name in ('Coda_v2_3_globalisation.txt',
+                     'Coda_v2_3_globalisation_2.txt'):
+            with open(os.path.join(BASEPATH, name), 'rb') as f:
+                value = f.read()
+            for sign in (AmountSign.DEBIT, AmountSign.CREDIT):
+                statements = self._check(value, sign=sign)
+                for st in statements:
+                    for mv in st['movements']:
+                        # the details are kept with their globalisation
+                        if mv['transaction_type'] > 3:
+                            assert any(
+                                m['ref_move'] == mv['ref_move'] and
+                                m['transaction_type'] < 4
+                                for m in st['movements'])
+
+    def test_file(self):
+        parser = Parser()
+        file_name = os.path.join(BASEPATH, 'Coda_v2_3_multi_statements.txt')
+        where = dict(sign=AmountSign.CREDIT)
+        with open(file_name, 'rb') as f:
+            expected = _dump(parser.parse(f.read(), where=where))
+        eq_(_dump(parser.parse_file(file_name, where=where)), expected)
+        with open(file_name, 'rb') as f:
+            eq_(_dump(parser.iter_statements(f, where=where)), expected)
+
+    def test_errors(self):
+        value = generate(statements=1, movements=5)
+        assert_raises(ValueError, Parser(check_balance=True).parse, value,
+                      where=dict(sign=AmountSign.DEBIT))
+        assert_raises(ValueError, Parser().parse, b'1' + value[1:],
+                      where=dict(account='BE00000000000000'))
+        assert_raises(TypeError, Where, colour='blue')
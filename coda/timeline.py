@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Timeline of the statements of each account, kept in a SQLite database
+
+Each statement added is stored with a fingerprint of its content, its
+sequence numbers, its balance dates and its balances, so the continuity of
+the deliveries can be checked without parsing the older files again: the
+duplicates are found by fingerprint and the previous statement of the
+account by the index on the account, the date and the sequence number.
+The statements following a gap are flagged when they are added, so the gaps
+are also found by index instead of checking the whole timeline.
+
+The dates must be ISO formatted strings (the default date_format of the
+parser) or datetime.date objects.
+"""
+import datetime
+import hashlib
+import sqlite3
+from collections import namedtuple
+
+from .statement import to_thousandths
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS timeline ('
+    'fingerprint TEXT PRIMARY KEY, '
+    'account TEXT NOT NULL, '
+    'coda_seq INTEGER, '
+    'paper_seq INTEGER, '
+    'old_balance_date TEXT, '
+    'new_balance_date TEXT, '
+    'old_balance INTEGER, '
+    'new_balance INTEGER, '
+    'source TEXT, '
+    'gap INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX IF NOT EXISTS timeline_account '
+    'ON timeline (account, new_balance_date, coda_seq)',
+    'CREATE INDEX IF NOT EXISTS timeline_gap '
+    'ON timeline (account, gap, new_balance_date, coda_seq)',
+)
+
+_COLUMNS = ('fingerprint, account, coda_seq, paper_seq, old_balance_date, '
+            'new_balance_date, old_balance, new_balance, source')
+
+
+class TimelineEntry(namedtuple('TimelineEntry', _COLUMNS)):
+    """ A statement of the timeline, the balances in thousandths of the
+    currency unit, negative for a debit """
+    __slots__ = ()
+
+
+class TimelineCheck(namedtuple('TimelineCheck', 'entry duplicate previous '
+                                                'missing balance_break')):
+    """ Result of Timeline.add
+
+    Attributes:
+        entry -- the TimelineEntry of the statement
+        duplicate -- True if the statement was already in the timeline
+        previous -- the TimelineEntry of the previous statement of the
+                    account, None if it is the first one
+        missing -- the sequence numbers missing between the previous
+                   statement and this one
+        balance_break -- the difference between the old balance of the
+                         statement and the new balance of the previous one,
+                         0 when the balance chain is not broken
+    """
+    __slots__ = ()
+
+
+def _iso_date(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if value is not None and (len(value) != 10 or value[4] != '-'):
+        raise ValueError('The dates must be ISO formatted, use a parser with '
+                         'the default date_format or date_format=None')
+    return value
+
+
+def _seq(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def fingerprint(statement):
+    """ Return a fingerprint of the content of the given statement, which
+    does not depend on the options of the parser """
+    digest = hashlib.sha256()
+    values = [statement.acc_number, statement.currency,
+              statement.coda_seq_number, statement.paper_seq_number,
+              _iso_date(statement.old_balance_date),
+              _iso_date(statement.new_balance_date),
+              to_thousandths(statement.old_balance,
+                             statement.old_balance_amount_sign),
+              to_thousandths(statement.new_balance,
+                             statement.new_balance_amount_sign)]
+    for mv in statement.movements:
+        values.extend((mv.ref, mv.transaction_ref, to_thousandths(
+            mv.transaction_amount, mv.transaction_amount_sign)))
+    digest.update(repr(values).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _missing(previous, seq, new_year=False):
+    """ Return the sequence numbers missing between the given ones
+    The sequence numbers restart at 1 each year.
+    """
+    if previous is None or seq is None:
+        return []
+    if new_year or seq <= previous:
+        # restarted, without a new year the end of the previous series is
+        # unknown
+        return list(range(1, seq))
+    return list(range(previous + 1, seq))
+
+
+def _is_gap(check):
+    return 1 if check.missing or check.balance_break else 0
+
+
+class Timeline(object):
+    """Persistent timeline of the statements of each account
+    """
+
+    def __init__(self, database):
+        """
+        :param: database: a sqlite3 connection or the path of the database
+        """
+        self.connection = database
+        if not isinstance(database, sqlite3.Connection):
+            self.connection = sqlite3.connect(database)
+        with self.connection:
+            for query in _SCHEMA:
+                self.connection.execute(query)
+
+    def close(self):
+        self.connection.close()
+
+    def entry(self, statement, source=None):
+        """ Return the TimelineEntry of the given statement """
+        return TimelineEntry(
+            fingerprint(statement), statement.acc_number,
+            _seq(statement.coda_seq_number),
+            _seq(statement.paper_seq_number),
+            _iso_date(statement.old_balance_date),
+            _iso_date(statement.new_balance_date),
+            to_thousandths(statement.old_balance,
+                           statement.old_balance_amount_sign),
+            to_thousandths(statement.new_balance,
+                           statement.new_balance_amount_sign),
+            source)
+
+    def _fetch(self, query, params):
+        row = self.connection.execute(
+            'SELECT %s FROM timeline %s' % (_COLUMNS, query),
+            params).fetchone()
+        return TimelineEntry(*row) if row else None
+
+    def is_duplicate(self, statement):
+        """ Check if the given statement is already in the timeline """
+        return self.get(fingerprint(statement)) is not None
+
+    def get(self, fingerprint):
+        return self._fetch('WHERE fingerprint = ?', (fingerprint,))
+
+    def previous(self, entry):
+        """ Return the entry preceding the given one in the timeline of its
+        account, None if there is none """
+        return self._fetch(
+            'WHERE account = ? AND (new_balance_date < ? OR '
+            '(new_balance_date = ? AND coda_seq < ?)) '
+            'ORDER BY new_balance_date DESC, coda_seq DESC LIMIT 1',
+            (entry.account, entry.new_balance_date, entry.new_balance_date,
+             entry.coda_seq))
+
+    def next(self, entry):
+        """ Return the entry following the given one in the timeline of its
+        account, None if there is none """
+        return self._fetch(
+            'WHERE account = ? AND (new_balance_date > ? OR '
+            '(new_balance_date = ? AND coda_seq > ?)) '
+            'ORDER BY new_balance_date, coda_seq LIMIT 1',
+            (entry.account, entry.new_balance_date, entry.new_balance_date,
+             entry.coda_seq))
+
+    def check(self, entry, previous):
+        """ Return the TimelineCheck of the given entry following previous
+        """
+        if previous is None:
+            return TimelineCheck(entry, False, None, [], 0)
+        new_year = (entry.new_balance_date or '')[:4] != \
+            (previous.new_balance_date or '')[:4]
+        return TimelineCheck(
+            entry, False, previous,
+            _missing(previous.coda_seq, entry.coda_seq, new_year),
+            entry.old_balance - previous.new_balance)
+
+    def add(self, statement, source=None):
+        """ Add the given statement to the timeline, unless it is a
+        duplicate
+        :param: source: the file of the statement, stored with it
+        :returns: the TimelineCheck of the statement, against the previous
+                  statement of the account
+        """
+        entry = self.entry(statement, source)
+        if self.get(entry.fingerprint) is not None:
+            return self.check(entry, self.previous(entry))._replace(
+                duplicate=True)
+        result = self.check(entry, self.previous(entry))
+        following = self.next(entry)
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO timeline (%s, gap) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)' % _COLUMNS,
+                tuple(entry) + (_is_gap(result),))
+            if following is not None:
+                # the entry may fill the gap before the following one
+                self.connection.execute(
+                    'UPDATE timeline SET gap = ? WHERE fingerprint = ?',
+                    (_is_gap(self.check(following, entry)),
+                     following.fingerprint))
+        return result
+
+    def add_all(self, statements, source=None):
+        """ Add the given statements, e.g. Parser.iter_statements(path)
+        :returns: the list of their TimelineCheck
+        """
+        return [self.add(statement, source) for statement in statements]
+
+    def entries(self, account):
+        """ Return the entries of the given account, in order """
+        return [TimelineEntry(*row) for row in self.connection.execute(
+            'SELECT %s FROM timeline WHERE account = ? '
+            'ORDER BY new_balance_date, coda_seq' % _COLUMNS, (account,))]
+
+    def accounts(self):
+        return [row[0] for row in self.connection.execute(
+            'SELECT DISTINCT account FROM timeline ORDER BY account')]
+
+    def gaps(self, account):
+        """ Return the checks of the entries of the given account having
+        missing sequence numbers or a broken balance chain """
+        rows = self.connection.execute(
+            'SELECT %s FROM timeline WHERE account = ? AND gap = 1 '
+            'ORDER BY new_balance_date, coda_seq' % _COLUMNS, (account,))
+        result = []
+        for row in rows.fetchall():
+            entry = TimelineEntry(*row)
+            result.append(self.check(entry, self.previous(entry)))
+        return result
+
+    def missing(self, account):
+        """ Return the sequence numbers missing in the timeline of the given
+        account """
+        return [seq for check in self.gaps(account) for seq in check.missing]
+
+    def balance_breaks(self, account):
+        """ Return the (previous entry, entry, difference) of the given
+        account where the old balance is not the previous new balance """
+        return [(check.previous, check.entry, check.balance_break)
+                for check in self.gaps(account) if check.balance_break]
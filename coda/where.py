@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# Authors: Laurent Mignon
+# Copyright (c) 2013 Acsone SA/NV (http://www.acsone.eu)
+# All Rights Reserved
+#
+# WARNING: This program as such is intended to be used by professional
+# programmers who take the whole responsibility of assessing all potential
+# consequences resulting from its eventual inadequacies and bugs.
+# End users who are looking for a ready-to-use solution with commercial
+# guarantees and support are strongly advised to contact a Free Software
+# Service Company.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.
+#
+
+"""Filters of the records, checked on the raw lines before decoding them
+
+A Where selects statements by account and movements by amount sign,
+amount range, entry date and transaction family, code or category. The
+checks are compiled into functions reading the fixed offsets of the layouts
+in the raw (bytes) records 1 and 2.1, so the records filtered out are never
+decoded nor parsed.
+
+A movement is filtered out with its group: the globalisation details
+following it and its 2.2, 2.3 and information records. The details of a
+globalisation are kept or filtered out with it, since only the movement
+starting the group is checked.
+"""
+import datetime
+from decimal import Decimal
+
+from .layout import LAYOUTS
+
+_ENCODING = 'windows-1252'
+
+
+def _field(key, name):
+    for field in LAYOUTS[key]:
+        if field.name == name:
+            return field
+    raise KeyError(name)
+
+
+def _slice(field):
+    return 'line[%d:%d]' % (field.start, field.end)
+
+
+_TRANSACTION_TYPE = _field('21', 'transaction_type').start
+
+
+def _bytes_set(values):
+    if isinstance(values, (str, bytes, type(u''))):
+        values = [values]
+    return frozenset(v if isinstance(v, bytes) else v.encode(_ENCODING)
+                     for v in values)
+
+
+def _thousandths(amount):
+    # as to_thousandths: an int is already in thousandths
+    if isinstance(amount, float):
+        return int(round(amount * 1000))
+    elif isinstance(amount, Decimal):
+        return int(amount * 1000)
+    return amount
+
+
+def _date_key(value):
+    """ Return the sortable key of the given date, as built from the DDMMYY
+    dates of the records: the century (1 for the years 1969 to 1999, 2 for
+    2000 to 2068, as the parser converts them) followed by YYMMDD. The dates
+    out of that range give a key before or after all the keys of the records
+    """
+    if isinstance(value, (str, type(u''))):
+        value = datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    if value.year < 1969:
+        return b'0'
+    elif value.year > 2068:
+        return b'3'
+    century = b'1' if value.year < 2000 else b'2'
+    return century + ('%02d%02d%02d' % (
+        value.year % 100, value.month, value.day)).encode('ascii')
+
+
+class Where(object):
+    """Filter of the statements and of the movements
+
+    :param: account: account number or numbers of the statements to keep
+    :param: sign: AmountSign of the movements to keep
+    :param: amount_min: minimum amount of the movements, without sign, as a
+                        float or a Decimal, or an int in thousandths
+    :param: amount_max: maximum amount of the movements, as amount_min
+    :param: date_from: first entry date of the movements, a datetime.date
+                       or an ISO formatted string
+    :param: date_to: last entry date of the movements, as date_from
+    :param: family: transaction family or families of the movements to keep
+    :param: code: transaction code or codes of the movements to keep
+    :param: category: transaction category or categories of the movements
+                      to keep
+    """
+
+    def __init__(self, account=None, sign=None, amount_min=None,
+                 amount_max=None, date_from=None, date_to=None, family=None,
+                 code=None, category=None):
+        self.spec = dict(
+            (k, v) for k, v in (
+                ('account', account), ('sign', sign),
+                ('amount_min', amount_min), ('amount_max', amount_max),
+                ('date_from', date_from), ('date_to', date_to),
+                ('family', family), ('code', code), ('category', category))
+            if v is not None)
+        namespace = {}
+        self.accounts = None
+        if account is not None:
+            self.accounts = _bytes_set(account)
+        self.account_slices = {
+            b'0': _field('1', 'acc_number'),
+            b'2': _field('1-iban', 'acc_number'),
+            b'3': _field('1-foreign-iban', 'acc_number'),
+        }
+        checks = []
+        if sign is not None:
+            checks.append('%s == %r' % (
+                _slice(_field('21', 'transaction_amount_sign')),
+                sign.encode('ascii')))
+        amount = 'int(%s)' % _slice(_field('21', 'transaction_amount'))
+        if amount_min is not None:
+            checks.append('%s >= %d' % (amount, _thousandths(amount_min)))
+        if amount_max is not None:
+            checks.append('%s <= %d' % (amount, _thousandths(amount_max)))
+        if date_from is not None or date_to is not None:
+            field = _field('21', 'entry_date')
+            # DDMMYY to the key of _date_key
+            year = 'line[%d:%d]' % (field.start + 4, field.start + 6)
+            date = "(b'1' if %s >= b'69' else b'2') + %s + " \
+                "line[%d:%d] + line[%d:%d]" % (
+                    year, year, field.start + 2, field.start + 4,
+                    field.start, field.start + 2)
+            if date_from is not None:
+                checks.append('%s >= %r' % (date, _date_key(date_from)))
+            if date_to is not None:
+                checks.append('%s <= %r' % (date, _date_key(date_to)))
+        for name, values in (('transaction_family', family),
+                             ('transaction_code', code),
+                             ('transaction_category', category)):
+            if values is not None:
+                namespace['_' + name] = _bytes_set(values)
+                checks.append('%s in _%s' % (
+                    _slice(_field('21', name)), name))
+        self.match_movement = None
+        if checks:
+            source = 'def match(line):\n    return %s\n' % ' and '.join(
+                '(%s)' % check for check in checks)
+            exec(compile(source, '<coda where>', 'exec'), namespace)
+            self.match_movement = namespace['match']
+
+    def __repr__(self):
+        return 'Where(%s)' % ', '.join(
+            '%s=%r' % item for item in sorted(self.spec.items()))
+
+    def match_statement(self, header, line):
+        """ Check the account of the old balance record (1) of a statement
+        """
+        if self.accounts is None:
+            return True
+        if header[127:128] == b'1':
+            field = self.account_slices[b'0']
+        else:
+            field = self.account_slices.get(line[1:2])
+            if field is None:
+                # unsupported structure, the parser raises the error
+                return True
+        return b' '.join(line[field.start:field.end].split()) in \
+            self.accounts
+
+    def filter(self, lines):
+        """ Iterate over the given raw lines (bytes) which are not filtered
+        out """
+        match_movement = self.match_movement
+        header = None
+        skip_statement = skip_group = False
+        for line in lines:
+            if isinstance(line, memoryview):
+                # bytes(memoryview) is its repr on Python 2
+                line = line.tobytes()
+            elif not isinstance(line, bytes):
+                line = bytes(line)
+            record_type = line[:1]
+            if record_type == b'0':
+                if header is not None:
+                    yield header
+                skip_statement = skip_group = False
+                if self.accounts is None:
+                    yield line
+                else:
+                    # kept when its account is known
+                    header = line
+                continue
+            if header is not None:
+                if record_type == b'1' and \
+                        not self.match_statement(header, line):
+                    skip_statement = True
+                else:
+                    yield header
+                header = None
+            if skip_statement:
+                continue
+            if record_type == b'2':
+                # a movement which is not a globalisation detail (its
+                # transaction type is < 4) starts a group
+                if line[1:2] == b'1' and match_movement is not None and \
+                        line[_TRANSACTION_TYPE:_TRANSACTION_TYPE + 1] in \
+                        b'0123':
+                    skip_group = not match_movement(line)
+                if skip_group:
+                    continue
+            elif record_type == b'3':
+                if skip_group:
+                    continue
+            elif line.strip():
+                skip_group = False
+            yield line
+        if header is not None:
+            yield header
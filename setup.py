@@ -9,7 +9,7 @@ if sys.version_info < (2, 6):
                      "Yours is " + sys.version + os.linesep)
     sys.exit(1)
 
-requires = []
+requires = ['futures; python_version < "3"']
 
 setup(
     name='pycoda',
@@ -25,6 +25,14 @@ setup(
     zip_safe=False,
     include_package_data=True,
     install_requires=requires,
+    entry_points={
+        'console_scripts': ['pycoda = coda.cli:main'],
+    },
+    extras_require={
+        'numpy': ['numpy'],
+        'pandas': ['numpy', 'pandas'],
+        'parquet': ['pyarrow'],
+    },
     setup_requires=['nose'],
     tests_require=requires + ['nose', 'coverage'],
     test_suite='nose.collector',